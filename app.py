@@ -1,6 +1,7 @@
 import db.db as db   # 导入整个 db 模块
 import streamlit as st
 import re
+from ui.perf_panel import perf_panel
 st.set_page_config(page_title="心愿Flow", page_icon="⭐", layout="wide")
 
 # 可选：隐藏默认菜单与页脚
@@ -14,17 +15,20 @@ st.markdown(
     unsafe_allow_html=True,
 )
 
-# 初始化数据库
+# 初始化数据库（每个进程只检查一次结构版本，之后的重跑不再执行 DDL）
 db.init_db()
 
-# 可选：通过 URL 参数 ?rebuild=1 触发一次性重建数据库（用于云端迁移老库结构）
+# 可选：通过 URL 参数 ?rebuild=1 重新执行一次迁移检查（老库结构原地升级，数据保留）
 try:
     params = st.query_params  # streamlit>=1.50
     if params.get("rebuild") == "1":
-        db.init_db(force_rebuild=True)
+        db.init_db(force_check=True)
 except Exception:
     pass
 
+# 可选：通过 URL 参数 ?debug=1（或环境变量 WISHESFLOW_DEBUG=1）在侧边栏显示每次重跑的查询统计
+perf_panel("首页")
+
 if "user_id" not in st.session_state:
     st.title("🔑 欢迎登录心愿Flow")
     st.markdown("请输入用户名以开始您的私人心愿单：")
@@ -65,3 +69,34 @@ st.markdown("""
 - 💪 习惯打卡：完成习惯并获取奖励
 - 🌟 心愿单：添加与查看心愿目标
 """)
+
+# 数据导入导出：用于在不同部署之间迁移用户数据或离线分析
+with st.expander("📦 数据导入导出"):
+    export_format = st.radio("导出格式", ["csv", "parquet"], horizontal=True)
+    if st.button("生成导出文件"):
+        import io
+        from db.transfer import export_user
+
+        # 行数据分块流式写入压缩包，内存中只保留压缩后的文件
+        export_file = io.BytesIO()
+        try:
+            export_user(st.session_state["user_id"], export_file, export_format)
+            st.download_button(
+                "下载导出文件",
+                data=export_file.getvalue(),
+                file_name=f"wishesflow_{st.session_state['user_id']}_{export_format}.zip",
+                mime="application/zip",
+                on_click="ignore",
+            )
+        except RuntimeError as e:
+            st.error(str(e))
+
+    uploaded = st.file_uploader("上传导出文件（zip）导入到当前用户", type="zip")
+    if uploaded is not None and st.button("开始导入"):
+        from db.transfer import import_user
+
+        try:
+            counts = import_user(st.session_state["user_id"], uploaded)
+            st.success("导入完成：" + "，".join(f"{t} {n} 条" for t, n in counts.items()))
+        except Exception as e:
+            st.error(f"导入失败，数据未做任何修改：{e}")
@@ -0,0 +1,5 @@
+"""
+Stand-alone performance checks. Run each module from the repository root,
+e.g. python -m benchmarks.bench_planner; they exit non-zero when a budget is
+exceeded.
+"""
@@ -0,0 +1,94 @@
+"""
+Unlock forecast benchmark: seeds a throw-away database with one user holding
+several years of daily check-ins and a long wish list, then times the
+deterministic projection and the Monte Carlo simulation (in-process and over
+the process pool). Exits non-zero if any step exceeds its budget.
+
+    python -m benchmarks.bench_forecast [--years 5] [--wishes 200] [--sims 10000]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+BUDGET_MS = {"projection": 100, "monte carlo (1 process)": 2000, "monte carlo (pool)": 2000}
+USER = "bench"
+
+
+def seed_user(years, wishes, seed=0):
+    """一个用户：每个工作日考勤，3 个习惯随机打卡，wishes 个待解锁心愿"""
+    from db import db
+
+    rng = random.Random(seed)
+    end = date.today()
+    start = end - timedelta(days=365 * years)
+    db.add_income("工资", 100, USER)
+    income_id = db.list_income(USER)[0].id
+    db.add_attendance_range(USER, income_id, start, end, weekdays=range(5))
+    for title, reward, ratio in (("健身", 10, 0.5), ("阅读", 5, 0.8), ("早起", 3, 0.3)):
+        db.add_habit_task(title, reward, USER)
+        task_id = db.list_habit_tasks(USER)[0].id
+        days = [start + timedelta(days=i) for i in range((end - start).days + 1) if rng.random() < ratio]
+        db.add_habit_checkins(USER, [task_id], days)
+    for i in range(wishes):
+        db.add_wish(f"心愿{i}", rng.randint(50, 5000), rng.randint(0, 9), USER)
+
+
+def timed(fn, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.bench_forecast", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--wishes", type=int, default=200)
+    parser.add_argument("--sims", type=int, default=10_000)
+    parser.add_argument("--window", type=int, default=None, help="history days used (default: db.forecast.WINDOW_DAYS)")
+    args = parser.parse_args(argv)
+
+    from db import pool
+    from db.migrations import ensure_schema
+
+    pool.configure(os.path.join(tempfile.mkdtemp(), "bench.sqlite3"))
+    ensure_schema()
+    seed_ms, _ = timed(lambda: seed_user(args.years, args.wishes), repeat=1)
+    print(f"seeded {args.years} years, {args.wishes} wishes in {seed_ms:.0f} ms")
+
+    from db import forecast
+    from db.ledger import read_balance
+
+    window = args.window or forecast.WINDOW_DAYS
+    today = date.today()
+    load = forecast._load_forecast.__wrapped__   # 绕过结果缓存，测冷启动
+    with pool.connection(USER) as conn:
+        balance = read_balance(conn, USER)[3]
+        _, attendance, habit = forecast.daily_history(conn, USER, today, window)
+    targets = load(USER, today, window, 0, 0)[0]["target_amount"].to_numpy()
+    totals = attendance + habit
+
+    steps = {
+        "projection": lambda: load(USER, today, window, 0, 0),
+        "monte carlo (1 process)": lambda: forecast.simulate_unlock_days(
+            balance, targets, totals, args.sims, seed=0, workers=1),
+        "monte carlo (pool)": lambda: forecast.simulate_unlock_days(balance, targets, totals, args.sims, seed=0),
+    }
+    failed = False
+    for name, fn in steps.items():
+        ms, _ = timed(fn, repeat=1 if name.startswith("monte") else 3)
+        over = ms > BUDGET_MS[name]
+        failed |= over
+        print(f"{name:>24}: {ms:9.1f} ms{'  OVER BUDGET' if over else ''}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+"""
+Cold-start import benchmark.
+
+Runs app.py and every page once in a fresh interpreter under
+python -X importtime, in Streamlit's bare mode against a throw-away database
+with a little data in it, and reports the total import time plus which heavy
+libraries (pandas, numpy, matplotlib, pyarrow) got loaded. Exits non-zero
+when a script exceeds its import budget or loads a heavy library it is not
+allowed to; only the dashboard, which draws charts, may load them.
+
+    python -m benchmarks.bench_import_time [--repeat 3] [--scale 1.0]
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY = ("pandas", "numpy", "matplotlib", "pyarrow")
+# 脚本 -> (导入预算 ms, 是否允许加载重量级库)
+BUDGETS = {
+    "app.py": (600, False),
+    "pages/01_仪表盘.py": (2500, True),
+    "pages/02_考勤打卡.py": (600, False),
+    "pages/03_习惯打卡.py": (600, False),
+    "pages/04_心愿单.py": (600, False),
+}
+
+# 子进程内执行：建临时库、写入少量数据，然后以 bare 模式运行脚本
+RUNNER = """
+import logging, os, sys
+sys.path.insert(0, {root!r})
+os.chdir({root!r})
+import db.pool
+db.pool.configure({db!r})
+import streamlit as st
+logging.disable(logging.WARNING)
+import db.db as D
+D.init_db()
+D.add_income("工资", 100, "bench")
+D.add_habit_task("健身", 10, "bench")
+D.add_wish("书", 50, 0, "bench")
+D.add_attendance(1, "2026-01-01", 100, "bench")
+D.add_habit_checkin(1, "2026-01-01", 10, "bench")
+st.session_state["user_id"] = "bench"
+script = {script!r}
+exec(compile(open(script, encoding="utf-8").read(), script, "exec"), {{"__name__": "__main__"}})
+"""
+
+_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$")
+
+
+def parse_importtime(stderr):
+    """返回 (顶层导入累计 ms, 加载过的顶层包集合)"""
+    total_us, packages = 0, set()
+    for line in stderr.splitlines():
+        match = _LINE.match(line)
+        if not match:
+            continue
+        _, cumulative, indent, name = match.groups()
+        packages.add(name.split(".")[0])
+        if not indent:
+            total_us += int(cumulative)
+    return total_us / 1000, packages
+
+
+def measure(script):
+    with tempfile.TemporaryDirectory() as tmp:
+        code = RUNNER.format(root=ROOT, db=os.path.join(tmp, "bench.sqlite3"), script=script)
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                                capture_output=True, text=True, cwd=ROOT)
+    if result.returncode:
+        raise RuntimeError(f"{script} failed:\n{result.stderr[-2000:]}")
+    return parse_importtime(result.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.bench_import_time",
+                                     description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repeat", type=int, default=3, help="runs per script, the fastest counts")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply every budget (slow machines)")
+    args = parser.parse_args(argv)
+
+    failed = False
+    for script, (budget_ms, heavy_allowed) in BUDGETS.items():
+        runs = [measure(script) for _ in range(args.repeat)]
+        ms = min(r[0] for r in runs)
+        heavy = sorted(set(HEAVY) & runs[0][1])
+        problems = []
+        if ms > budget_ms * args.scale:
+            problems.append(f"over budget ({budget_ms * args.scale:.0f} ms)")
+        if heavy and not heavy_allowed:
+            problems.append("loads " + ", ".join(heavy))
+        failed |= bool(problems)
+        print(f"{script:<24} {ms:8.1f} ms  heavy: {', '.join(heavy) or '-':<32} {'; '.join(problems) or 'ok'}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
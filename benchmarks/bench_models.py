@@ -0,0 +1,114 @@
+"""
+Row representation benchmark: fetches the same result sets as one dict per
+row (what the db helpers used to return), as the sqlite3.Row the cursor
+gives, as db.models NamedTuples and, for the heatmap's daily totals, as NumPy
+columns, and reports the memory the result keeps alive, the peak while
+building it and the time.
+
+    python -m benchmarks.bench_models [--rows 100000] [--repeat 3]
+"""
+import argparse
+import random
+import sqlite3
+import sys
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+from db.analytics import HEATMAP_DAILY_SQL
+from db.migrations import migrate
+from db.models import DayTotals, HabitCheckin, Wish, fetch_all, fetch_columns
+
+ROWS = 100_000
+USER = "bench"
+WISHES_SQL = ("SELECT id, title, target_amount, priority, status FROM wishlist "
+              "WHERE user_id = ? ORDER BY status ASC, priority ASC, id DESC")
+CHECKINS_SQL = ("SELECT hc.id, hc.task_id, hc.date, hc.reward_amount, ht.title FROM habit_checkin hc "
+                "JOIN habit_task ht ON hc.task_id = ht.id WHERE hc.user_id = ? ORDER BY hc.id")
+DAILY_SQL = HEATMAP_DAILY_SQL.format(amount="attendance_amount + habit_amount",
+                                     count="attendance_count + habit_count")
+
+
+def make_db(n, seed=0):
+    """内存库：n 个心愿，以及 n 条习惯打卡（20 个习惯，每个习惯连续若干天）"""
+    rng = random.Random(seed)
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    migrate(conn)
+    conn.executemany(
+        "INSERT INTO wishlist (title, target_amount, priority, status, user_id) VALUES (?, ?, ?, ?, ?)",
+        ((f"心愿 {i}", float(rng.randint(10, 5000)), rng.randint(0, 9), rng.choice((0, 0, 1, 2)), USER)
+         for i in range(n)))
+    tasks = 20
+    conn.executemany("INSERT INTO habit_task (id, title, reward_amount, user_id) VALUES (?, ?, ?, ?)",
+                     ((t, f"习惯 {t}", float(t), USER) for t in range(1, tasks + 1)))
+    start = date(2000, 1, 1)
+    conn.executemany(
+        "INSERT INTO habit_checkin (task_id, date, reward_amount, user_id) VALUES (?, ?, ?, ?)",
+        ((i % tasks + 1, (start + timedelta(days=i // tasks)).isoformat(), float(i % tasks + 1), USER)
+         for i in range(n)))
+    conn.commit()
+    return conn
+
+
+def as_dicts(conn, sql, params=(USER,)):
+    return [dict(row) for row in conn.execute(sql, params).fetchall()]
+
+
+def as_rows(conn, sql, params=(USER,)):
+    return conn.execute(sql, params).fetchall()
+
+
+def measure(build, repeat):
+    """(保留字节, 峰值字节, 最快 ms)：内存在 tracemalloc 下单独测一次，时间不开 tracemalloc 取最快"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    result = build()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        build()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return current - before, peak - before, best
+
+
+def cases(conn):
+    return [
+        ("wishes", "dict", lambda: as_dicts(conn, WISHES_SQL)),
+        ("wishes", "sqlite3.Row", lambda: as_rows(conn, WISHES_SQL)),
+        ("wishes", "Wish", lambda: fetch_all(conn, Wish, WISHES_SQL, (USER,))),
+        ("checkins", "dict", lambda: as_dicts(conn, CHECKINS_SQL)),
+        ("checkins", "sqlite3.Row", lambda: as_rows(conn, CHECKINS_SQL)),
+        ("checkins", "HabitCheckin", lambda: fetch_all(conn, HabitCheckin, CHECKINS_SQL, (USER,))),
+        # 热力图只做汇总：按行取字典与直接读成列的对比
+        ("daily", "dict", lambda: as_dicts(conn, DAILY_SQL, (USER, "", "9999-12-31"))),
+        ("daily", "DayTotals", lambda: fetch_columns(conn, DayTotals, DAILY_SQL, (USER, "", "9999-12-31"))),
+    ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.bench_models", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=ROWS)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    conn = make_db(args.rows)
+    import numpy  # noqa: F401  先导入，避免把模块本身算进列式结果的内存
+
+    print(f"{'result':>11} {'as':>12} {'kept MB':>8} {'peak MB':>8} {'vs dict':>8} {'ms':>8}")
+    baseline = {}
+    for name, kind, build in cases(conn):
+        kept, peak, ms = measure(build, args.repeat)
+        baseline.setdefault(name, kept)
+        print(f"{name:>11} {kind:>12} {kept / 2**20:>8.1f} {peak / 2**20:>8.1f} "
+              f"{kept / baseline[name]:>8.0%} {ms:>8.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
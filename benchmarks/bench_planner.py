@@ -0,0 +1,70 @@
+"""
+Unlock planner benchmark: times every strategy on synthetic wish lists of
+several sizes and fails if any plan takes longer than the interactive budget,
+or if "skip" leaves out a wish that "priority" unlocks.
+
+    python -m benchmarks.bench_planner [--sizes 100 1000 5000] [--budget-ms 300]
+"""
+import argparse
+import random
+import sys
+import time
+
+from db.planner import STRATEGIES, plan_unlock
+
+SIZES = (100, 1000, 5000)
+BUDGET_MS = 300
+
+
+def make_wishes(n, seed=0):
+    """n 个待解锁心愿：金额多为整元（少量带角分），优先级 0-9，按页面同样的顺序排列"""
+    rng = random.Random(seed)
+    wishes = []
+    for wish_id in range(1, n + 1):
+        amount = rng.choice((rng.randint(10, 5000), round(rng.uniform(1, 500), 2)) if rng.random() < 0.1
+                            else (rng.randint(10, 5000),))
+        wishes.append((wish_id, float(amount), rng.randint(0, 9)))
+    wishes.sort(key=lambda w: (w[2], -w[0]))
+    # 余额约为全部心愿金额的 30%，保证三种策略的结果不同
+    balance = round(sum(w[1] for w in wishes) * 0.3, 2)
+    return wishes, balance
+
+
+def bench(wishes, balance, strategy, repeat=3):
+    best, plan = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        plan = plan_unlock(wishes, balance, strategy)
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best, plan
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.bench_planner", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--budget-ms", type=float, default=BUDGET_MS)
+    args = parser.parse_args(argv)
+
+    failed = False
+    print(f"{'wishes':>7} {'strategy':>9} {'ms':>9} {'unlocked':>9} {'value':>8} exact")
+    for n in args.sizes:
+        wishes, balance = make_wishes(n)
+        plans = {}
+        for strategy in STRATEGIES:
+            ms, plan = bench(wishes, balance, strategy)
+            plans[strategy] = plan
+            over = ms > args.budget_ms
+            failed |= over
+            print(f"{n:>7} {strategy:>9} {ms:>9.1f} {len(plan.wish_ids):>9} {plan.total_value:>8} "
+                  f"{plan.exact}{'  OVER BUDGET' if over else ''}")
+        # skip 只是在 priority 的基础上继续往后找，必须包含 priority 解锁的全部心愿
+        missing = set(plans["priority"].wish_ids) - set(plans["skip"].wish_ids)
+        if missing:
+            failed = True
+            print(f"{n:>7} skip misses {len(missing)} wishes that priority unlocks")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
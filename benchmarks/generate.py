@@ -0,0 +1,115 @@
+"""
+Deterministic synthetic data generator.
+
+Populates a database with users × days of history: income sources and daily
+attendance, habit tasks and check-ins, and a wish list per user. Activity is
+skewed Zipf-style, so the first users are much heavier than the rest
+(skew=0 makes everyone alike). The same arguments always produce the same
+rows.
+
+    python -m benchmarks.generate --db /tmp/bench.sqlite3 --users 50 --days 730 [--skew 1.2] [--seed 0]
+"""
+import argparse
+import random
+import sys
+from datetime import date, timedelta
+
+END = date(2026, 1, 1)   # 固定截止日期，保证不同日期生成的数据一致
+USER_PREFIX = "user"
+
+
+def user_name(index):
+    return f"{USER_PREFIX}{index:04d}"
+
+
+def user_weights(users, skew):
+    """第 i 个用户的活跃度 ∝ 1/(i+1)^skew，归一化到最重的用户为 1"""
+    return [1.0 / (i + 1) ** skew for i in range(users)]
+
+
+def _user_rows(rng, user_id, weight, days, end):
+    """一个用户的全部行：(incomes, tasks, attendance, checkins, wishes)，外键用该用户内的序号"""
+    dates = [(end - timedelta(days=days - 1 - i)).isoformat() for i in range(days)]
+    n_income = 1 + int(2 * weight)
+    n_tasks = 1 + int(9 * weight)
+    n_wishes = 5 + int(195 * weight)
+    activity = 0.3 + 0.6 * weight                # 每天打卡概率，重度用户接近 0.9
+    incomes = [(f"收入{i}", rng.choice((80, 100, 150, 200, 300))) for i in range(n_income)]
+    tasks = [(f"习惯{i}", rng.choice((2, 3, 5, 10, 20))) for i in range(n_tasks)]
+    attendance = [(i, d, incomes[i][1]) for i in range(n_income) for d in dates if rng.random() < activity]
+    checkins = [(i, d, tasks[i][1]) for i in range(n_tasks) for d in dates if rng.random() < activity * 0.8]
+    wishes = []
+    for i in range(n_wishes):
+        status = rng.choices((0, 2), weights=(7, 3))[0]
+        wishes.append((f"心愿{i}", float(rng.randint(20, 8000)), rng.randint(0, 9), status))
+    return incomes, tasks, attendance, checkins, wishes
+
+
+def generate(users=20, days=365, skew=1.0, seed=0, end=END):
+    """
+    Fill the configured database (db.pool) with users × days of history.
+    Each user is written in one transaction with executemany; the ledger and
+    rollup triggers run as in production. Returns {table: rows inserted}.
+    """
+    from db.cache import invalidate_all
+    from db.ledger import read_balance
+    from db.migrations import ensure_schema
+    from db.planner import plan_unlock
+    from db.pool import transaction
+
+    ensure_schema()
+    counts = dict.fromkeys(("income", "habit_task", "attendance", "habit_checkin", "wishlist"), 0)
+    for index, weight in enumerate(user_weights(users, skew)):
+        rng = random.Random(f"{seed}:{index}")
+        user_id = user_name(index)
+        incomes, tasks, attendance, checkins, wishes = _user_rows(rng, user_id, weight, days, end)
+        with transaction(user_id) as conn:
+            income_ids = [conn.execute("INSERT INTO income (title, daily_amount, user_id) VALUES (?, ?, ?)",
+                                       (*row, user_id)).lastrowid for row in incomes]
+            task_ids = [conn.execute("INSERT INTO habit_task (title, reward_amount, user_id) VALUES (?, ?, ?)",
+                                     (*row, user_id)).lastrowid for row in tasks]
+            conn.executemany(
+                "INSERT OR IGNORE INTO attendance (income_id, date, earned_amount, user_id) VALUES (?, ?, ?, ?)",
+                [(income_ids[i], d, amount, user_id) for i, d, amount in attendance])
+            conn.executemany(
+                "INSERT OR IGNORE INTO habit_checkin (task_id, date, reward_amount, user_id) VALUES (?, ?, ?, ?)",
+                [(task_ids[i], d, amount, user_id) for i, d, amount in checkins])
+            # 创建/解锁时间固定为截止日期，不随生成时刻变化
+            conn.executemany(
+                "INSERT INTO wishlist (title, target_amount, priority, status, unlocked_at, created_at, user_id) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(title, amount, priority, status, end.isoformat() if status else None, end.isoformat(), user_id)
+                 for title, amount, priority, status in wishes])
+            # 再按优先级解锁余额够得着的心愿，得到真实的“已解锁”状态且余额不为负
+            pending = conn.execute(
+                "SELECT id, target_amount, priority FROM wishlist WHERE user_id = ? AND status = 0 "
+                "ORDER BY priority ASC, id DESC", (user_id,)).fetchall()
+            plan = plan_unlock(pending, read_balance(conn, user_id)[3])
+            conn.executemany("UPDATE wishlist SET status = 1, unlocked_at = ? WHERE id = ?",
+                             [(end.isoformat(), wish_id) for wish_id in plan.wish_ids])
+        for table, rows in zip(counts, (incomes, tasks, attendance, checkins, wishes)):
+            counts[table] += len(rows)
+    with transaction():
+        invalidate_all()
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.generate", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--db", required=True, help="database file to create or extend")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--skew", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    from db import pool
+    pool.configure(args.db)
+    counts = generate(args.users, args.days, args.skew, args.seed)
+    for table, n in counts.items():
+        print(f"{table}: {n}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,142 @@
+"""
+Concurrent check-in stress test for the writer thread (db.writer).
+
+Starts --sessions threads, one simulated user session each, which all check
+in at the same moment (attendance and a habit for --days consecutive days,
+reading the balance after every check-in, as the pages do). Reports
+throughput, per-call latency, failed writes and how many group commits the
+writer needed, then checks that every inserted check-in reached the ledger.
+
+    python -m benchmarks.stress_writer [--sessions 48] [--days 20] [--direct] [--shards N]
+
+--direct bypasses the writer (every session writes on its own thread, the
+old behaviour) for comparison; --shards N spreads the users over N database
+files (db.shards), each with its own writer. Exits non-zero if a write failed or the
+ledger disagrees with the check-in tables.
+"""
+import argparse
+import contextlib
+import io
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+START = date(2100, 1, 1)
+
+
+def _session(index, ids, days, barrier, latencies, failures):
+    from db import db
+
+    user = f"stress{index:03d}"
+    income_id, task_id = ids
+    barrier.wait()
+    for i in range(days):
+        day = (START + timedelta(days=i)).isoformat()
+        for write in (lambda: db.add_attendance(income_id, day, 100, user),
+                      lambda: db.add_habit_checkin(task_id, day, 10, user)):
+            start = time.perf_counter()
+            ok = write()
+            latencies.append((time.perf_counter() - start) * 1000)
+            if not ok:
+                failures.append((user, day))
+        db.get_balance_summary(user)
+
+
+def _setup(sessions):
+    """Returns the (income id, habit id) of every session's user."""
+    from db.pool import transaction
+
+    ids = []
+    for index in range(sessions):
+        user = f"stress{index:03d}"
+        with transaction(user) as conn:
+            ids.append((
+                conn.execute("INSERT INTO income (title, daily_amount, user_id) VALUES ('工资', 100, ?)",
+                             (user,)).lastrowid,
+                conn.execute("INSERT INTO habit_task (title, reward_amount, user_id) VALUES ('健身', 10, ?)",
+                             (user,)).lastrowid))
+    return ids
+
+
+def _ledger_mismatches(conn):
+    return conn.execute("""
+        SELECT b.user_id FROM user_balance b
+        WHERE b.attendance_total != (SELECT COALESCE(SUM(earned_amount), 0) FROM attendance a
+                                     WHERE a.user_id = b.user_id)
+           OR b.habit_total != (SELECT COALESCE(SUM(reward_amount), 0) FROM habit_checkin h
+                                WHERE h.user_id = b.user_id)""").fetchall()
+
+
+def run(sessions, days, direct=False):
+    from db import shards, writer
+    from db.pool import pool_at
+
+    writer.ENABLED = not direct
+    ids = _setup(sessions)
+    barrier = threading.Barrier(sessions)
+    latencies, failures = [], []
+    threads = [threading.Thread(target=_session, args=(i, ids[i], days, barrier, latencies, failures))
+               for i in range(sessions)]
+    before = writer.writer_stats()
+    out = io.StringIO()
+    start = time.perf_counter()
+    # 写接口出错时只打印错误；收集起来统计 "database is locked"
+    with contextlib.redirect_stdout(out):
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    wall = time.perf_counter() - start
+    after = writer.writer_stats()
+    inserted, mismatches = 0, []
+    for path in shards.database_paths():
+        with pool_at(path).connection() as conn:
+            inserted += conn.execute(
+                "SELECT (SELECT COUNT(*) FROM attendance) + (SELECT COUNT(*) FROM habit_checkin)").fetchone()[0]
+            mismatches += _ledger_mismatches(conn)
+    ordered = sorted(latencies)
+    return {
+        "mode": "direct" if direct else "writer",
+        "databases": len(shards.database_paths()),
+        "writes": len(latencies),
+        "inserted": inserted,
+        "failed": len(failures),
+        "locked_errors": out.getvalue().count("database is locked"),
+        "wall_s": round(wall, 2),
+        "writes_per_s": round(len(latencies) / wall, 1),
+        "p50_ms": round(statistics.median(ordered), 2),
+        "p95_ms": round(ordered[int(len(ordered) * 0.95)], 2),
+        "max_ms": round(ordered[-1], 2),
+        "commits": after["batches"] - before["batches"],
+        "ledger_mismatches": len(mismatches),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.stress_writer", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sessions", type=int, default=48)
+    parser.add_argument("--days", type=int, default=20)
+    parser.add_argument("--direct", action="store_true", help="write on the session threads, bypassing the writer")
+    parser.add_argument("--shards", type=int, default=0, help="spread the users over this many database files")
+    args = parser.parse_args(argv)
+
+    from db import pool, shards
+    from db.migrations import ensure_schema
+
+    directory = tempfile.mkdtemp()
+    pool.configure(os.path.join(directory, "stress.sqlite3"))
+    shards.configure(os.path.join(directory, "shards"), args.shards)
+    ensure_schema()
+    result = run(args.sessions, args.days, args.direct)
+    for key, value in result.items():
+        print(f"{key:<18} {value}")
+    ok = not result["failed"] and result["inserted"] == result["writes"] and not result["ledger_mismatches"]
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,258 @@
+"""
+Benchmark suite for the db layer and the pages.
+
+Generates a database with benchmarks.generate (or uses --db), then measures
+every db helper, greedy_unlock, the dashboard queries (cold and cached) and a
+full headless run of every page through Streamlit's AppTest, for the heaviest
+and the lightest generated user. With --storage memory the pages run against
+an in-memory copy of the database (db.memory), which leaves only the cost of
+the UI logic; --shards N spreads the generated users over N database files
+(db.shards). Reports p50/p95 latency and peak traced memory per case and
+stores everything as JSON, so two commits can be compared:
+
+    python -m benchmarks.suite --out before.json
+    python -m benchmarks.suite --out after.json --compare before.json
+"""
+import argparse
+import datetime
+import glob
+import json
+import logging
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+
+from benchmarks.generate import generate, user_name
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _stats(samples_ms, peak_bytes):
+    ordered = sorted(samples_ms)
+    q = statistics.quantiles(ordered, n=100, method="inclusive") if len(ordered) > 1 else ordered * 99
+    return {
+        "n": len(ordered),
+        "p50_ms": round(statistics.median(ordered), 3),
+        "p95_ms": round(q[94], 3),
+        "mean_ms": round(statistics.fmean(ordered), 3),
+        "min_ms": round(ordered[0], 3),
+        "peak_kib": round(peak_bytes / 1024, 1),
+    }
+
+
+def measure(fn, repeat, setup=None, warmup=1):
+    """repeat 次计时（setup 不计时），另跑一次 tracemalloc 取峰值内存，避免追踪开销混入耗时"""
+    for _ in range(warmup):
+        if setup:
+            setup()
+        fn()
+    samples = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    if setup:
+        setup()
+    tracemalloc.start()
+    try:
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return _stats(samples, peak)
+
+
+def db_cases(user):
+    """(名称, 函数, setup) 列表；读接口各测冷/热缓存两种情况"""
+    from db import db
+    from db.analytics import calendar_heatmap, wish_progress
+    from db.cache import get_cache
+    from db.dashboard import load_dashboard
+    from db.forecast import forecast_unlocks
+    from db.paging import PAGE_SIZE
+    from db.pool import connection, transaction
+    from db.streaks import get_streak_cache, habit_stats
+
+    clear = get_cache().clear
+    # 最后一页的游标：分页读取的耗时应与第一页相同
+    with connection(user) as conn:
+        oldest = conn.execute("SELECT date, id FROM attendance WHERE user_id = ? ORDER BY date, id LIMIT 1 OFFSET ?",
+                              (user, PAGE_SIZE)).fetchone()
+    reads = {
+        "list_income": lambda: db.list_income(user),
+        "list_habit_tasks": lambda: db.list_habit_tasks(user),
+        "list_wishes": lambda: db.list_wishes(user),
+        "list_wishes_page": lambda: db.list_wishes_page(user, (0, 1)),
+        "list_checkins_page[first]": lambda: db.list_checkins_page(user, "attendance"),
+        "list_checkins_page[last]": lambda: db.list_checkins_page(user, "attendance", oldest and tuple(oldest)),
+        "get_pool_balance": lambda: db.get_pool_balance(user),
+    }
+    dashboard = {
+        "get_balance_summary": lambda: db.get_balance_summary(user),
+        "get_wishlist_frame": lambda: db.get_wishlist_frame(user),
+        "get_habit_breakdown": lambda: db.get_habit_breakdown(user),
+        "get_daily_inflows": lambda: db.get_daily_inflows(user),
+        "get_monthly_inflows": lambda: db.get_monthly_inflows(user),
+        "wish_progress": lambda: wish_progress(user),
+        "calendar_heatmap": lambda: calendar_heatmap(user),
+        "forecast_unlocks": lambda: forecast_unlocks(user),
+        "load_dashboard": lambda: load_dashboard(user),
+    }
+    cases = [(f"db.{name}", fn, None) for name, fn in reads.items()]
+    for name, fn in dashboard.items():
+        cases.append((f"dashboard.{name}[cold]", fn, clear))
+        cases.append((f"dashboard.{name}[cached]", fn, None))
+    cases.append(("streaks.habit_stats[cold]", lambda: habit_stats(user), get_streak_cache().clear))
+    cases.append(("streaks.habit_stats[cached]", lambda: habit_stats(user), None))
+    for strategy in ("priority", "skip", "knapsack"):
+        cases.append((f"db.preview_unlock_plan[{strategy}]",
+                      lambda s=strategy: db.preview_unlock_plan(user, s), None))
+
+    def relock():
+        # 每次解锁前把已解锁的心愿恢复为待解锁，让每个样本做同样多的工作
+        with transaction(user) as conn:
+            conn.execute("UPDATE wishlist SET status = 0, unlocked_at = NULL WHERE user_id = ? AND status = 1",
+                         (user,))
+            db.invalidate_user(user)
+
+    for strategy in ("priority", "knapsack"):
+        cases.append((f"db.greedy_unlock[{strategy}]", lambda s=strategy: db.greedy_unlock(user, s), relock))
+
+    income_id = db.list_income(user)[0].id
+    day = iter(datetime.date(2100, 1, 1) + datetime.timedelta(days=i) for i in range(10 ** 6))
+    written = []
+
+    def check_in():
+        d = next(day).isoformat()
+        written.append(d)
+        db.add_attendance(income_id, d, 100, user)
+
+    def check_out():
+        db.delete_attendance(income_id, written.pop(), user)
+
+    # 写入用 2100 年以后的日期，测完即删，不影响其它用例的数据
+    cases.append(("db.add_attendance", check_in, lambda: written and check_out()))
+    cases.append(("db.delete_attendance", check_out, check_in))
+    return cases
+
+
+def page_cases(user):
+    from streamlit.testing.v1 import AppTest
+
+    def run_page(script):
+        at = AppTest.from_file(script, default_timeout=120)
+        at.session_state["user_id"] = user
+        at.run()
+        if at.exception:
+            raise RuntimeError(f"{script}: {at.exception[0].value}")
+
+    scripts = ["app.py"] + sorted(glob.glob("pages/*.py"))
+    return [(f"page.{os.path.basename(s)}", lambda s=s: run_page(s), None) for s in scripts]
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=ROOT, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline):
+    print(f"\n{'case':<58} {'p50 before':>11} {'p50 after':>10} {'change':>8}")
+    for name, after in results["cases"].items():
+        before = baseline["cases"].get(name)
+        if not before:
+            continue
+        change = (after["p50_ms"] / before["p50_ms"] - 1) * 100 if before["p50_ms"] else 0.0
+        print(f"{name:<58} {before['p50_ms']:>11.2f} {after['p50_ms']:>10.2f} {change:>+7.1f}%")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.suite", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--db", help="benchmark an existing database (generated by benchmarks.generate)")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--skew", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=20, help="samples per db case")
+    parser.add_argument("--page-repeat", type=int, default=3, help="samples per page run")
+    parser.add_argument("--no-pages", action="store_true", help="skip the AppTest page runs")
+    parser.add_argument("--storage", choices=("sqlite", "memory"), default="sqlite",
+                        help="storage backend the pages run against")
+    parser.add_argument("--shards", type=int, default=0,
+                        help="generate into this many shard files (db.shards) instead of one database")
+    parser.add_argument("--filter", default="", help="only run cases whose name contains this text")
+    parser.add_argument("--out", help="write results as JSON to this file")
+    parser.add_argument("--compare", help="baseline JSON to compare p50 latencies with")
+    args = parser.parse_args(argv)
+
+    os.chdir(ROOT)
+    from db import pool, shards
+    from db.migrations import ensure_schema
+
+    # AppTest 在进程内运行页面，屏蔽 bare 模式与缺字体的告警，输出只保留结果
+    logging.disable(logging.WARNING)
+    warnings.filterwarnings("ignore")
+    if args.db:
+        pool.configure(args.db)
+        ensure_schema()
+    else:
+        directory = tempfile.mkdtemp()
+        pool.configure(os.path.join(directory, "suite.sqlite3"))
+        shards.configure(os.path.join(directory, "shards"), args.shards)
+        start = time.perf_counter()
+        counts = generate(args.users, args.days, args.skew, args.seed)
+        print(f"generated {counts} in {time.perf_counter() - start:.1f} s")
+    if args.storage == "memory":
+        from db.memory import MemoryRepository
+        from db.repository import set_repository
+
+        set_repository(MemoryRepository.from_sqlite(*shards.database_paths()))
+    # 生成器的活跃度按序号递减：第一个用户最重，最后一个最轻
+    users = {"heavy": user_name(0), "light": user_name(args.users - 1)}
+
+    results = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "params": {k: getattr(args, k) for k in ("db", "users", "days", "skew", "seed", "repeat",
+                                                     "page_repeat", "storage", "shards")},
+        },
+        "cases": {},
+    }
+    for label, user in users.items():
+        cases = [(name, fn, setup, args.repeat) for name, fn, setup in db_cases(user)]
+        if not args.no_pages:
+            cases += [(name, fn, setup, args.page_repeat) for name, fn, setup in page_cases(user)]
+        for name, fn, setup, repeat in cases:
+            key = f"{name}[{label}]"
+            if args.filter not in key:
+                continue
+            stats = measure(fn, repeat, setup)
+            results["cases"][key] = stats
+            print(f"{key:<58} p50 {stats['p50_ms']:>9.2f} ms  p95 {stats['p95_ms']:>9.2f} ms  "
+                  f"peak {stats['peak_kib']:>9.1f} KiB")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(results, json.load(f))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
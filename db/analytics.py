@@ -0,0 +1,176 @@
+"""
+Vectorised wish progress.
+
+Pending wishes are funded in strict priority order (priority ASC, id DESC):
+each wish receives whatever balance the wishes before it leave over, so with
+cumulative sums the whole allocation is a handful of array operations,
+however long the wish list is. greedy_unlock's "priority" strategy unlocks
+exactly the fully funded prefix computed here.
+
+calendar_heatmap bins a user's inflows into a year x day-of-year matrix
+with numpy.bincount over day numbers read in one index range scan.
+
+NumPy is imported inside the functions that need it: unlockable_prefix runs
+on every wishlist page view and only needs the standard library.
+"""
+from bisect import bisect_right
+from collections import namedtuple
+from itertools import accumulate
+
+from db.cache import cached_per_user
+from db.db import CHECKIN_KINDS
+from db.ledger import read_balance
+from db.models import DayTotals, fetch_columns
+from db.pool import connection
+
+EPSILON = 1e-9   # 累加误差容忍，避免 0.1 + 0.2 这类浮点和恰好差一点
+
+
+def allocate_balance(targets, balance):
+    """
+    Split balance over targets (priority order). Returns (funded, unlockable):
+    the amount allocated to each wish and whether it is fully covered.
+    Only a prefix of the wishes is ever unlockable.
+    """
+    import numpy as np
+
+    targets = np.asarray(targets, dtype=float)
+    cumulative = np.cumsum(targets)
+    funded = np.clip(balance - (cumulative - targets), 0.0, targets)
+    unlockable = cumulative <= balance + EPSILON
+    return funded, unlockable
+
+
+def unlockable_prefix(targets, balance):
+    """
+    Number of leading wishes balance fully covers in priority order; the same
+    as allocate_balance(targets, balance)[1].sum(). Targets are positive, so
+    the running total is sorted and a binary search finds the cut.
+    """
+    return bisect_right(list(accumulate(targets)), balance + EPSILON)
+
+
+# 未解锁心愿，按分配余额的顺序
+PENDING_WISHES_SQL = """
+    SELECT id, title, target_amount, priority FROM wishlist WHERE user_id = ? AND status = 0
+    ORDER BY priority ASC, id DESC"""
+PROGRESS_COLUMNS = ["id", "title", "target_amount", "priority", "funded", "progress", "shortfall", "unlockable"]
+
+
+def progress_frame(rows, balance):
+    """
+    The wish_progress frame for pending wishes rows (id, title, target_amount,
+    priority), already in priority order, and the current balance.
+    """
+    import numpy as np
+    import pandas as pd
+
+    frame = pd.DataFrame([tuple(r) for r in rows], columns=PROGRESS_COLUMNS[:4])
+    targets = frame["target_amount"].to_numpy(dtype=float)
+    funded, unlockable = allocate_balance(targets, balance)
+    frame["funded"] = funded
+    frame["progress"] = np.divide(funded, targets, out=np.zeros_like(funded), where=targets > 0)
+    frame["shortfall"] = targets - funded
+    frame["unlockable"] = unlockable
+    return frame
+
+
+@cached_per_user
+def _load_wish_progress(user_id):
+    with connection(user_id) as conn:
+        balance = read_balance(conn, user_id)[3]
+        rows = conn.execute(PENDING_WISHES_SQL, (user_id,)).fetchall()
+    return progress_frame(rows, balance)
+
+
+def wish_progress(user_id):
+    """
+    Pending wishes of user_id in priority order with the balance allocated to
+    them: id, title, target_amount, priority, funded, progress (0-1),
+    shortfall and unlockable. Cached, read-only.
+    """
+    try:
+        return _load_wish_progress(user_id)
+    except Exception as e:
+        print(f"Error in wish_progress: {e}")
+        import pandas as pd
+        return pd.DataFrame(columns=PROGRESS_COLUMNS)
+
+
+# ------------------------
+# 日历热力图
+# ------------------------
+
+DAYS_PER_ROW = 366   # 每年一行，按闰年日历排列：3 月 1 日总在第 60 列，平年的 2 月 29 日留空
+Heatmap = namedtuple("Heatmap", "years amounts counts")
+
+# 按来源汇总时读每日汇总表，按收入来源/习惯时读打卡表；两者都是 user_id 开头的索引上的一次范围扫描
+HEATMAP_DAILY_SQL = """
+    SELECT day, {amount}, {count} FROM inflow_daily
+    WHERE user_id = ? AND day >= ? AND day <= ? AND {count} > 0"""
+HEATMAP_ITEM_SQL = """
+    SELECT date, {amount}, 1 FROM {table}
+    WHERE user_id = ? AND {source_id} = ? AND date >= ? AND date <= ?"""
+
+
+def heatmap_matrix(dates, amounts, counts, years=None):
+    """
+    Heatmap of per-day (YYYY-MM-DD date, amount, count) rows, dates unique or
+    not: years is the array of row labels and amounts/counts are
+    (len(years), DAYS_PER_ROW) matrices. years=(first, last) fixes the rows
+    (rows outside are dropped); by default they span the years with data.
+    """
+    import numpy as np
+
+    days = np.asarray(dates, dtype="datetime64[D]")
+    year_start = days.astype("datetime64[Y]")
+    year = year_start.astype(np.int64) + 1970
+    column = (days - year_start.astype("datetime64[D]")).astype(np.int64)
+    # 平年 3 月起右移一列，每一列在各年都是同一个日期
+    leap = (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+    column += ~leap & (column >= 59)
+    if years is None:
+        first, last = (int(year.min()), int(year.max())) if len(days) else (0, -1)
+    else:
+        first, last = years
+    keep = (year >= first) & (year <= last)
+    cells = (year[keep] - first) * DAYS_PER_ROW + column[keep]
+    size = max(last - first + 1, 0) * DAYS_PER_ROW
+    return Heatmap(
+        np.arange(first, last + 1),
+        np.bincount(cells, weights=np.asarray(amounts, dtype=float)[keep], minlength=size)
+        .reshape(-1, DAYS_PER_ROW),
+        np.bincount(cells, weights=np.asarray(counts, dtype=float)[keep], minlength=size)
+        .astype(np.int64).reshape(-1, DAYS_PER_ROW),
+    )
+
+
+@cached_per_user
+def _load_heatmap(user_id, kind, item_id, years):
+    start, end = (f"{years[0]:04d}-01-01", f"{years[1]:04d}-12-31") if years else ("", "9999-12-31")
+    if item_id is None:
+        amount = {None: "attendance_amount + habit_amount"}.get(kind, f"{kind}_amount")
+        count = {None: "attendance_count + habit_count"}.get(kind, f"{kind}_count")
+        sql, params = HEATMAP_DAILY_SQL.format(amount=amount, count=count), (user_id, start, end)
+    else:
+        table, _, source_id, amount = CHECKIN_KINDS[kind]
+        sql = HEATMAP_ITEM_SQL.format(table=table, source_id=source_id, amount=amount)
+        params = (user_id, item_id, start, end)
+    with connection(user_id) as conn:
+        totals = fetch_columns(conn, DayTotals, sql, params)
+    return heatmap_matrix(totals.date, totals.amount, totals.count, years)
+
+
+def calendar_heatmap(user_id, kind=None, item_id=None, years=None):
+    """
+    Calendar heatmap of user_id's inflows: a Heatmap whose amounts and counts
+    have one row per year and one column per day (see heatmap_matrix). kind
+    None adds up both sources, "attendance"/"habit" keeps one; item_id then
+    narrows it to one income/habit (deleted ones included). years=(first,
+    last) limits the rows, by default every year with data. Cached, read-only.
+    """
+    try:
+        return _load_heatmap(user_id, kind, item_id, tuple(years) if years else None)
+    except Exception as e:
+        print(f"Error in calendar_heatmap: {e}")
+        return heatmap_matrix([], [], [], years)
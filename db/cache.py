@@ -0,0 +1,105 @@
+"""
+Write-versioned result cache.
+
+Every user has an in-process data version that the db write helpers bump
+once their transaction commits. Cached results are keyed on
+(user_id, query, arguments, data version), so a result stays valid exactly
+until that user's data changes; stale entries simply stop being hit and age
+out of the LRU.
+
+Cached values are shared between callers (DataFrames included) and must be
+treated as read-only.
+"""
+import functools
+import threading
+from collections import OrderedDict
+
+from db.pool import get_pool, on_commit
+
+MAX_ENTRIES = 256
+
+
+class QueryCache:
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._epoch = 0   # 全局版本：整库维护（如对账重建）后整体失效
+        self._lock = threading.Lock()
+
+    def version(self, user_id):
+        return self._epoch, self._versions.get(user_id, 0)
+
+    def bump(self, user_id):
+        with self._lock:
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+
+    def bump_all(self):
+        with self._lock:
+            self._epoch += 1
+
+    def get_or_load(self, key, loader):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+        value = loader()
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._epoch += 1
+            self.hits = self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses,
+                    "entries": len(self._entries), "max_entries": self.max_entries}
+
+
+_cache = QueryCache()
+
+
+def get_cache():
+    return _cache
+
+
+def invalidate_user(user_id):
+    """Bump user_id's data version once the current transaction commits."""
+    on_commit(functools.partial(_cache.bump, user_id), user_id)
+
+
+def invalidate_all():
+    """Invalidate every user's cached results once the current transaction commits."""
+    on_commit(_cache.bump_all)
+
+
+def cached_per_user(fn):
+    """
+    Cache fn(user_id, *args, **kwargs) until user_id's data version changes.
+    The version is read before loading, so a load that races with a commit is
+    stored under the old version and never served afterwards.
+    """
+    name = fn.__qualname__
+
+    @functools.wraps(fn)
+    def wrapper(user_id, *args, **kwargs):
+        key = (get_pool(user_id).path, user_id, name, args, tuple(sorted(kwargs.items())),
+               _cache.version(user_id))
+        return _cache.get_or_load(key, lambda: fn(user_id, *args, **kwargs))
+
+    return wrapper
+
+
+def cache_stats():
+    return _cache.stats()
@@ -0,0 +1,95 @@
+"""
+Dashboard snapshot.
+
+load_dashboard(user_id) reads everything the dashboard page renders, i.e. the
+balance ledger, the pending wishes and the wish count per status, the habit
+breakdown and the monthly and daily inflow rollups, on one pooled connection
+inside one read transaction. Under WAL the transaction pins a single database
+snapshot, so every widget shows the same state even while check-ins are being
+written elsewhere. The rollup and ledger tables are the trigger-maintained
+aggregates of v_pool_inflows, so the loader reads them instead of
+re-aggregating the view on every load. Unlocked and completed wishes are not
+part of the snapshot: the page browses them a page at a time
+(db.db.list_wishes_page).
+"""
+from dataclasses import dataclass
+
+from db.analytics import PENDING_WISHES_SQL, PROGRESS_COLUMNS, progress_frame
+from db.cache import cached_per_user
+from db.db import HABIT_BREAKDOWN_SQL, WISH_COUNTS_SQL
+from db.ledger import read_balance
+from db.pool import connection
+from db.rollups import inflow_frame, read_rollup
+
+
+@dataclass(frozen=True)
+class DashboardSnapshot:
+    """One consistent view of a user's dashboard data. The frames are shared and read-only."""
+    user_id: str
+    attendance_total: float
+    habit_total: float
+    reserved: float
+    balance: float
+    wish_counts: dict                    # status -> 心愿数
+    progress: "pandas.DataFrame"         # 未解锁心愿的资金分配（同 analytics.wish_progress）
+    habit_breakdown: "pandas.DataFrame"  # title, total_reward（同 get_habit_breakdown）
+    monthly: "pandas.DataFrame"          # 按月收入（同 get_monthly_inflows）
+    daily: "pandas.DataFrame"            # 按日收入（同 get_daily_inflows）
+
+    @classmethod
+    def empty(cls, user_id):
+        import pandas as pd
+
+        return cls(user_id, 0, 0, 0, 0,
+                   wish_counts={},
+                   progress=pd.DataFrame(columns=PROGRESS_COLUMNS),
+                   habit_breakdown=pd.DataFrame(columns=["title", "total_reward"]),
+                   monthly=inflow_frame([], "month"),
+                   daily=inflow_frame([], "day"))
+
+
+def build_snapshot(user_id, balance, wish_counts, pending_rows, habit_rows, monthly_rows, daily_rows):
+    """
+    Assemble a DashboardSnapshot from plain rows: the read_balance tuple, the
+    (status, count) rows of the wishlist, the pending wishes (id, title,
+    target_amount, priority) in funding order, the habit breakdown (title,
+    total_reward) and the read_rollup rows per month and per day.
+    """
+    import pandas as pd
+
+    attendance_total, habit_total, reserved, available = balance
+    return DashboardSnapshot(
+        user_id, attendance_total, habit_total, reserved, available,
+        wish_counts=dict(wish_counts),
+        progress=progress_frame(pending_rows, available),
+        habit_breakdown=pd.DataFrame([tuple(r) for r in habit_rows], columns=["title", "total_reward"]),
+        monthly=inflow_frame(monthly_rows, "month"),
+        daily=inflow_frame(daily_rows, "day"),
+    )
+
+
+@cached_per_user
+def _load_dashboard(user_id):
+    with connection(user_id) as conn:
+        if not conn.in_transaction:
+            # 显式开启读事务：之后的所有查询读取同一个快照
+            conn.execute("BEGIN")
+        balance = read_balance(conn, user_id)
+        wish_counts = conn.execute(WISH_COUNTS_SQL, (user_id,)).fetchall()
+        pending_rows = conn.execute(PENDING_WISHES_SQL, (user_id,)).fetchall()
+        habit_rows = conn.execute(HABIT_BREAKDOWN_SQL, (user_id,)).fetchall()
+        monthly = read_rollup(conn, "inflow_monthly", "month", user_id)
+        daily = read_rollup(conn, "inflow_daily", "day", user_id)
+    return build_snapshot(user_id, balance, wish_counts, pending_rows, habit_rows, monthly, daily)
+
+
+def load_dashboard(user_id):
+    """
+    Everything the dashboard shows for user_id as a DashboardSnapshot, read in
+    one transaction. Cached until the user's data changes, read-only.
+    """
+    try:
+        return _load_dashboard(user_id)
+    except Exception as e:
+        print(f"Error in load_dashboard: {e}")
+        return DashboardSnapshot.empty(user_id)
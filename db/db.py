@@ -1,316 +1,626 @@
-import sqlite3
-import os
-from datetime import datetime
-
-DB_PATH = os.path.join(os.path.dirname(__file__), "db.sqlite3")
-
-
-def get_conn():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
-
-
-def init_db(force_rebuild=False):
-    conn = get_conn()
-    cursor = conn.cursor()
-
+from datetime import date as date_cls, datetime, timedelta
+
+from db import shards
+from db.cache import cache_stats, cached_per_user, invalidate_all, invalidate_user  # noqa: F401
+from db.ledger import read_balance, rebuild_balances
+from db.migrations import ensure_schema
+from db.models import Attendance, HabitCheckin, HabitTask, Income, Wish, fetch_all
+from db.paging import PAGE_SIZE, make_page
+from db.planner import plan_unlock
+from db.pool import DB_PATH, connection, get_conn, pool_at, transaction  # noqa: F401  get_conn 供旧代码使用
+from db.rollups import inflow_frame, read_rollup, rebuild_rollups
+from db.streaks import note_checkins
+from db.writer import serialized
+
+
+def init_db(force_rebuild=False, force_check=False):
+    """
+    Make sure the schema is current. Cheap after the first call in a process
+    (see db.migrations.ensure_schema); old databases are upgraded in place.
+    force_rebuild drops every table first and is never triggered automatically.
+    """
     if force_rebuild:
-        # 关闭外键约束
-        cursor.executescript("""
-        PRAGMA foreign_keys = OFF;
-        DROP VIEW IF EXISTS v_pool_inflows;
-        DROP TABLE IF EXISTS attendance;
-        DROP TABLE IF EXISTS habit_checkin;
-        DROP TABLE IF EXISTS habit_task;
-        DROP TABLE IF EXISTS income;
-        DROP TABLE IF EXISTS wishlist;
-        """)
-        conn.commit()
-
-    # 建表，所有表都带 user_id
-    cursor.executescript(
-        """
-        CREATE TABLE IF NOT EXISTS income (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            title TEXT NOT NULL,
-            daily_amount REAL NOT NULL,
-            user_id TEXT NOT NULL
-        );
-
-        CREATE TABLE IF NOT EXISTS attendance (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            income_id INTEGER NOT NULL,
-            date TEXT NOT NULL,
-            earned_amount REAL NOT NULL,
-            user_id TEXT NOT NULL,
-            FOREIGN KEY(income_id) REFERENCES income(id)
-        );
-
-        CREATE TABLE IF NOT EXISTS habit_task (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            title TEXT NOT NULL,
-            reward_amount REAL NOT NULL,
-            user_id TEXT NOT NULL
-        );
-
-        CREATE TABLE IF NOT EXISTS habit_checkin (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            task_id INTEGER NOT NULL,
-            date TEXT NOT NULL,
-            reward_amount REAL NOT NULL,
-            user_id TEXT NOT NULL,
-            FOREIGN KEY(task_id) REFERENCES habit_task(id)
-        );
-
-        CREATE TABLE IF NOT EXISTS wishlist (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            title TEXT NOT NULL,
-            target_amount REAL NOT NULL,
-            priority INTEGER DEFAULT 0,
-            status INTEGER DEFAULT 0,
-            unlocked_at TEXT,
-            user_id TEXT NOT NULL
-        );
-        """
-    )
-
-    # 可选：重建 v_pool_inflows 视图（如 schema.sql）
-    cursor.executescript("""
-    CREATE VIEW IF NOT EXISTS v_pool_inflows AS
-        SELECT
-            'attendance' as type,
-            id as id,
-            date as date,
-            earned_amount as amount,
-            user_id as user_id
-        FROM attendance
-        UNION ALL
-        SELECT
-            'habit_checkin' as type,
-            id as id,
-            date as date,
-            reward_amount as amount,
-            user_id as user_id
-        FROM habit_checkin;
-    """)
-
-    cursor.execute("PRAGMA foreign_keys = ON;")
-    conn.commit()
-    conn.close()
+        for path in shards.database_paths():
+            with pool_at(path).connection() as conn:
+                objects = conn.execute(
+                    "SELECT type, name FROM sqlite_master "
+                    "WHERE type IN ('table', 'view') AND name NOT LIKE 'sqlite_%'").fetchall()
+                for kind, name in objects:
+                    conn.execute(f"DROP {kind.upper()} IF EXISTS {name}")
+                conn.execute("PRAGMA user_version = 0")
+    ensure_schema(force=force_rebuild or force_check)
+    if force_rebuild:
+        invalidate_all()
 
 # Income
 
 
+@serialized
 def add_income(title, daily_amount, user_id):
     try:
-        conn = get_conn()
-        c = conn.cursor()
-        c.execute("INSERT INTO income (title, daily_amount, user_id) VALUES (?, ?, ?)",
-                  (title, daily_amount, user_id))
-        conn.commit()
+        with connection(user_id) as conn:
+            conn.execute("INSERT INTO income (title, daily_amount, user_id) VALUES (?, ?, ?)",
+                         (title, daily_amount, user_id))
+            invalidate_user(user_id)
     except Exception as e:
         print(f"Error in add_income: {e}")
-        conn.rollback()
-    finally:
-        conn.close()
+
+
+@serialized
+def update_income(income_id, title, daily_amount, user_id):
+    try:
+        with connection(user_id) as conn:
+            conn.execute("UPDATE income SET title = ?, daily_amount = ? WHERE id = ? AND user_id = ?",
+                         (title, daily_amount, income_id, user_id))
+            invalidate_user(user_id)
+    except Exception as e:
+        print(f"Error in update_income: {e}")
+
+
+@serialized
+def delete_income(income_id, user_id):
+    try:
+        with connection(user_id) as conn:
+            conn.execute("DELETE FROM income WHERE id = ? AND user_id = ?",
+                         (income_id, user_id))
+            invalidate_user(user_id)
+    except Exception as e:
+        print(f"Error in delete_income: {e}")
+
+
+INCOME_SQL = "SELECT id, title, daily_amount FROM income WHERE user_id = ? ORDER BY id DESC"
 
 
 def list_income(user_id):
+    """models.Income rows of user_id, newest first."""
     try:
-        conn = get_conn()
-        c = conn.cursor()
-        c.execute(
-            "SELECT id, title, daily_amount FROM income WHERE user_id = ? ORDER BY id DESC", (user_id,))
-        rows = c.fetchall()
-        return [dict(row) for row in rows]
+        with connection(user_id) as conn:
+            return fetch_all(conn, Income, INCOME_SQL, (user_id,))
     except Exception as e:
         print(f"Error in list_income: {e}")
         return []
-    finally:
-        conn.close()
 
 # Attendance
 
+ADD_ATTENDANCE_SQL = "INSERT OR IGNORE INTO attendance (income_id, date, earned_amount, user_id) VALUES (?, ?, ?, ?)"
+DELETE_ATTENDANCE_SQL = "DELETE FROM attendance WHERE income_id = ? AND date = ? AND user_id = ?"
 
+
+@serialized
 def add_attendance(income_id, date, earned_amount, user_id):
+    """Returns True if a row was inserted, False if that day was already checked in."""
     try:
-        conn = get_conn()
-        c = conn.cursor()
-        c.execute(
-            "INSERT OR IGNORE INTO attendance (income_id, date, earned_amount, user_id) VALUES (?, ?, ?, ?)",
-            (income_id, date, earned_amount, user_id)
-        )
-        conn.commit()
+        with connection(user_id) as conn:
+            cur = conn.execute(ADD_ATTENDANCE_SQL, (income_id, date, earned_amount, user_id))
+            if cur.rowcount > 0:
+                invalidate_user(user_id)
+        return cur.rowcount > 0
     except Exception as e:
         print(f"Error in add_attendance: {e}")
-        conn.rollback()
-    finally:
-        conn.close()
+        return False
 
 
-def sum_attendance(user_id):
+@serialized
+def delete_attendance(income_id, date, user_id):
+    try:
+        with connection(user_id) as conn:
+            conn.execute(DELETE_ATTENDANCE_SQL, (income_id, date, user_id))
+            invalidate_user(user_id)
+    except Exception as e:
+        print(f"Error in delete_attendance: {e}")
+
+
+def date_range(start, end, weekdays=None):
+    """ISO dates from start to end inclusive, optionally only on the given weekdays (0=Monday)."""
+    if isinstance(start, str):
+        start = date_cls.fromisoformat(start)
+    if isinstance(end, str):
+        end = date_cls.fromisoformat(end)
+    days = (start + timedelta(days=i) for i in range((end - start).days + 1))
+    if weekdays is not None:
+        weekdays = set(weekdays)
+        days = (d for d in days if d.weekday() in weekdays)
+    return [d.isoformat() for d in days]
+
+
+@serialized
+def add_attendance_range(user_id, income_id, start, end, weekdays=None):
+    """
+    Back-fill attendance for income_id on every day from start to end (inclusive),
+    optionally only on the given weekdays (0=Monday ... 6=Sunday).
+    All rows go in with one executemany inside a single write transaction;
+    days that are already checked in are skipped by the unique index.
+    Returns dict(inserted=..., skipped=...).
+    """
+    dates = date_range(start, end, weekdays)
     try:
-        conn = get_conn()
-        c = conn.cursor()
-        c.execute(
-            "SELECT SUM(earned_amount) FROM attendance WHERE user_id = ?", (user_id,))
-        result = c.fetchone()[0]
-        return result or 0
+        with transaction(user_id) as conn:
+            row = conn.execute("SELECT daily_amount FROM income WHERE id = ? AND user_id = ?",
+                               (income_id, user_id)).fetchone()
+            if row is None or not dates:
+                return {"inserted": 0, "skipped": len(dates)}
+            cur = conn.executemany(ADD_ATTENDANCE_SQL, [(income_id, d, row[0], user_id) for d in dates])
+            inserted = cur.rowcount
+            if inserted:
+                invalidate_user(user_id)
+        return {"inserted": inserted, "skipped": len(dates) - inserted}
     except Exception as e:
-        print(f"Error in sum_attendance: {e}")
-        return 0
-    finally:
-        conn.close()
+        print(f"Error in add_attendance_range: {e}")
+        return {"inserted": 0, "skipped": 0}
+
+
+def sum_attendance(user_id):
+    return get_balance_summary(user_id)["attendance_total"]
 
 # Habits
 
 
+@serialized
 def add_habit_task(title, reward_amount, user_id):
     try:
-        conn = get_conn()
-        c = conn.cursor()
-        c.execute("INSERT INTO habit_task (title, reward_amount, user_id) VALUES (?, ?, ?)",
-                  (title, reward_amount, user_id))
-        conn.commit()
+        with connection(user_id) as conn:
+            conn.execute("INSERT INTO habit_task (title, reward_amount, user_id) VALUES (?, ?, ?)",
+                         (title, reward_amount, user_id))
+            invalidate_user(user_id)
     except Exception as e:
         print(f"Error in add_habit_task: {e}")
-        conn.rollback()
-    finally:
-        conn.close()
+
+
+@serialized
+def update_habit_task(task_id, title, reward_amount, user_id):
+    try:
+        with connection(user_id) as conn:
+            conn.execute("UPDATE habit_task SET title=?, reward_amount=? WHERE id=? AND user_id=?",
+                         (title, reward_amount, task_id, user_id))
+            invalidate_user(user_id)
+    except Exception as e:
+        print(f"Error in update_habit_task: {e}")
+
+
+@serialized
+def delete_habit_task(task_id, user_id):
+    # 仅删除习惯任务，不删除 habit_checkin 表中的历史记录
+    try:
+        with connection(user_id) as conn:
+            conn.execute("DELETE FROM habit_task WHERE id=? AND user_id=?",
+                         (task_id, user_id))
+            invalidate_user(user_id)
+    except Exception as e:
+        print(f"Error in delete_habit_task: {e}")
+
+
+HABIT_TASKS_SQL = "SELECT id, title, reward_amount FROM habit_task WHERE user_id = ? ORDER BY id DESC"
 
 
 def list_habit_tasks(user_id):
+    """models.HabitTask rows of user_id, newest first."""
     try:
-        conn = get_conn()
-        c = conn.cursor()
-        c.execute(
-            "SELECT id, title, reward_amount FROM habit_task WHERE user_id = ? ORDER BY id DESC", (user_id,))
-        rows = c.fetchall()
-        return [dict(row) for row in rows]
+        with connection(user_id) as conn:
+            return fetch_all(conn, HabitTask, HABIT_TASKS_SQL, (user_id,))
     except Exception as e:
         print(f"Error in list_habit_tasks: {e}")
         return []
-    finally:
-        conn.close()
 
 
+@serialized
 def add_habit_checkin(task_id, date, reward_amount, user_id):
+    """Returns True if a row was inserted, False if that day was already checked in."""
     try:
-        conn = get_conn()
-        c = conn.cursor()
-        c.execute(
-            "INSERT INTO habit_checkin (task_id, date, reward_amount, user_id) VALUES (?, ?, ?, ?)",
-            (task_id, date, reward_amount, user_id)
-        )
-        conn.commit()
+        with connection(user_id) as conn:
+            cur = conn.execute(
+                "INSERT OR IGNORE INTO habit_checkin (task_id, date, reward_amount, user_id) VALUES (?, ?, ?, ?)",
+                (task_id, date, reward_amount, user_id)
+            )
+            if cur.rowcount > 0:
+                invalidate_user(user_id)
+                note_checkins(user_id, [(task_id, date, True)])
+        return cur.rowcount > 0
     except Exception as e:
         print(f"Error in add_habit_checkin: {e}")
-        conn.rollback()
-    finally:
-        conn.close()
+        return False
+
+
+DELETE_HABIT_CHECKIN_SQL = "DELETE FROM habit_checkin WHERE id = ? AND user_id = ?"
+
+
+@serialized
+def delete_habit_checkin(checkin_id, user_id):
+    try:
+        with transaction(user_id) as conn:
+            deleted = conn.execute("SELECT task_id, date FROM habit_checkin WHERE id = ? AND user_id = ?",
+                                   (checkin_id, user_id)).fetchall()
+            conn.execute(DELETE_HABIT_CHECKIN_SQL, (checkin_id, user_id))
+            invalidate_user(user_id)
+            note_checkins(user_id, [(task_id, day, False) for task_id, day in deleted])
+    except Exception as e:
+        print(f"Error in delete_habit_checkin: {e}")
+
+
+DAY_CHECKINS_SQL = """
+    SELECT hc.id, hc.task_id, hc.date, hc.reward_amount, ht.title FROM habit_checkin hc
+    JOIN habit_task ht ON hc.task_id = ht.id
+    WHERE hc.date = ? AND hc.user_id = ? ORDER BY hc.id"""
+
+
+def list_habit_checkins(user_id, date):
+    """
+    Check-ins of user_id on date (YYYY-MM-DD) for habits that still exist, as
+    models.HabitCheckin. Their task_ids are the habits already done that day.
+    """
+    try:
+        with connection(user_id) as conn:
+            return fetch_all(conn, HabitCheckin, DAY_CHECKINS_SQL, (date, user_id))
+    except Exception as e:
+        print(f"Error in list_habit_checkins: {e}")
+        return []
+
+# Check-in history
+
+
+# kind -> (打卡表, 来源表, 外键列, 金额列)
+CHECKIN_KINDS = {
+    "attendance": ("attendance", "income", "income_id", "earned_amount"),
+    "habit": ("habit_checkin", "habit_task", "task_id", "reward_amount"),
+}
+CHECKIN_MODELS = {"attendance": Attendance, "habit": HabitCheckin}
+CHECKIN_PAGE_SQL = """
+    SELECT c.id, c.{source_id}, c.date, c.{amount}, s.title
+    FROM {table} c LEFT JOIN {source} s ON s.id = c.{source_id}
+    WHERE c.user_id = ? {before}
+    ORDER BY c.date DESC, c.id DESC LIMIT ?"""
+CHECKIN_PAGE_BEFORE = "AND (c.date, c.id) < (?, ?)"
+
+
+def list_checkins_page(user_id, kind, before=None, limit=PAGE_SIZE):
+    """
+    One page of user_id's check-in history, newest first: kind is "attendance"
+    or "habit", before the (date, id) cursor of the previous page's last row.
+    Returns a paging.Page of models.Attendance or models.HabitCheckin; title
+    is None once the income/habit has been deleted. A seek on (user_id,
+    date), so every page costs the same.
+    """
+    table, source, source_id, amount = CHECKIN_KINDS[kind]
+    sql = CHECKIN_PAGE_SQL.format(table=table, source=source, source_id=source_id, amount=amount,
+                                  before="" if before is None else CHECKIN_PAGE_BEFORE)
+    try:
+        with connection(user_id) as conn:
+            rows = fetch_all(conn, CHECKIN_MODELS[kind], sql, [user_id, *(before or ()), limit + 1])
+        return make_page(rows, limit, lambda c: (c.date, c.id))
+    except Exception as e:
+        print(f"Error in list_checkins_page: {e}")
+        return make_page([], limit, None)
+
+
+@serialized
+def add_habit_checkins(user_id, task_ids, dates):
+    """
+    Check in every habit in task_ids on every date in dates (ISO strings or
+    datetime.date), using each habit's current reward_amount.
+    One executemany inside a single write transaction; existing check-ins are
+    skipped by the unique index, as are task ids that are not the user's.
+    Returns dict(inserted=..., skipped=...).
+    """
+    task_ids = list(task_ids)
+    dates = [d if isinstance(d, str) else d.isoformat() for d in dates]
+    total = len(task_ids) * len(dates)
+    if not total:
+        return {"inserted": 0, "skipped": 0}
+    try:
+        with transaction(user_id) as conn:
+            placeholders = ",".join("?" * len(task_ids))
+            rewards = conn.execute(
+                f"SELECT id, reward_amount FROM habit_task WHERE user_id = ? AND id IN ({placeholders}) ORDER BY id",
+                [user_id, *task_ids]).fetchall()
+            cur = conn.executemany(
+                "INSERT OR IGNORE INTO habit_checkin (task_id, date, reward_amount, user_id) VALUES (?, ?, ?, ?)",
+                [(task_id, d, reward, user_id) for task_id, reward in rewards for d in dates]
+            )
+            inserted = cur.rowcount
+            if inserted:
+                invalidate_user(user_id)
+                # 已存在的打卡日在补丁中被忽略，无需区分哪些是新插入的
+                note_checkins(user_id, [(task_id, d, True) for task_id, _ in rewards for d in dates])
+        return {"inserted": inserted, "skipped": total - inserted}
+    except Exception as e:
+        print(f"Error in add_habit_checkins: {e}")
+        return {"inserted": 0, "skipped": 0}
 
 
 def sum_habits(user_id):
+    return get_balance_summary(user_id)["habit_total"]
+
+
+HABIT_BREAKDOWN_SQL = """
+    SELECT ht.title, COALESCE(SUM(hc.reward_amount), 0) as total_reward
+    FROM habit_checkin hc
+    JOIN habit_task ht ON hc.task_id = ht.id
+    WHERE hc.user_id = ?
+    GROUP BY ht.title
+    HAVING total_reward > 0
+    ORDER BY total_reward DESC
+"""
+
+
+@cached_per_user
+def _load_habit_breakdown(user_id):
+    import pandas as pd
+
+    with connection(user_id) as conn:
+        return pd.read_sql(HABIT_BREAKDOWN_SQL, conn, params=(user_id,))
+
+
+def get_habit_breakdown(user_id):
+    """DataFrame(title, total_reward) of habit rewards per habit, largest first. Cached, read-only."""
     try:
-        conn = get_conn()
-        c = conn.cursor()
-        c.execute(
-            "SELECT SUM(reward_amount) FROM habit_checkin WHERE user_id = ?", (user_id,))
-        result = c.fetchone()[0]
-        return result or 0
+        return _load_habit_breakdown(user_id)
     except Exception as e:
-        print(f"Error in sum_habits: {e}")
-        return 0
-    finally:
-        conn.close()
+        print(f"Error in get_habit_breakdown: {e}")
+        import pandas as pd
+        return pd.DataFrame(columns=["title", "total_reward"])
 
 # Wishes
 
 
+@serialized
 def add_wish(title, target_amount, priority, user_id):
     try:
-        conn = get_conn()
-        c = conn.cursor()
-        c.execute("INSERT INTO wishlist (title, target_amount, priority, status, user_id) VALUES (?, ?, ?, 0, ?)",
-                  (title, target_amount, priority, user_id))
-        conn.commit()
+        with connection(user_id) as conn:
+            conn.execute("INSERT INTO wishlist (title, target_amount, priority, status, user_id) VALUES (?, ?, ?, 0, ?)",
+                         (title, target_amount, priority, user_id))
+            invalidate_user(user_id)
     except Exception as e:
         print(f"Error in add_wish: {e}")
-        conn.rollback()
-    finally:
-        conn.close()
+
+
+@serialized
+def update_wish(wish_id, title, target_amount, priority, user_id):
+    try:
+        with connection(user_id) as conn:
+            conn.execute(
+                "UPDATE wishlist SET title=?, target_amount=?, priority=? WHERE id=? AND user_id=?",
+                (title, target_amount, priority, wish_id, user_id))
+            invalidate_user(user_id)
+    except Exception as e:
+        print(f"Error in update_wish: {e}")
 
 
 def list_wishes(user_id, include_completed=True):
+    """models.Wish rows of user_id by status, priority and newest first."""
     try:
-        conn = get_conn()
-        c = conn.cursor()
-        if include_completed:
-            c.execute(
-                "SELECT id, title, target_amount, priority, status FROM wishlist WHERE user_id = ? ORDER BY status ASC, priority ASC, id DESC", (user_id,))
-        else:
-            c.execute(
-                "SELECT id, title, target_amount, priority, status FROM wishlist WHERE user_id = ? AND status=0 ORDER BY status ASC, priority ASC, id DESC", (user_id,))
-        rows = c.fetchall()
-        return [dict(row) for row in rows]
+        with connection(user_id) as conn:
+            if include_completed:
+                return fetch_all(
+                    conn, Wish,
+                    "SELECT id, title, target_amount, priority, status FROM wishlist WHERE user_id = ? ORDER BY status ASC, priority ASC, id DESC", (user_id,))
+            else:
+                return fetch_all(
+                    conn, Wish,
+                    "SELECT id, title, target_amount, priority, status FROM wishlist WHERE user_id = ? AND status=0 ORDER BY status ASC, priority ASC, id DESC", (user_id,))
     except Exception as e:
         print(f"Error in list_wishes: {e}")
         return []
-    finally:
-        conn.close()
 
 
+WISHES_BY_STATUS_SQL = """
+    SELECT id, title, target_amount, priority, status FROM wishlist
+    WHERE status IN ({placeholders}) AND user_id = ? ORDER BY priority ASC, id DESC"""
+
+
+def list_wishes_by_status(user_id, statuses):
+    """Wishes of user_id whose status is in statuses, as models.Wish in unlock order (priority ASC, id DESC)."""
+    statuses = list(statuses)
+    try:
+        with connection(user_id) as conn:
+            return fetch_all(conn, Wish, WISHES_BY_STATUS_SQL.format(placeholders=",".join("?" * len(statuses))),
+                             [*statuses, user_id])
+    except Exception as e:
+        print(f"Error in list_wishes_by_status: {e}")
+        return []
+
+
+# 与解锁顺序一致：同优先级的新心愿在前；after 接在上一页最后一行 (priority, id) 之后
+WISH_PAGE_SQL = """
+    SELECT id, title, target_amount, priority, status FROM wishlist
+    WHERE user_id = ? AND status = ? {after}
+    ORDER BY priority ASC, id DESC LIMIT ?"""
+WISH_PAGE_AFTER = "AND priority >= ? AND (priority > ? OR id < ?)"
+
+
+def list_wishes_page(user_id, statuses, after=None, limit=PAGE_SIZE):
+    """
+    One page of user_id's wishes whose status is in statuses, ordered by
+    status, then unlock order (priority ASC, id DESC); after is the cursor
+    (status, priority, id) of the previous page's last row. Returns a
+    paging.Page of models.Wish. Each status is one seek on (user_id, status,
+    priority), so every page costs the same however many wishes come before
+    it.
+    """
+    rows = []
+    try:
+        with connection(user_id) as conn:
+            for status in sorted(set(statuses)):
+                if after is not None and status < after[0]:
+                    continue
+                tail = after is not None and status == after[0]
+                sql = WISH_PAGE_SQL.format(after=WISH_PAGE_AFTER if tail else "")
+                seek = (after[1], after[1], after[2]) if tail else ()
+                rows += fetch_all(conn, Wish, sql, [user_id, status, *seek, limit + 1 - len(rows)])
+                if len(rows) > limit:
+                    break
+        return make_page(rows, limit, lambda w: (w.status, w.priority, w.id))
+    except Exception as e:
+        print(f"Error in list_wishes_page: {e}")
+        return make_page([], limit, None)
+
+
+WISH_COUNTS_SQL = "SELECT status, COUNT(*) FROM wishlist WHERE user_id = ? GROUP BY status"
+WISHLIST_FRAME_SQL = "SELECT * FROM wishlist WHERE user_id = ? ORDER BY status ASC, priority ASC, id DESC"
+
+
+@cached_per_user
+def _load_wishlist_frame(user_id):
+    import pandas as pd
+
+    with connection(user_id) as conn:
+        return pd.read_sql(WISHLIST_FRAME_SQL, conn, params=(user_id,))
+
+
+def get_wishlist_frame(user_id):
+    """All of a user's wishes as a DataFrame ordered by status, priority. Cached, read-only."""
+    try:
+        return _load_wishlist_frame(user_id)
+    except Exception as e:
+        print(f"Error in get_wishlist_frame: {e}")
+        import pandas as pd
+        return pd.DataFrame(columns=["id", "title", "target_amount", "priority", "status"])
+
+
+@serialized
 def unlock_wish(wish_id, user_id):
     try:
-        conn = get_conn()
-        c = conn.cursor()
-        c.execute(
-            "UPDATE wishlist SET status=1, unlocked_at=? WHERE id=? AND user_id=? AND status=0",
-            (datetime.now().isoformat(), wish_id, user_id)
-        )
-        conn.commit()
+        with connection(user_id) as conn:
+            conn.execute(
+                "UPDATE wishlist SET status=1, unlocked_at=? WHERE id=? AND user_id=? AND status=0",
+                (datetime.now().isoformat(), wish_id, user_id)
+            )
+            invalidate_user(user_id)
     except Exception as e:
         print(f"Error in unlock_wish: {e}")
-        conn.rollback()
-    finally:
-        conn.close()
+
+
+@serialized
+def complete_wish(wish_id, user_id):
+    try:
+        with connection(user_id) as conn:
+            conn.execute("UPDATE wishlist SET status=2 WHERE id=? AND user_id=?",
+                         (wish_id, user_id))
+            invalidate_user(user_id)
+    except Exception as e:
+        print(f"Error in complete_wish: {e}")
 
 
 def get_pool_balance(user_id):
+    return get_balance_summary(user_id)["balance"]
+
+
+@cached_per_user
+def _load_balance_summary(user_id):
+    with connection(user_id) as conn:
+        values = read_balance(conn, user_id)
+    return dict(zip(("attendance_total", "habit_total", "reserved", "balance"), values))
+
+
+def get_balance_summary(user_id):
+    """
+    Returns dict(attendance_total, habit_total, reserved, balance) from the
+    user_balance ledger (a single primary-key lookup). Cached, read-only.
+    """
+    try:
+        return _load_balance_summary(user_id)
+    except Exception as e:
+        print(f"Error in get_balance_summary: {e}")
+        return {"attendance_total": 0, "habit_total": 0, "reserved": 0, "balance": 0}
+
+
+@serialized
+def reconcile_balances(user_id=None):
+    """Rebuild the user_balance ledger and the inflow rollups from the raw tables (one user, or all users)."""
+    try:
+        if user_id is None:
+            for path in shards.database_paths():
+                with pool_at(path).connection() as conn:
+                    rebuild_balances(conn)
+                    rebuild_rollups(conn)
+            invalidate_all()
+            return
+        with connection(user_id) as conn:
+            rebuild_balances(conn, user_id)
+            rebuild_rollups(conn, user_id)
+            invalidate_user(user_id)
+    except Exception as e:
+        print(f"Error in reconcile_balances: {e}")
+
+# Inflow charts
+
+
+@cached_per_user
+def _load_inflows(user_id, table, period, start, end):
+    with connection(user_id) as conn:
+        rows = read_rollup(conn, table, period, user_id, start, end)
+    return inflow_frame(rows, period)
+
+
+def get_daily_inflows(user_id, start=None, end=None):
+    """
+    Chart-ready daily inflows from the inflow_daily rollup: a DataFrame indexed
+    by day (YYYY-MM-DD) with attendance_amount, habit_amount and total columns.
+    Cached, read-only.
+    """
+    try:
+        return _load_inflows(user_id, "inflow_daily", "day", start, end)
+    except Exception as e:
+        print(f"Error in get_daily_inflows: {e}")
+        return inflow_frame([], "day")
+
+
+def get_monthly_inflows(user_id, start=None, end=None):
+    """Same as get_daily_inflows, per month (YYYY-MM) from the inflow_monthly rollup."""
+    try:
+        return _load_inflows(user_id, "inflow_monthly", "month", start, end)
+    except Exception as e:
+        print(f"Error in get_monthly_inflows: {e}")
+        return inflow_frame([], "month")
+
+
+# 解锁计划的输入：未解锁心愿 (id, target_amount, priority)，按解锁顺序
+PLAN_WISHES_SQL = """
+    SELECT id, target_amount, priority FROM wishlist WHERE user_id = ? AND status = 0
+    ORDER BY priority ASC, id DESC"""
+
+
+def _pending_wishes(conn, user_id):
+    return conn.execute(PLAN_WISHES_SQL, (user_id,)).fetchall()
+
+
+def preview_unlock_plan(user_id, strategy="priority"):
+    """
+    Compute, without applying it, the unlock plan greedy_unlock(user_id, strategy)
+    would apply right now. Returns a planner.Plan, or None on error.
+    """
     try:
-        attendance_total = sum_attendance(user_id)
-        habits_total = sum_habits(user_id)
-        conn = get_conn()
-        c = conn.cursor()
-        c.execute(
-            "SELECT SUM(target_amount) FROM wishlist WHERE status=1 AND user_id=?", (user_id,))
-        used = c.fetchone()[0] or 0
-        return attendance_total + habits_total - used
+        with connection(user_id) as conn:
+            balance = read_balance(conn, user_id)[3]
+            wishes = _pending_wishes(conn, user_id)
+        return plan_unlock(wishes, balance, strategy)
     except Exception as e:
-        print(f"Error in get_pool_balance: {e}")
-        return 0
-    finally:
-        conn.close()
+        print(f"Error in preview_unlock_plan: {e}")
+        return None
 
 
-def greedy_unlock(user_id):
+@serialized
+def greedy_unlock(user_id, strategy="priority"):
     """
-    Unlock as many wishes as possible with current pool balance (highest priority first).
+    Unlock as many wishes as possible with current pool balance.
+    strategy selects the planner (see db.planner): "priority" stops at the
+    first wish that does not fit (highest priority first), "skip" keeps going
+    past it, "knapsack" maximises the total priority weight unlocked.
     Returns list of wish ids unlocked.
+
+    Runs as one BEGIN IMMEDIATE transaction: the balance and the pending wishes
+    are read once under the write lock, the unlock set is computed in memory and
+    applied with a single executemany, so concurrent sessions of the same user
+    can never spend the same balance twice.
     """
     try:
-        balance = get_pool_balance(user_id)
-        wishes = list_wishes(user_id, include_completed=False)
-        unlocked_ids = []
-        wishes_sorted = sorted(wishes, key=lambda w: w['priority'])
-        for wish in wishes_sorted:
-            if wish['target_amount'] <= balance:
-                unlock_wish(wish['id'], user_id)
-                unlocked_ids.append(wish['id'])
-                balance -= wish['target_amount']
-            else:
-                break
+        with transaction(user_id) as conn:
+            balance = read_balance(conn, user_id)[3]
+            unlocked_ids = plan_unlock(_pending_wishes(conn, user_id), balance, strategy).wish_ids
+            if unlocked_ids:
+                now = datetime.now().isoformat()
+                conn.executemany(
+                    "UPDATE wishlist SET status=1, unlocked_at=? WHERE id=? AND user_id=? AND status=0",
+                    [(now, wish_id, user_id) for wish_id in unlocked_ids])
+                invalidate_user(user_id)
         return unlocked_ids
     except Exception as e:
         print(f"Error in greedy_unlock: {e}")
@@ -0,0 +1,226 @@
+"""
+Wish unlock forecasting.
+
+From a user's recent daily inflows (the inflow_daily rollup, i.e. attendance
+and habit_checkin per day) this projects when each pending wish unlocks if
+wishes keep unlocking in strict priority order (priority ASC, id DESC, as
+greedy_unlock does):
+
+- project_unlock_days: a recency-weighted accrual rate per source (recent
+  days count more, with a HALFLIFE_DAYS half-life) and cumulative-sum
+  arithmetic over the wish targets, one expected date per wish.
+- simulate_unlock_days: Monte Carlo futures built by resampling the observed
+  daily totals with the same recency weights; percentiles of the result give
+  P50/P90 unlock dates. Large runs are split across a process pool, one per
+  process, started with "spawn": the Streamlit server is multithreaded and
+  holds SQLite connections and the writer thread, which fork would copy.
+
+Everything is vectorised with NumPy; there are no per-day Python loops.
+"""
+import math
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date as date_cls, timedelta
+
+import numpy as np
+
+from db.analytics import PENDING_WISHES_SQL
+from db.cache import cached_per_user
+from db.ledger import read_balance
+from db.pool import connection
+from db.rollups import read_rollup
+
+WINDOW_DAYS = 90            # 拟合速率 / 重采样所用的最近天数
+HALFLIFE_DAYS = 30          # 权重半衰期：30 天前的一天只算今天的一半
+MAX_HORIZON_DAYS = 3650     # 模拟最多向后看 10 年，超出视为无法预计
+CHUNK_SIMS = 500            # 每块模拟的路径数，控制单块内存（路径数 × 天数）
+PARALLEL_MIN_SIMS = 5000    # 模拟次数达到该值才使用进程池
+SAMPLING_TABLE_SIZE = 16384  # 加权抽样查找表的长度
+
+
+def daily_history(conn, user_id, end=None, days=WINDOW_DAYS):
+    """
+    Dense per-day inflows for the days days ending at end (default today):
+    returns (start_date, attendance, habit) where both arrays have one entry
+    per day, zero on days without check-ins.
+    """
+    end = end or date_cls.today()
+    start = end - timedelta(days=days - 1)
+    rows = read_rollup(conn, "inflow_daily", "day", user_id, start.isoformat(), end.isoformat())
+    return (start, *dense_history(rows, start, days))
+
+
+def dense_history(rows, start, days):
+    """(attendance, habit) arrays of days entries from start for read_rollup rows (day, attendance, habit)."""
+    attendance = np.zeros(days)
+    habit = np.zeros(days)
+    if rows:
+        offsets = (np.array([r[0] for r in rows], dtype="datetime64[D]")
+                   - np.datetime64(start.isoformat(), "D")).astype(np.int64)
+        attendance[offsets] = [r[1] for r in rows]
+        habit[offsets] = [r[2] for r in rows]
+    return attendance, habit
+
+
+def recency_weights(days, halflife=HALFLIFE_DAYS):
+    """Normalised weights for days consecutive days ending today, halving every halflife days."""
+    age = np.arange(days - 1, -1, -1, dtype=float)
+    weights = 0.5 ** (age / halflife)
+    return weights / weights.sum()
+
+
+def fit_rate(daily, halflife=HALFLIFE_DAYS):
+    """Recency-weighted mean of a per-day inflow array (oldest first): the recent amount per day."""
+    if not len(daily):
+        return 0.0
+    return float(np.dot(recency_weights(len(daily), halflife), daily))
+
+
+def project_unlock_days(balance, targets, rate):
+    """
+    Days from today until each wish in targets (priority order) unlocks at a
+    constant rate per day. 0 means it is affordable now; inf means never.
+    """
+    shortfall = np.maximum(np.cumsum(np.asarray(targets, dtype=float)) - balance, 0.0)
+    if rate <= 0:
+        return np.where(shortfall > 0, np.inf, 0.0)
+    return np.ceil(shortfall / rate)
+
+
+def _simulate_chunk(args):
+    """一块蒙特卡洛模拟：返回 (路径数 × 心愿数) 的解锁天数，超出 horizon 为 inf"""
+    shortfall, table, n_sims, horizon, seed = args
+    rng = np.random.default_rng(seed)
+    paths = np.cumsum(table[rng.integers(0, len(table), size=(n_sims, horizon))], axis=1)
+    # 路径单调不减：给每条路径加上递增偏移后整体一次 searchsorted，
+    # 得到每条路径上低于各缺口的天数，+1 即为首次够钱的那天
+    offset = float(paths[:, -1].max() + shortfall.max() + 1) * np.arange(n_sims)
+    flat = (paths + offset[:, None]).ravel()
+    below = np.searchsorted(flat, shortfall[None, :] + offset[:, None]) - np.arange(n_sims)[:, None] * horizon
+    days = below.astype(float) + 1
+    days[days > horizon] = np.inf
+    days[:, shortfall <= 0] = 0.0
+    return days
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    """模块共用的进程池，首次需要时创建；用 spawn 启动子进程，不复制服务进程的线程与连接"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=os.cpu_count() or 1,
+                                            mp_context=multiprocessing.get_context("spawn"))
+        return _executor
+
+
+def _discard_executor(executor):
+    """子进程异常退出后进程池不可再用：丢弃它，下次重新创建"""
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False)
+
+
+def _horizon(shortfall, daily_totals, weights):
+    mean = float(np.dot(weights, daily_totals))
+    if mean <= 0:
+        return 1
+    return int(min(MAX_HORIZON_DAYS, math.ceil(float(shortfall.max()) / mean * 2) + 30))
+
+
+def simulate_unlock_days(balance, targets, daily_totals, n_sims=10_000, seed=None, workers=None):
+    """
+    Monte Carlo unlock days: each simulated future draws every day's inflow
+    from daily_totals (oldest first, with replacement, recent days weighted
+    as in fit_rate). Returns an (n_sims, len(targets)) array of days until
+    each wish unlocks, inf if not within MAX_HORIZON_DAYS.
+    Runs of at least PARALLEL_MIN_SIMS are spread over the module's shared
+    process pool (CPU count processes, started on first use) unless workers
+    is 1 or there is a single CPU.
+    """
+    shortfall = np.maximum(np.cumsum(np.asarray(targets, dtype=float)) - balance, 0.0)
+    daily_totals = np.asarray(daily_totals, dtype=float)
+    if not len(shortfall) or n_sims <= 0:
+        return np.zeros((max(n_sims, 0), len(shortfall)))
+    if not len(daily_totals) or daily_totals.max() <= 0:
+        return np.tile(np.where(shortfall > 0, np.inf, 0.0), (n_sims, 1))
+
+    weights = recency_weights(len(daily_totals))
+    horizon = _horizon(shortfall, daily_totals, weights)
+    # 按权重把每天的金额重复若干次做成查找表，均匀抽下标即为加权抽样，比 choice(p=...) 快一个数量级
+    table = np.repeat(daily_totals, np.round(weights * SAMPLING_TABLE_SIZE).astype(np.int64))
+    sizes = [CHUNK_SIMS] * (n_sims // CHUNK_SIMS) + ([n_sims % CHUNK_SIMS] if n_sims % CHUNK_SIMS else [])
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    chunks = [(shortfall, table, size, horizon, s) for size, s in zip(sizes, seeds)]
+    workers = workers or os.cpu_count() or 1
+    if n_sims >= PARALLEL_MIN_SIMS and workers > 1:
+        executor = _get_executor()
+        try:
+            return np.concatenate(list(executor.map(_simulate_chunk, chunks)))
+        except BrokenProcessPool:
+            _discard_executor(executor)
+    return np.concatenate([_simulate_chunk(c) for c in chunks])
+
+
+def percentile_days(days, q):
+    """Per-wish q-th percentile of simulated unlock days (inf stays inf)."""
+    if not len(days):
+        return np.full(days.shape[1], np.nan)
+    return np.percentile(days, q, axis=0, method="higher")
+
+
+def _to_dates(today, days):
+    import pandas as pd
+
+    days = np.asarray(days, dtype=float)
+    out = np.full(days.shape, np.datetime64("NaT"), dtype="datetime64[D]")
+    finite = np.isfinite(days)
+    out[finite] = np.datetime64(today.isoformat(), "D") + days[finite].astype(np.int64)
+    return pd.to_datetime(out)
+
+
+@cached_per_user
+def _load_forecast(user_id, today, window, n_sims, seed):
+    with connection(user_id) as conn:
+        balance = read_balance(conn, user_id)[3]
+        wishes = conn.execute(PENDING_WISHES_SQL, (user_id,)).fetchall()
+        _, attendance, habit = daily_history(conn, user_id, today, window)
+    return forecast_frame(wishes, balance, attendance, habit, today, n_sims, seed)
+
+
+def forecast_frame(wishes, balance, attendance, habit, today, n_sims=0, seed=0):
+    """
+    The forecast_unlocks result for pending wishes rows (id, title,
+    target_amount, priority) in priority order, given the balance and the
+    dense daily history arrays ending today.
+    """
+    import pandas as pd
+
+    rates = {"attendance": fit_rate(attendance), "habit": fit_rate(habit)}
+    frame = pd.DataFrame([tuple(w) for w in wishes], columns=["id", "title", "target_amount", "priority"])
+    targets = frame["target_amount"].to_numpy(dtype=float)
+    frame["expected_date"] = _to_dates(today, project_unlock_days(balance, targets, sum(rates.values())))
+    if n_sims:
+        days = simulate_unlock_days(balance, targets, attendance + habit, n_sims, seed)
+        frame["p50_date"] = _to_dates(today, percentile_days(days, 50))
+        frame["p90_date"] = _to_dates(today, percentile_days(days, 90))
+    return frame, rates
+
+
+def forecast_unlocks(user_id, today=None, window=WINDOW_DAYS, n_sims=0, seed=0):
+    """
+    Forecast for every pending wish of user_id. Returns (frame, rates):
+    frame has id, title, target_amount, priority and expected_date (NaT when
+    the wish never unlocks at the current rate), plus p50_date and p90_date when
+    n_sims > 0; rates is the fitted amount per day per source.
+    Cached per user and day, read-only.
+    """
+    return _load_forecast(user_id, today or date_cls.today(), window, n_sims, seed)
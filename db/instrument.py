@@ -0,0 +1,195 @@
+"""
+Query instrumentation.
+
+While a Run is active on the current thread (one per Streamlit rerun, see
+ui.perf_panel), every statement executed through a pooled connection is
+recorded with its SQL, time spent (execute plus fetching) and the number of
+rows fetched or changed, together with the pool checkouts and newly opened
+connections of that run.
+
+Independently of runs, statements slower than SLOW_QUERY_MS are logged to
+the "db.slow" logger when WISHESFLOW_SLOW_QUERY_MS is set.
+
+Nothing is timed when neither is enabled: connections hand out plain cursors.
+"""
+import contextvars
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+
+SLOW_QUERY_MS = float(os.environ.get("WISHESFLOW_SLOW_QUERY_MS", 0) or 0) or None
+MAX_STATEMENTS = 500   # 单次重跑最多保留的语句数，超出只计数
+HISTORY_SIZE = 50      # recent_runs() 保留的最近完成的重跑数
+
+slow_log = logging.getLogger("db.slow")
+
+
+@dataclass
+class Statement:
+    sql: str
+    ms: float = 0.0
+    rows: int = 0
+
+
+@dataclass
+class Run:
+    label: str
+    started: float = field(default_factory=time.perf_counter)
+    last_activity: float = None   # 最近一次数据库操作结束的时间
+    finished: float = None
+    statements: list = field(default_factory=list)
+    statement_count: int = 0
+    checkouts: int = 0
+    connections_opened: int = 0
+
+    @property
+    def wall_ms(self):
+        """Time from the start of the run to its end (or to its last database activity)."""
+        return ((self.finished or self.last_activity or time.perf_counter()) - self.started) * 1000
+
+    @property
+    def query_ms(self):
+        return sum(s.ms for s in self.statements)
+
+    def slowest(self, n=5):
+        return sorted(self.statements, key=lambda s: s.ms, reverse=True)[:n]
+
+    def summary(self):
+        slowest = self.slowest(1)
+        return {
+            "label": self.label,
+            "wall_ms": round(self.wall_ms, 2),
+            "query_ms": round(self.query_ms, 2),
+            "statements": self.statement_count,
+            "checkouts": self.checkouts,
+            "connections_opened": self.connections_opened,
+            "slowest_sql": slowest[0].sql if slowest else "",
+            "slowest_ms": round(slowest[0].ms, 2) if slowest else 0.0,
+        }
+
+
+_current = contextvars.ContextVar("wishesflow_run", default=None)
+_history = deque(maxlen=HISTORY_SIZE)
+_history_lock = threading.Lock()
+
+
+def active():
+    """True when statements should be timed on this thread."""
+    return SLOW_QUERY_MS is not None or _current.get() is not None
+
+
+def start_run(label):
+    """Start recording a new run on the current thread and return it."""
+    run = Run(label)
+    _current.set(run)
+    return run
+
+
+def finish_run(run=None, at_last_activity=False):
+    """
+    Stop recording run (default: the current one) and add it to recent_runs().
+    With at_last_activity the run is taken to have ended at its last database
+    activity, for runs that are only closed once the next one starts.
+    """
+    run = run or _current.get()
+    if run is None:
+        return None
+    if _current.get() is run:
+        _current.set(None)
+    if run.finished is None:
+        run.finished = (run.last_activity or run.started) if at_last_activity else time.perf_counter()
+        with _history_lock:
+            _history.append(run)
+    return run
+
+
+def current_run():
+    return _current.get()
+
+
+def recent_runs():
+    """Finished runs, oldest first (all sessions of this process)."""
+    with _history_lock:
+        return list(_history)
+
+
+def note_checkout(opened):
+    run = _current.get()
+    if run is not None:
+        run.checkouts += 1
+        run.connections_opened += opened
+        run.last_activity = time.perf_counter()
+
+
+def _record(sql, ms, rows):
+    run = _current.get()
+    statement = None
+    if run is not None:
+        run.statement_count += 1
+        run.last_activity = time.perf_counter()
+        if len(run.statements) < MAX_STATEMENTS:
+            statement = Statement(" ".join(sql.split()), ms, rows)
+            run.statements.append(statement)
+    if SLOW_QUERY_MS is not None and ms >= SLOW_QUERY_MS:
+        slow_log.warning("slow query %.1f ms (%d rows): %s", ms, rows, " ".join(sql.split()))
+    return statement
+
+
+class TimedCursor(sqlite3.Cursor):
+    """Cursor that records each statement; fetch time and rows are added to the statement's record."""
+
+    _statement = None
+
+    def _timed(self, method, sql, *args):
+        start = time.perf_counter()
+        try:
+            return method(sql, *args)
+        finally:
+            ms = (time.perf_counter() - start) * 1000
+            self._statement = _record(sql, ms, max(self.rowcount, 0))
+
+    def execute(self, sql, parameters=()):
+        return self._timed(super().execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self._timed(super().executemany, sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self._timed(super().executescript, sql_script)
+
+    def _fetched(self, start, rows):
+        if self._statement is not None:
+            now = time.perf_counter()
+            self._statement.ms += (now - start) * 1000
+            self._statement.rows += rows
+            run = _current.get()
+            if run is not None:
+                run.last_activity = now
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        self._fetched(start, row is not None)
+        return row
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._fetched(start, len(rows))
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        self._fetched(start, len(rows))
+        return rows
+
+    def __next__(self):
+        start = time.perf_counter()
+        row = super().__next__()
+        self._fetched(start, 1)
+        return row
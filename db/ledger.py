@@ -0,0 +1,169 @@
+"""
+Per-user balance ledger.
+
+user_balance holds, for every user, the inflow totals per source, the amount
+reserved by unlocked wishes (status = 1) and the resulting balance. Triggers
+on attendance, habit_checkin and wishlist keep it exact on every write, so
+reading a balance is a primary-key lookup. rebuild_balances() recomputes it
+from the raw tables, e.g. after bulk maintenance done with triggers dropped.
+"""
+
+# db/schema.sql 中有同样的建表与触发器定义，修改时一并更新
+LEDGER_DDL = (
+    """
+    CREATE TABLE IF NOT EXISTS user_balance (
+        user_id TEXT PRIMARY KEY,
+        attendance_total REAL NOT NULL DEFAULT 0,
+        habit_total REAL NOT NULL DEFAULT 0,
+        reserved REAL NOT NULL DEFAULT 0,       -- 已解锁(status=1)心愿占用的金额
+        balance REAL NOT NULL DEFAULT 0         -- attendance_total + habit_total - reserved
+    ) WITHOUT ROWID""",
+    # 考勤
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_attendance_ledger_insert AFTER INSERT ON attendance
+    BEGIN
+        INSERT OR IGNORE INTO user_balance (user_id) VALUES (NEW.user_id);
+        UPDATE user_balance
+           SET attendance_total = attendance_total + NEW.earned_amount,
+               balance = balance + NEW.earned_amount
+         WHERE user_id = NEW.user_id;
+    END""",
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_attendance_ledger_delete AFTER DELETE ON attendance
+    BEGIN
+        UPDATE user_balance
+           SET attendance_total = attendance_total - OLD.earned_amount,
+               balance = balance - OLD.earned_amount
+         WHERE user_id = OLD.user_id;
+    END""",
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_attendance_ledger_update
+    AFTER UPDATE OF earned_amount, user_id ON attendance
+    BEGIN
+        UPDATE user_balance
+           SET attendance_total = attendance_total - OLD.earned_amount,
+               balance = balance - OLD.earned_amount
+         WHERE user_id = OLD.user_id;
+        INSERT OR IGNORE INTO user_balance (user_id) VALUES (NEW.user_id);
+        UPDATE user_balance
+           SET attendance_total = attendance_total + NEW.earned_amount,
+               balance = balance + NEW.earned_amount
+         WHERE user_id = NEW.user_id;
+    END""",
+    # 习惯打卡
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_habit_checkin_ledger_insert AFTER INSERT ON habit_checkin
+    BEGIN
+        INSERT OR IGNORE INTO user_balance (user_id) VALUES (NEW.user_id);
+        UPDATE user_balance
+           SET habit_total = habit_total + NEW.reward_amount,
+               balance = balance + NEW.reward_amount
+         WHERE user_id = NEW.user_id;
+    END""",
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_habit_checkin_ledger_delete AFTER DELETE ON habit_checkin
+    BEGIN
+        UPDATE user_balance
+           SET habit_total = habit_total - OLD.reward_amount,
+               balance = balance - OLD.reward_amount
+         WHERE user_id = OLD.user_id;
+    END""",
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_habit_checkin_ledger_update
+    AFTER UPDATE OF reward_amount, user_id ON habit_checkin
+    BEGIN
+        UPDATE user_balance
+           SET habit_total = habit_total - OLD.reward_amount,
+               balance = balance - OLD.reward_amount
+         WHERE user_id = OLD.user_id;
+        INSERT OR IGNORE INTO user_balance (user_id) VALUES (NEW.user_id);
+        UPDATE user_balance
+           SET habit_total = habit_total + NEW.reward_amount,
+               balance = balance + NEW.reward_amount
+         WHERE user_id = NEW.user_id;
+    END""",
+    # 心愿：只有 status = 1（已解锁、待完成）的心愿占用资金
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_wishlist_ledger_insert AFTER INSERT ON wishlist
+    WHEN NEW.status = 1
+    BEGIN
+        INSERT OR IGNORE INTO user_balance (user_id) VALUES (NEW.user_id);
+        UPDATE user_balance
+           SET reserved = reserved + NEW.target_amount,
+               balance = balance - NEW.target_amount
+         WHERE user_id = NEW.user_id;
+    END""",
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_wishlist_ledger_delete AFTER DELETE ON wishlist
+    WHEN OLD.status = 1
+    BEGIN
+        UPDATE user_balance
+           SET reserved = reserved - OLD.target_amount,
+               balance = balance + OLD.target_amount
+         WHERE user_id = OLD.user_id;
+    END""",
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_wishlist_ledger_update
+    AFTER UPDATE OF status, target_amount, user_id ON wishlist
+    WHEN OLD.status = 1 OR NEW.status = 1
+    BEGIN
+        UPDATE user_balance
+           SET reserved = reserved - OLD.target_amount,
+               balance = balance + OLD.target_amount
+         WHERE user_id = OLD.user_id AND OLD.status = 1;
+        INSERT OR IGNORE INTO user_balance (user_id) VALUES (NEW.user_id);
+        UPDATE user_balance
+           SET reserved = reserved + NEW.target_amount,
+               balance = balance - NEW.target_amount
+         WHERE user_id = NEW.user_id AND NEW.status = 1;
+    END""",
+)
+
+_REBUILD_SQL = """
+    INSERT INTO user_balance (user_id, attendance_total, habit_total, reserved, balance)
+    SELECT user_id,
+           SUM(attendance_total), SUM(habit_total), SUM(reserved),
+           SUM(attendance_total) + SUM(habit_total) - SUM(reserved)
+    FROM (
+        SELECT user_id, SUM(earned_amount) AS attendance_total, 0 AS habit_total, 0 AS reserved
+        FROM attendance {where} GROUP BY user_id
+        UNION ALL
+        SELECT user_id, 0, SUM(reward_amount), 0
+        FROM habit_checkin {where} GROUP BY user_id
+        UNION ALL
+        SELECT user_id, 0, 0, SUM(target_amount)
+        FROM wishlist WHERE status = 1 {and_user} GROUP BY user_id
+    )
+    GROUP BY user_id
+"""
+
+
+def create_ledger(conn):
+    for statement in LEDGER_DDL:
+        conn.execute(statement)
+
+
+def rebuild_balances(conn, user_id=None):
+    """
+    Recompute user_balance from the raw tables (for one user, or everyone).
+    Runs on the caller's connection and transaction.
+    """
+    if user_id is None:
+        conn.execute("DELETE FROM user_balance")
+        conn.execute(_REBUILD_SQL.format(where="", and_user=""))
+    else:
+        conn.execute("DELETE FROM user_balance WHERE user_id = ?", (user_id,))
+        conn.execute(
+            _REBUILD_SQL.format(where="WHERE user_id = ?", and_user="AND user_id = ?"),
+            (user_id, user_id, user_id))
+
+
+BALANCE_SQL = "SELECT attendance_total, habit_total, reserved, balance FROM user_balance WHERE user_id = ?"
+
+
+def read_balance(conn, user_id):
+    """Returns (attendance_total, habit_total, reserved, balance) with zeros for unknown users."""
+    row = conn.execute(BALANCE_SQL, (user_id,)).fetchone()
+    if row is None:
+        return 0, 0, 0, 0
+    return tuple(row)
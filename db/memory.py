@@ -0,0 +1,402 @@
+"""
+In-memory storage backend.
+
+MemoryRepository keeps every user's incomes, habits, check-ins and wishes in
+plain dicts and follows the SQLite backend's rules: ids are never reused
+(AUTOINCREMENT, ignored inserts included), one attendance per (income, day)
+and one check-in per (habit, day), deleting an income or habit keeps its
+check-ins, and the balance is maintained incrementally like the user_balance
+ledger (reserved = targets of unlocked wishes). With sharding (db.shards)
+ids are allocated per shard, as each shard file has its own sequences.
+Nothing touches the disk, so pages run against it measure UI logic only.
+
+    MemoryRepository.from_sqlite(path)   # copy an existing database
+"""
+import heapq
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+from db import shards
+from db.db import CHECKIN_MODELS, date_range
+from db.models import HabitCheckin, HabitTask, Income, Wish
+from db.paging import PAGE_SIZE, make_page
+from db.planner import plan_unlock
+from db.repository import Repository
+
+ID_TABLES = ("income", "attendance", "habit_task", "habit_checkin", "wishlist")
+
+
+class _UserData:
+    __slots__ = ("incomes", "tasks", "attendance", "attendance_ids", "checkins", "checkin_ids", "wishes",
+                 "attendance_total", "habit_total", "reserved")
+
+    def __init__(self):
+        self.incomes = {}       # id -> [title, daily_amount]
+        self.tasks = {}         # id -> [title, reward_amount]
+        self.attendance = {}    # (income_id, date) -> earned_amount
+        self.attendance_ids = {}  # (income_id, date) -> id
+        self.checkins = {}      # id -> (task_id, date, reward_amount)
+        self.checkin_ids = {}   # (task_id, date) -> id，对应唯一索引
+        self.wishes = {}        # id -> [title, target_amount, priority, status, unlocked_at, created_at]
+        self.attendance_total = 0.0
+        self.habit_total = 0.0
+        self.reserved = 0.0
+
+
+class MemoryRepository(Repository):
+    """A db.repository.Repository backed by dicts; safe to share between sessions (one lock)."""
+
+    def __init__(self):
+        self._users = {}
+        self._next_ids = {}   # 数据库文件（不分片时为 None）-> {表: 下一个 id}
+        self._lock = threading.RLock()
+
+    def _user(self, user_id):
+        data = self._users.get(user_id)
+        if data is None:
+            data = self._users[user_id] = _UserData()
+        return data
+
+    def _counters(self, database):
+        counters = self._next_ids.get(database)
+        if counters is None:
+            counters = self._next_ids[database] = dict.fromkeys(ID_TABLES, 1)
+        return counters
+
+    def _new_id(self, table, user_id):
+        counters = self._counters(shards.path_for(user_id) if shards.enabled() else None)
+        new_id = counters[table]
+        counters[table] = new_id + 1
+        return new_id
+
+    def _set_status(self, data, wish, status):
+        # 与 user_balance 触发器一致：进入/离开“已解锁”时增减 reserved
+        if wish[3] == 1:
+            data.reserved -= wish[1]
+        if status == 1:
+            data.reserved += wish[1]
+        wish[3] = status
+
+    # 收入来源
+
+    def list_income(self, user_id):
+        with self._lock:
+            incomes = self._user(user_id).incomes
+            return [Income(i, *incomes[i]) for i in sorted(incomes, reverse=True)]
+
+    def add_income(self, title, daily_amount, user_id):
+        with self._lock:
+            self._user(user_id).incomes[self._new_id("income", user_id)] = [title, float(daily_amount)]
+
+    def update_income(self, income_id, title, daily_amount, user_id):
+        with self._lock:
+            income = self._user(user_id).incomes.get(income_id)
+            if income is not None:
+                income[:] = [title, float(daily_amount)]
+
+    def delete_income(self, income_id, user_id):
+        with self._lock:
+            self._user(user_id).incomes.pop(income_id, None)
+
+    # 考勤打卡
+
+    def add_attendance(self, income_id, date, earned_amount, user_id):
+        with self._lock:
+            data = self._user(user_id)
+            attendance_id = self._new_id("attendance", user_id)
+            if (income_id, date) in data.attendance:
+                return False
+            data.attendance[(income_id, date)] = float(earned_amount)
+            data.attendance_ids[(income_id, date)] = attendance_id
+            data.attendance_total += earned_amount
+            return True
+
+    def add_attendance_range(self, user_id, income_id, start, end, weekdays=None):
+        dates = date_range(start, end, weekdays)
+        with self._lock:
+            income = self._user(user_id).incomes.get(income_id)
+            if income is None or not dates:
+                return {"inserted": 0, "skipped": len(dates)}
+            inserted = sum(self.add_attendance(income_id, d, income[1], user_id) for d in dates)
+            return {"inserted": inserted, "skipped": len(dates) - inserted}
+
+    def delete_attendance(self, income_id, date, user_id):
+        with self._lock:
+            data = self._user(user_id)
+            amount = data.attendance.pop((income_id, date), None)
+            if amount is not None:
+                del data.attendance_ids[(income_id, date)]
+                data.attendance_total -= amount
+
+    # 习惯与习惯打卡
+
+    def list_habit_tasks(self, user_id):
+        with self._lock:
+            tasks = self._user(user_id).tasks
+            return [HabitTask(i, *tasks[i]) for i in sorted(tasks, reverse=True)]
+
+    def add_habit_task(self, title, reward_amount, user_id):
+        with self._lock:
+            self._user(user_id).tasks[self._new_id("habit_task", user_id)] = [title, float(reward_amount)]
+
+    def update_habit_task(self, task_id, title, reward_amount, user_id):
+        with self._lock:
+            task = self._user(user_id).tasks.get(task_id)
+            if task is not None:
+                task[:] = [title, float(reward_amount)]
+
+    def delete_habit_task(self, task_id, user_id):
+        with self._lock:
+            self._user(user_id).tasks.pop(task_id, None)
+
+    def list_habit_checkins(self, user_id, date):
+        with self._lock:
+            data = self._user(user_id)
+            return [HabitCheckin(checkin_id, task_id, day, amount, data.tasks[task_id][0])
+                    for checkin_id, (task_id, day, amount) in sorted(data.checkins.items())
+                    if day == date and task_id in data.tasks]
+
+    def add_habit_checkin(self, task_id, date, reward_amount, user_id):
+        with self._lock:
+            data = self._user(user_id)
+            # 与 AUTOINCREMENT 一致：被唯一索引忽略的插入同样占用一个 id
+            checkin_id = self._new_id("habit_checkin", user_id)
+            if (task_id, date) in data.checkin_ids:
+                return False
+            data.checkins[checkin_id] = (task_id, date, float(reward_amount))
+            data.checkin_ids[(task_id, date)] = checkin_id
+            data.habit_total += reward_amount
+            return True
+
+    def add_habit_checkins(self, user_id, task_ids, dates):
+        task_ids = list(task_ids)
+        dates = [d if isinstance(d, str) else d.isoformat() for d in dates]
+        total = len(task_ids) * len(dates)
+        with self._lock:
+            tasks = self._user(user_id).tasks
+            # 与 SQLite 一致按 id 顺序插入，新打卡的 id 分配相同
+            inserted = sum(self.add_habit_checkin(task_id, d, tasks[task_id][1], user_id)
+                           for task_id in sorted(set(task_ids)) if task_id in tasks for d in dates)
+            return {"inserted": inserted, "skipped": total - inserted}
+
+    def delete_habit_checkin(self, checkin_id, user_id):
+        with self._lock:
+            data = self._user(user_id)
+            checkin = data.checkins.pop(checkin_id, None)
+            if checkin is not None:
+                del data.checkin_ids[checkin[:2]]
+                data.habit_total -= checkin[2]
+
+    def list_checkins_page(self, user_id, kind, before=None, limit=PAGE_SIZE):
+        with self._lock:
+            data = self._user(user_id)
+            if kind == "attendance":
+                sources = data.incomes
+                rows = ((day, data.attendance_ids[(income_id, day)], income_id, amount)
+                        for (income_id, day), amount in data.attendance.items())
+            else:
+                sources = data.tasks
+                rows = ((day, checkin_id, task_id, amount)
+                        for checkin_id, (task_id, day, amount) in data.checkins.items())
+            if before is not None:
+                rows = (r for r in rows if r[:2] < tuple(before))
+            model = CHECKIN_MODELS[kind]
+            rows = [model(checkin_id, source, day, amount, sources[source][0] if source in sources else None)
+                    for day, checkin_id, source, amount in heapq.nlargest(limit + 1, rows)]
+        return make_page(rows, limit, lambda c: (c.date, c.id))
+
+    def habit_stats(self, user_id, today=None):
+        from db.streaks import compute_stats
+
+        with self._lock:
+            days = sorted(self._user(user_id).checkin_ids)
+        return compute_stats(days, today)
+
+    # 心愿
+
+    def list_wishes_by_status(self, user_id, statuses):
+        with self._lock:
+            wishes = self._user(user_id).wishes
+            rows = [(w[2], -i) for i, w in wishes.items() if w[3] in statuses]
+            return [Wish(-i, *wishes[-i][:4]) for _, i in sorted(rows)]
+
+    def list_wishes_page(self, user_id, statuses, after=None, limit=PAGE_SIZE):
+        with self._lock:
+            wishes = self._user(user_id).wishes
+            # 同优先级按 id 倒序：以 -id 排序，游标仍是 (status, priority, id)
+            keys = ((w[3], w[2], -i) for i, w in wishes.items() if w[3] in statuses)
+            if after is not None:
+                status, priority, wish_id = after
+                keys = (k for k in keys if k > (status, priority, -wish_id))
+            rows = [Wish(-i, *wishes[-i][:4]) for _, _, i in heapq.nsmallest(limit + 1, keys)]
+        return make_page(rows, limit, lambda w: (w.status, w.priority, w.id))
+
+    def add_wish(self, title, target_amount, priority, user_id):
+        with self._lock:
+            self._user(user_id).wishes[self._new_id("wishlist", user_id)] = [
+                title, float(target_amount), int(priority), 0, None,
+                datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")]   # 同 DATETIME('now')
+
+    def update_wish(self, wish_id, title, target_amount, priority, user_id):
+        with self._lock:
+            data = self._user(user_id)
+            wish = data.wishes.get(wish_id)
+            if wish is not None:
+                status = wish[3]
+                self._set_status(data, wish, 0)
+                wish[:3] = [title, float(target_amount), int(priority)]
+                self._set_status(data, wish, status)
+
+    def unlock_wish(self, wish_id, user_id):
+        with self._lock:
+            data = self._user(user_id)
+            wish = data.wishes.get(wish_id)
+            if wish is not None and wish[3] == 0:
+                self._set_status(data, wish, 1)
+                wish[4] = datetime.now().isoformat()
+
+    def complete_wish(self, wish_id, user_id):
+        with self._lock:
+            data = self._user(user_id)
+            wish = data.wishes.get(wish_id)
+            if wish is not None:
+                self._set_status(data, wish, 2)
+
+    def _pending(self, data):
+        """(id, target_amount, priority) of pending wishes, priority ASC, id DESC."""
+        rows = [(i, w[1], w[2]) for i, w in data.wishes.items() if w[3] == 0]
+        return sorted(rows, key=lambda r: (r[2], -r[0]))
+
+    def _balance(self, data):
+        return data.attendance_total + data.habit_total - data.reserved
+
+    def preview_unlock_plan(self, user_id, strategy="priority"):
+        with self._lock:
+            data = self._user(user_id)
+            return plan_unlock(self._pending(data), self._balance(data), strategy)
+
+    def greedy_unlock(self, user_id, strategy="priority"):
+        with self._lock:
+            data = self._user(user_id)
+            wish_ids = plan_unlock(self._pending(data), self._balance(data), strategy).wish_ids
+            now = datetime.now().isoformat()
+            for wish_id in wish_ids:
+                self._set_status(data, data.wishes[wish_id], 1)
+                data.wishes[wish_id][4] = now
+            return wish_ids
+
+    # 余额与统计
+
+    def get_balance_summary(self, user_id):
+        with self._lock:
+            data = self._user(user_id)
+            return {"attendance_total": data.attendance_total, "habit_total": data.habit_total,
+                    "reserved": data.reserved, "balance": self._balance(data)}
+
+    def _inflows(self, data, period_of):
+        """read_rollup-style rows (period, attendance_amount, habit_amount) ordered by period."""
+        totals = {}
+        for (_, day), amount in data.attendance.items():
+            totals.setdefault(period_of(day), [0.0, 0.0])[0] += amount
+        for _, day, amount in data.checkins.values():
+            totals.setdefault(period_of(day), [0.0, 0.0])[1] += amount
+        return [(period, *amounts) for period, amounts in sorted(totals.items())]
+
+    def load_dashboard(self, user_id):
+        from db.dashboard import build_snapshot
+
+        with self._lock:
+            data = self._user(user_id)
+            balance = (data.attendance_total, data.habit_total, data.reserved, self._balance(data))
+            wish_counts = {}
+            for wish in data.wishes.values():
+                wish_counts[wish[3]] = wish_counts.get(wish[3], 0) + 1
+            pending_rows = [(i, data.wishes[i][0], target, priority) for i, target, priority in self._pending(data)]
+            rewards = {}
+            for task_id, _, amount in data.checkins.values():
+                if task_id in data.tasks:
+                    title = data.tasks[task_id][0]
+                    rewards[title] = rewards.get(title, 0.0) + amount
+            habit_rows = sorted(((t, r) for t, r in rewards.items() if r > 0), key=lambda r: -r[1])
+            monthly = self._inflows(data, lambda day: day[:7])
+            daily = self._inflows(data, lambda day: day)
+        return build_snapshot(user_id, balance, wish_counts, pending_rows, habit_rows, monthly, daily)
+
+    def forecast_unlocks(self, user_id, today=None, window=None, n_sims=0, seed=0):
+        from datetime import date, timedelta
+
+        from db.forecast import WINDOW_DAYS, dense_history, forecast_frame
+
+        today = today or date.today()
+        window = window or WINDOW_DAYS
+        start = today - timedelta(days=window - 1)
+        with self._lock:
+            data = self._user(user_id)
+            wishes = [(i, data.wishes[i][0], target, priority) for i, target, priority in self._pending(data)]
+            balance = self._balance(data)
+            rows = [r for r in self._inflows(data, lambda day: day)
+                    if start.isoformat() <= r[0] <= today.isoformat()]
+        attendance, habit = dense_history(rows, start, window)
+        return forecast_frame(wishes, balance, attendance, habit, today, n_sims, seed)
+
+    def calendar_heatmap(self, user_id, kind=None, item_id=None, years=None):
+        from db.analytics import heatmap_matrix
+
+        with self._lock:
+            data = self._user(user_id)
+            rows = []
+            if kind in (None, "attendance"):
+                rows += [(day, amount) for (income_id, day), amount in data.attendance.items()
+                         if item_id is None or income_id == item_id]
+            if kind in (None, "habit"):
+                rows += [(day, amount) for task_id, day, amount in data.checkins.values()
+                         if item_id is None or task_id == item_id]
+        return heatmap_matrix([r[0] for r in rows], [r[1] for r in rows], [1] * len(rows),
+                              tuple(years) if years else None)
+
+    @classmethod
+    def from_sqlite(cls, *paths):
+        """
+        A MemoryRepository holding a copy of every user's data in the SQLite
+        database(s) at paths (all shard files when sharded, see db.shards).
+        """
+        repo = cls()
+        for path in paths:
+            repo._load_sqlite(path)
+        return repo
+
+    def _load_sqlite(self, path):
+        conn = sqlite3.connect(path)
+        try:
+            for income_id, user_id, title, amount in conn.execute(
+                    "SELECT id, user_id, title, daily_amount FROM income"):
+                self._user(user_id).incomes[income_id] = [title, amount]
+            for task_id, user_id, title, amount in conn.execute(
+                    "SELECT id, user_id, title, reward_amount FROM habit_task"):
+                self._user(user_id).tasks[task_id] = [title, amount]
+            for attendance_id, income_id, day, amount, user_id in conn.execute(
+                    "SELECT id, income_id, date, earned_amount, user_id FROM attendance"):
+                data = self._user(user_id)
+                data.attendance[(income_id, day)] = amount
+                data.attendance_ids[(income_id, day)] = attendance_id
+                data.attendance_total += amount
+            for checkin_id, task_id, day, amount, user_id in conn.execute(
+                    "SELECT id, task_id, date, reward_amount, user_id FROM habit_checkin"):
+                data = self._user(user_id)
+                data.checkins[checkin_id] = (task_id, day, amount)
+                data.checkin_ids[(task_id, day)] = checkin_id
+                data.habit_total += amount
+            for wish_id, *wish, user_id in conn.execute(
+                    "SELECT id, title, target_amount, priority, status, unlocked_at, created_at, user_id "
+                    "FROM wishlist"):
+                data = self._user(user_id)
+                data.wishes[wish_id] = [wish[0], wish[1], wish[2], 0, *wish[4:]]
+                self._set_status(data, data.wishes[wish_id], wish[3])
+            sequences = dict(conn.execute("SELECT name, seq FROM sqlite_sequence"))
+            counters = self._counters(path if shards.enabled() else None)
+            for table in counters:
+                top = conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}").fetchone()[0]
+                counters[table] = max(counters[table], top + 1, sequences.get(table, 0) + 1)
+        finally:
+            conn.close()
@@ -0,0 +1,253 @@
+import logging
+import threading
+
+from db import shards
+from db.ledger import create_ledger, rebuild_balances
+from db.pool import pool_at
+from db.rollups import create_pool_inflows_view, create_rollups, rebuild_rollups
+
+log = logging.getLogger("db.migrations")
+
+# -------------------------------
+# 版本化迁移：以 PRAGMA user_version 记录库结构版本
+# 新的结构变更只能追加新步骤，已发布的步骤不可修改
+# -------------------------------
+
+
+def _columns(conn, table):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def _v1_baseline(conn):
+    """最初由 init_db 创建的表（已存在的旧库不会被改动）；v_pool_inflows 视图由 v7 创建"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS income (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            daily_amount REAL NOT NULL,
+            user_id TEXT NOT NULL
+        )""")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS attendance (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            income_id INTEGER NOT NULL,
+            date TEXT NOT NULL,
+            earned_amount REAL NOT NULL,
+            user_id TEXT NOT NULL,
+            FOREIGN KEY(income_id) REFERENCES income(id)
+        )""")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS habit_task (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            reward_amount REAL NOT NULL,
+            user_id TEXT NOT NULL
+        )""")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS habit_checkin (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            task_id INTEGER NOT NULL,
+            date TEXT NOT NULL,
+            reward_amount REAL NOT NULL,
+            user_id TEXT NOT NULL,
+            FOREIGN KEY(task_id) REFERENCES habit_task(id)
+        )""")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS wishlist (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            target_amount REAL NOT NULL,
+            priority INTEGER DEFAULT 0,
+            status INTEGER DEFAULT 0,
+            unlocked_at TEXT,
+            user_id TEXT NOT NULL
+        )""")
+
+
+def _v2_wishlist_status(conn):
+    """
+    旧库的 wishlist 可能还在用 unlocked 列、缺少 status/unlocked_at/created_at。
+    created_at 的默认值是表达式，无法 ALTER 添加，因此复制到新表后替换。
+    """
+    cols = _columns(conn, "wishlist")
+    if "status" in cols:
+        status = "COALESCE(status, 0)"
+    elif "unlocked" in cols:
+        status = "CASE WHEN unlocked THEN 1 ELSE 0 END"
+    else:
+        status = "0"
+    priority = "COALESCE(priority, 0)" if "priority" in cols else "0"
+    unlocked_at = "unlocked_at" if "unlocked_at" in cols else "NULL"
+    created_at = "created_at" if "created_at" in cols else "NULL"
+
+    conn.execute("""
+        CREATE TABLE wishlist_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            target_amount REAL NOT NULL,
+            priority INTEGER NOT NULL DEFAULT 0,
+            status INTEGER NOT NULL DEFAULT 0,  -- 0 未解锁，1 已解锁，2 已完成
+            unlocked_at TEXT,
+            created_at TEXT DEFAULT (DATETIME('now')),
+            user_id TEXT NOT NULL
+        )""")
+    conn.execute(f"""
+        INSERT INTO wishlist_new
+            (id, title, target_amount, priority, status, unlocked_at, created_at, user_id)
+        SELECT id, title, target_amount, {priority}, {status}, {unlocked_at}, {created_at}, user_id
+        FROM wishlist""")
+    conn.execute("DROP TABLE wishlist")
+    conn.execute("ALTER TABLE wishlist_new RENAME TO wishlist")
+
+
+def _v3_note_columns(conn):
+    """补齐 schema.sql 中的 note 备注列"""
+    for table in ("income", "attendance", "habit_task", "habit_checkin"):
+        if "note" not in _columns(conn, table):
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN note TEXT")
+
+
+def _archive_duplicate_checkins(conn, table, source_id, amount):
+    """
+    把 (user_id, 来源, date) 重复的打卡（除最早一条外）复制到 {table}_dupes 后删除，
+    并记录 warning 日志。返回删除的 (行数, 总金额)。
+    """
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {table}_dupes (
+            id INTEGER PRIMARY KEY,        -- 原打卡 id
+            kept_id INTEGER NOT NULL,      -- 保留下来的同日打卡 id
+            user_id TEXT NOT NULL,
+            {source_id} INTEGER NOT NULL,
+            date TEXT NOT NULL,
+            {amount} REAL NOT NULL,
+            note TEXT,
+            removed_at TEXT DEFAULT (DATETIME('now'))
+        )""")
+    conn.execute(f"""
+        INSERT INTO {table}_dupes (id, kept_id, user_id, {source_id}, date, {amount}, note)
+        SELECT t.id, k.kept_id, t.user_id, t.{source_id}, t.date, t.{amount}, t.note
+        FROM {table} t
+        JOIN (SELECT user_id, {source_id}, date, MIN(id) AS kept_id FROM {table}
+              GROUP BY user_id, {source_id}, date HAVING COUNT(*) > 1) k
+          USING (user_id, {source_id}, date)
+        WHERE t.id <> k.kept_id""")
+    removed, total = conn.execute(
+        f"SELECT COUNT(*), COALESCE(SUM({amount}), 0) FROM {table}_dupes WHERE id IN (SELECT id FROM {table})"
+    ).fetchone()
+    if removed:
+        conn.execute(f"DELETE FROM {table} WHERE id IN (SELECT id FROM {table}_dupes)")
+        log.warning("removed %d duplicate %s rows (¥%.2f in total); copies are kept in %s_dupes",
+                    removed, table, total, table)
+    return removed, total
+
+
+def _v4_checkin_indexes(conn):
+    """
+    打卡表按 (user_id, date) 与 (user_id, 来源, date) 建索引，并以唯一索引去重。
+    建唯一索引前先处理历史重复打卡：每组只保留最早的一条，其余整行复制到
+    attendance_dupes / habit_checkin_dupes 审计表（带保留行的 kept_id）后删除，
+    并写 warning 日志，不会无痕丢失数据。
+    对余额的影响：重复打卡原先每条都计入资金池，删除后受影响用户的累计收入与
+    可用余额按审计表中的金额减少（预留金额不变），之后 v5 的余额汇总按去重后的数据回填。
+    需要恢复时可从审计表按 id 取回。
+    """
+    _archive_duplicate_checkins(conn, "attendance", "income_id", "earned_amount")
+    _archive_duplicate_checkins(conn, "habit_checkin", "task_id", "reward_amount")
+    conn.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_attendance_user_income_date ON attendance(user_id, income_id, date)")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS ix_attendance_user_date ON attendance(user_id, date)")
+    conn.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_habit_checkin_user_task_date ON habit_checkin(user_id, task_id, date)")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS ix_habit_checkin_user_date ON habit_checkin(user_id, date)")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS ix_income_user ON income(user_id)")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS ix_habit_task_user ON habit_task(user_id)")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS ix_wishlist_user_status_priority ON wishlist(user_id, status, priority)")
+
+
+def _v5_balance_ledger(conn):
+    """按用户维护的余额汇总表及其触发器，并从现有数据回填"""
+    create_ledger(conn)
+    rebuild_balances(conn)
+
+
+def _v6_inflow_rollups(conn):
+    """按日/按月的收入汇总表及其触发器，并从现有打卡回填"""
+    create_rollups(conn)
+    rebuild_rollups(conn)
+
+
+def _v7_pool_inflows_view(conn):
+    """按 rollups.POOL_INFLOWS_DDL 重建 v_pool_inflows (user_id, occurs_on, source_kind, amount)，替换旧库中 init_db 建的旧视图"""
+    create_pool_inflows_view(conn)
+
+
+MIGRATIONS = [
+    (1, "baseline tables", _v1_baseline),
+    (2, "wishlist status/created_at", _v2_wishlist_status),
+    (3, "note columns", _v3_note_columns),
+    (4, "check-in indexes and uniqueness", _v4_checkin_indexes),
+    (5, "user_balance ledger", _v5_balance_ledger),
+    (6, "daily/monthly inflow rollups", _v6_inflow_rollups),
+    (7, "canonical v_pool_inflows", _v7_pool_inflows_view),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn):
+    """
+    Bring the database up to SCHEMA_VERSION, one step per transaction.
+    Each step runs under BEGIN IMMEDIATE and re-checks the version, so two
+    processes starting at once never apply the same step twice.
+    Returns the resulting schema version.
+    """
+    if schema_version(conn) >= SCHEMA_VERSION:
+        return schema_version(conn)
+    if conn.in_transaction:
+        conn.commit()
+    for version, description, step in MIGRATIONS:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if schema_version(conn) >= version:
+                conn.rollback()
+                continue
+            step(conn)
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return schema_version(conn)
+
+
+_migrated_paths = set()
+_migrate_lock = threading.Lock()
+
+
+def ensure_schema(force=False):
+    """
+    Run migrations once per process and database file (every shard file when
+    sharding is enabled, see db.shards).
+    After the first call this is a set lookup, so it is cheap enough to
+    call on every Streamlit rerun.
+    """
+    paths = shards.database_paths()
+    if not force and _migrated_paths.issuperset(paths):
+        return
+    with _migrate_lock:
+        if shards.enabled():
+            shards.check_layout()
+        for path in paths:
+            if path in _migrated_paths and not force:
+                continue
+            with pool_at(path).connection() as conn:
+                migrate(conn)
+            _migrated_paths.add(path)
@@ -0,0 +1,23 @@
+"""
+Keyset pagination.
+
+A page is read as "WHERE sort key > cursor ORDER BY sort key LIMIT n + 1" on
+an index that matches the sort key, so every page costs one index seek and n
+rows however deep into the list it is, where OFFSET would step over every
+skipped row. The cursor is the sort key of the last row shown, so rows added
+or removed meanwhile never shift a page.
+"""
+from collections import namedtuple
+
+PAGE_SIZE = 20
+
+# rows: 本页的行；next: 下一页的游标，已是最后一页时为 None
+Page = namedtuple("Page", "rows next")
+
+
+def make_page(rows, limit, key):
+    """The Page for up to limit + 1 rows read after a cursor; key(row) gives a row's cursor."""
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return Page(rows, key(rows[-1]))
+    return Page(rows, None)
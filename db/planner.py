@@ -0,0 +1,232 @@
+"""
+Wish unlock planner.
+
+Given a user's pending wishes and the available balance, decide which wishes
+to unlock. Strategies:
+
+- "priority": strict priority order, stop at the first wish that does not fit
+  (the historical greedy_unlock behaviour).
+- "skip": priority order, but skip wishes that do not fit and keep going, so a
+  cheap wish behind an expensive one still unlocks.
+- "knapsack": the set with the highest total priority weight that fits the
+  balance. Solved exactly by dynamic programming over amounts in cents when
+  the table is small enough; for large budgets the items that provably are
+  (or are not) in the optimum are fixed first and the remaining core is
+  solved by DP or, failing that, branch and bound.
+
+Wishes are (id, target_amount, priority) tuples in priority order
+(priority ASC, id DESC, the order greedy_unlock has always used).
+"""
+import math
+from collections import namedtuple
+
+Plan = namedtuple("Plan", "wish_ids total_cost total_value strategy exact")
+
+DP_MAX_CELLS = 20_000_000      # DP 表上限（行数 × 金额格数），约 20MB
+BNB_MAX_NODES = 200_000        # 分支定界的搜索节点上限，超出时返回当前最优解
+
+
+def priority_weights(priorities):
+    """
+    Value of each wish for the knapsack strategy: the most important priority
+    (smallest number) is worth the most, and every wish is worth at least 1.
+    """
+    if not priorities:
+        return []
+    worst = max(priorities)
+    return [worst - p + 1 for p in priorities]
+
+
+def _to_cents(amount):
+    return int(round(amount * 100))
+
+
+def _strict(wishes, balance):
+    # 与仪表盘进度共用同一套累加分配（db.analytics）
+    from db.analytics import unlockable_prefix
+
+    count = unlockable_prefix([target for _, target, _ in wishes], balance)
+    return [wish_id for wish_id, _, _ in wishes[:count]], True
+
+
+def _skip(wishes, balance):
+    # 与 _strict 同样的容差与累加顺序，保证按优先级能解锁的前缀这里一定也解锁
+    from db.analytics import EPSILON
+
+    chosen, spent = [], 0.0
+    for wish_id, target, _ in wishes:
+        if spent + target <= balance + EPSILON:
+            chosen.append(wish_id)
+            spent += target
+    return chosen, True
+
+
+def _knapsack_dp(costs, values, budget):
+    """0/1 背包：numpy 向量化逐行递推，并保留选择矩阵用于回溯"""
+    import numpy as np
+
+    n = len(costs)
+    best = np.zeros(budget + 1, dtype=np.float64)
+    keep = np.zeros((n, budget + 1), dtype=bool)
+    for i, (cost, value) in enumerate(zip(costs, values)):
+        if cost == 0:
+            best += value
+            keep[i, :] = True
+            continue
+        candidate = best[:-cost] + value
+        better = candidate > best[cost:]
+        keep[i, cost:] = better
+        best[cost:] = np.where(better, candidate, best[cost:])
+    chosen, remaining = [], budget
+    for i in range(n - 1, -1, -1):
+        if keep[i, remaining]:
+            chosen.append(i)
+            remaining -= costs[i]
+    return chosen[::-1], True
+
+
+def _knapsack_bnb(costs, values, budget):
+    """
+    分支定界：按价值密度排序，以分数背包松弛作为上界做深度优先搜索。
+    节点数超过 BNB_MAX_NODES 时停止并返回当前最优解（exact=False）。
+    """
+    order = sorted(range(len(costs)), key=lambda i: values[i] / max(costs[i], 1), reverse=True)
+    c = [costs[i] for i in order]
+    v = [values[i] for i in order]
+    n = len(c)
+
+    def bound(k, room, value):
+        for j in range(k, n):
+            if c[j] <= room:
+                room -= c[j]
+                value += v[j]
+            else:
+                return value + v[j] * room / c[j]
+        return value
+
+    # 以按密度贪心得到的解作为初始下界
+    best_value, best_set, room = 0, [], budget
+    for j in range(n):
+        if c[j] <= room:
+            room -= c[j]
+            best_value += v[j]
+            best_set.append(j)
+
+    nodes, exact = 0, True
+    stack = [(0, budget, 0, [])]
+    while stack:
+        k, room, value, taken = stack.pop()
+        nodes += 1
+        if nodes > BNB_MAX_NODES:
+            exact = False
+            break
+        if value > best_value:
+            best_value, best_set = value, taken
+        if k == n or bound(k, room, value) <= best_value:
+            continue
+        stack.append((k + 1, room, value, taken))          # 不选第 k 个
+        if c[k] <= room:                                    # 选第 k 个（后入栈先搜索）
+            stack.append((k + 1, room - c[k], value + v[k], taken + [k]))
+    return sorted(order[j] for j in best_set), exact
+
+
+def _reduce(costs, values, budget):
+    """
+    变量固定（Martello-Toth 约简）：按价值密度排序后用分数背包上界判断，
+    不选它也无法超过贪心解的物品必选，选它也无法超过贪心解的物品必不选。
+    返回 (贪心解, 必选物品, 待搜索的核心物品)，核心通常只剩分界点附近的少量物品。
+    """
+    import numpy as np
+
+    order = sorted(range(len(costs)), key=lambda i: values[i] / max(costs[i], 1), reverse=True)
+    c = np.array([costs[i] for i in order], dtype=np.int64)
+    v = np.array([values[i] for i in order], dtype=np.float64)
+    n = len(c)
+    prefix_cost = np.concatenate(([0], np.cumsum(c)))
+    prefix_value = np.concatenate(([0.0], np.cumsum(v)))
+    density = np.append(v / np.maximum(c, 1), 0.0)    # 末尾补 0：全部装下时没有分数项
+    brk = int(np.searchsorted(prefix_cost, budget, side="right")) - 1
+
+    greedy, room = [], budget
+    for j in range(n):
+        if c[j] <= room:
+            room -= c[j]
+            greedy.append(order[j])
+
+    lower = sum(values[i] for i in greedy)
+    idx = np.arange(n)
+    ub = np.full(n, np.inf)
+    # j < brk：不选 j 时的上界
+    k = np.searchsorted(prefix_cost, budget + c, side="right") - 1
+    k = np.minimum(k, n)
+    ub_out = prefix_value[k] - v + (budget + c - prefix_cost[k]) * density[k]
+    # j >= brk：选 j 时的上界（装不下的直接为 -inf）
+    k1 = np.searchsorted(prefix_cost, budget - c, side="right") - 1
+    k1 = np.clip(k1, 0, n)
+    ub_in = np.where(c <= budget,
+                     v + prefix_value[k1] + (budget - c - prefix_cost[k1]) * density[k1], -np.inf)
+    ub = np.where(idx < brk, ub_out, ub_in)
+    fixed = ub < lower + 1 - 1e-9                       # 价值为整数，上界达不到 lower + 1 即可固定
+    fixed_in = [order[j] for j in range(n) if fixed[j] and j < brk]
+    core = [order[j] for j in range(n) if not fixed[j]]
+    return greedy, fixed_in, core
+
+
+def _knapsack_core(costs, values, budget):
+    """返回 (选中的下标, exact)：表够小时用 DP，否则分支定界"""
+    if budget <= 0 or not costs:
+        return [], True
+    # 金额通常是整元：按所有金额的最大公约数缩小 DP 表
+    scale = math.gcd(*costs, budget) or 1
+    scaled = [cost // scale for cost in costs]
+    room = min(budget // scale, sum(scaled))
+    if len(scaled) * (room + 1) <= DP_MAX_CELLS:
+        return _knapsack_dp(scaled, values, room)
+    return _knapsack_bnb(scaled, values, room)
+
+
+def _knapsack(wishes, balance):
+    budget = _to_cents(balance)
+    weights = priority_weights([p for _, _, p in wishes])
+    items = [i for i, (_, target, _) in enumerate(wishes) if _to_cents(target) <= budget]
+    costs = [_to_cents(wishes[i][1]) for i in items]
+    values = [weights[i] for i in items]
+    if sum(costs) <= budget:
+        return [wishes[i][0] for i in items], True
+
+    if len(costs) * (budget + 1) <= DP_MAX_CELLS:
+        picked, exact = _knapsack_core(costs, values, budget)
+    else:
+        # 金额格数太多：先约简，再只对核心物品求解
+        greedy, fixed_in, core = _reduce(costs, values, budget)
+        room = budget - sum(costs[j] for j in fixed_in)
+        sub, exact = _knapsack_core([costs[j] for j in core], [values[j] for j in core], room)
+        picked = fixed_in + [core[j] for j in sub]
+        if sum(values[j] for j in greedy) > sum(values[j] for j in picked):
+            picked = greedy
+    chosen = {items[j] for j in picked}
+    return [wish[0] for i, wish in enumerate(wishes) if i in chosen], exact
+
+
+STRATEGIES = {
+    "priority": _strict,
+    "skip": _skip,
+    "knapsack": _knapsack,
+}
+
+
+def plan_unlock(wishes, balance, strategy="priority"):
+    """
+    Choose which of wishes to unlock with balance using the named strategy.
+    Returns a Plan; wish_ids keep the input (priority) order. exact is False
+    only when branch and bound hit its node limit.
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError(f"unknown strategy {strategy!r}, expected one of {sorted(STRATEGIES)}")
+    wishes = list(wishes)
+    chosen, exact = STRATEGIES[strategy](wishes, balance)
+    chosen_set = set(chosen)
+    weights = priority_weights([p for _, _, p in wishes])
+    total_cost = sum(w[1] for w in wishes if w[0] in chosen_set)
+    total_value = sum(weights[i] for i, w in enumerate(wishes) if w[0] in chosen_set)
+    return Plan(chosen, total_cost, total_value, strategy, exact)
@@ -0,0 +1,249 @@
+import os
+import sqlite3
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+from db import instrument, shards
+
+DB_PATH = os.path.join(os.path.dirname(__file__), "db.sqlite3")
+
+# 每个连接只在创建时执行一次的调优参数
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",       # 读写互不阻塞
+    "PRAGMA synchronous = NORMAL",     # WAL 下足够安全，且省去每次提交的 fsync
+    "PRAGMA cache_size = -16000",      # 约 16MB 页缓存（负数单位为 KiB）
+    "PRAGMA mmap_size = 268435456",    # 256MB 内存映射读
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA busy_timeout = 5000",
+)
+CACHED_STATEMENTS = 512   # 每个连接缓存的预编译语句数量
+MAX_IDLE = 16             # 池中最多保留的空闲连接数
+
+
+class PooledConnection(sqlite3.Connection):
+    """
+    A connection owned by a ConnectionPool.
+    close() hands the connection back to its pool instead of closing it,
+    so legacy get_conn()/close() pairs keep working unchanged.
+    """
+
+    pool = None
+
+    def cursor(self, factory=None):
+        # 开启统计（db.instrument）时换成计时游标，否则与原生游标完全相同
+        if factory is None and instrument.active():
+            factory = instrument.TimedCursor
+        return super().cursor() if factory is None else super().cursor(factory)
+
+    # sqlite3.Connection 的快捷方法在 C 层直接建游标，这里改为经过 cursor()
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+    def close(self):
+        if self.pool is None:
+            super().close()
+        else:
+            self.pool.release(self)
+
+    def _close(self):
+        super().close()
+
+
+class ConnectionPool:
+    """
+    Hands out tuned, reused SQLite connections.
+    A thread keeps the same connection for as long as it holds at least one
+    checkout (nested acquire() calls are reentrant); once released, the
+    connection goes back to a shared idle list and is reused by the next
+    thread, since Streamlit starts a fresh thread for every script run.
+    """
+
+    def __init__(self, path, max_idle=MAX_IDLE):
+        self.path = path
+        self.max_idle = max_idle
+        self._idle = deque()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.path,
+            timeout=5,
+            check_same_thread=False,
+            cached_statements=CACHED_STATEMENTS,
+            factory=PooledConnection,
+        )
+        conn.row_factory = sqlite3.Row
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        conn.pool = self
+        return conn
+
+    def acquire(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            self._local.depth += 1
+            return conn
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        opened = conn is None
+        if opened:
+            conn = self._connect()
+        instrument.note_checkout(opened)
+        self._local.conn = conn
+        self._local.depth = 1
+        return conn
+
+    def release(self, conn):
+        if getattr(self._local, "conn", None) is not conn:
+            return
+        self._local.depth -= 1
+        if self._local.depth > 0:
+            return
+        self._local.conn = None
+        callbacks, self._local.callbacks = getattr(self._local, "callbacks", []), []
+        if conn.in_transaction:
+            # 未提交的事务不能带回池中
+            conn.rollback()
+            callbacks = []
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                conn = None
+        if conn is not None:
+            conn._close()
+        for callback in callbacks:
+            callback()
+
+    def on_commit(self, callback):
+        """
+        Run callback once the current thread's outermost checkout has committed
+        (immediately if nothing is checked out). Dropped on rollback.
+        """
+        if getattr(self._local, "conn", None) is None:
+            callback()
+            return
+        if not hasattr(self._local, "callbacks"):
+            self._local.callbacks = []
+        self._local.callbacks.append(callback)
+
+    def close_all(self):
+        with self._lock:
+            while self._idle:
+                self._idle.pop()._close()
+
+    def holds_connection(self):
+        """True while the current thread has a connection checked out."""
+        return getattr(self._local, "conn", None) is not None
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        outermost = self._local.depth == 1
+        # 嵌套在事务中的块用保存点包住：块内出错只撤销这一块，外层事务继续
+        savepoint = None if outermost or not conn.in_transaction else f"nested_{self._local.depth}"
+        if savepoint:
+            conn.execute(f"SAVEPOINT {savepoint}")
+        try:
+            yield conn
+            if outermost and conn.in_transaction:
+                conn.commit()
+            elif savepoint and conn.in_transaction:
+                conn.execute(f"RELEASE {savepoint}")
+        except BaseException:
+            if outermost:
+                if conn.in_transaction:
+                    conn.rollback()
+                self._local.callbacks = []
+            elif savepoint and conn.in_transaction:
+                conn.execute(f"ROLLBACK TO {savepoint}")
+                conn.execute(f"RELEASE {savepoint}")
+            raise
+        finally:
+            self.release(conn)
+
+    @contextmanager
+    def transaction(self):
+        """
+        Like connection(), but takes the write lock up front (BEGIN IMMEDIATE)
+        so reads inside the block cannot be invalidated by another writer.
+        Nested blocks join the enclosing transaction.
+        """
+        with self.connection() as conn:
+            if not conn.in_transaction:
+                conn.execute("BEGIN IMMEDIATE")
+            yield conn
+
+
+_pools = {}
+_pool_lock = threading.Lock()
+
+
+def configure(path):
+    """Point the default pool at another database file (used by tools and benchmarks)."""
+    global DB_PATH
+    if path != DB_PATH:
+        with _pool_lock:
+            old = _pools.pop(DB_PATH, None)
+        if old is not None:
+            old.close_all()
+    DB_PATH = path
+
+
+def pool_at(path):
+    """The pool of the database file at path (one per file, created on first use)."""
+    pool = _pools.get(path)
+    if pool is None:
+        with _pool_lock:
+            pool = _pools.get(path)
+            if pool is None:
+                pool = _pools[path] = ConnectionPool(path)
+    return pool
+
+
+def get_pool(user_id=None):
+    """
+    The pool holding user_id's data: its shard file when sharding is enabled
+    (db.shards), otherwise the single database file. Without a user_id this
+    is always the single file (schema, tools).
+    """
+    if user_id is not None and shards.enabled():
+        return pool_at(shards.path_for(user_id))
+    return pool_at(DB_PATH)
+
+
+def get_conn(user_id=None):
+    """Check out the current thread's pooled connection; close() returns it."""
+    return get_pool(user_id).acquire()
+
+
+def on_commit(callback, user_id=None):
+    """Run callback after the current thread's pending writes (to user_id's database) are committed."""
+    get_pool(user_id).on_commit(callback)
+
+
+@contextmanager
+def connection(user_id=None):
+    """
+    Use the current thread's pooled connection (to user_id's database) for a
+    block of work.
+    The outermost block commits on success and rolls back on error; a block
+    nested inside an open transaction runs in a savepoint and only undoes its
+    own work on error.
+    """
+    with get_pool(user_id).connection() as conn:
+        yield conn
+
+
+@contextmanager
+def transaction(user_id=None):
+    """A write transaction on the current thread's pooled connection (BEGIN IMMEDIATE)."""
+    with get_pool(user_id).transaction() as conn:
+        yield conn
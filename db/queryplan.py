@@ -0,0 +1,93 @@
+"""
+Query-plan check for the per-user queries the pages run.
+
+    python -m db.queryplan [path/to/db.sqlite3]
+
+Runs EXPLAIN QUERY PLAN for every query in PAGE_QUERIES against a migrated
+database and exits non-zero if any of them scans a table instead of
+searching it through an index. tests/test_queryplan.py runs the same check
+under pytest.
+"""
+import re
+import sqlite3
+import sys
+
+from db.analytics import HEATMAP_DAILY_SQL, HEATMAP_ITEM_SQL, PENDING_WISHES_SQL
+from db.db import (ADD_ATTENDANCE_SQL, CHECKIN_KINDS, CHECKIN_PAGE_BEFORE, CHECKIN_PAGE_SQL, DAY_CHECKINS_SQL,
+                   DELETE_ATTENDANCE_SQL, DELETE_HABIT_CHECKIN_SQL, HABIT_BREAKDOWN_SQL, HABIT_TASKS_SQL, INCOME_SQL,
+                   PLAN_WISHES_SQL, WISH_COUNTS_SQL, WISH_PAGE_AFTER, WISH_PAGE_SQL, WISHES_BY_STATUS_SQL)
+from db.ledger import BALANCE_SQL
+from db.migrations import migrate
+from db.rollups import rollup_query
+from db.streaks import CHECKIN_DAYS_SQL
+
+USER = "user"
+DAY = "2024-01-01"
+
+# (页面, 查询, 参数)：查询均从实际执行它们的模块导入，改了 SQL 这里自动跟着检查
+PAGE_QUERIES = [
+    ("仪表盘/资金池", BALANCE_SQL, (USER,)),
+    ("仪表盘/心愿数", WISH_COUNTS_SQL, (USER,)),
+    ("仪表盘/心愿进度", PENDING_WISHES_SQL, (USER,)),
+    ("仪表盘/月度", *rollup_query("inflow_monthly", "month", USER)),
+    ("仪表盘/每日", *rollup_query("inflow_daily", "day", USER)),
+    ("仪表盘/预计解锁", *rollup_query("inflow_daily", "day", USER, DAY, DAY)),
+    ("仪表盘/习惯详情", HABIT_BREAKDOWN_SQL, (USER,)),
+    ("考勤打卡/收入来源", INCOME_SQL, (USER,)),
+    ("考勤打卡/打卡", ADD_ATTENDANCE_SQL, (1, DAY, 1.0, USER)),
+    ("考勤打卡/删除打卡", DELETE_ATTENDANCE_SQL, (1, DAY, USER)),
+    ("习惯打卡/习惯列表", HABIT_TASKS_SQL, (USER,)),
+    ("习惯打卡/当日记录", DAY_CHECKINS_SQL, (DAY, USER)),
+    ("习惯打卡/删除打卡", DELETE_HABIT_CHECKIN_SQL, (1, USER)),
+    ("习惯打卡/连续天数", CHECKIN_DAYS_SQL, (USER,)),
+    ("心愿单/心愿列表首页", WISH_PAGE_SQL.format(after=""), (USER, 0, 21)),
+    ("心愿单/心愿列表翻页", WISH_PAGE_SQL.format(after=WISH_PAGE_AFTER), (USER, 0, 0, 0, 1, 21)),
+    ("心愿单/解锁计划标题", WISHES_BY_STATUS_SQL.format(placeholders="?"), (0, USER)),
+    ("心愿单/解锁计划", PLAN_WISHES_SQL, (USER,)),
+    ("仪表盘/打卡日历", HEATMAP_DAILY_SQL.format(amount="attendance_amount + habit_amount",
+                                              count="attendance_count + habit_count"), (USER, DAY, DAY)),
+] + [
+    (f"仪表盘/打卡日历/{kind}", HEATMAP_ITEM_SQL.format(table=table, source_id=source_id, amount=amount),
+     (USER, 1, DAY, DAY))
+    for kind, (table, _, source_id, amount) in CHECKIN_KINDS.items()
+] + [
+    (f"打卡记录/{kind}", CHECKIN_PAGE_SQL.format(table=table, source=source, source_id=source_id, amount=amount,
+                                              before=CHECKIN_PAGE_BEFORE), (USER, DAY, 1, 21))
+    for kind, (table, source, source_id, amount) in CHECKIN_KINDS.items()
+]
+
+_FULL_SCAN = re.compile(r"^SCAN (?!CONSTANT ROW)")
+
+
+def query_plan(conn, sql, params=()):
+    return [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+
+
+def full_scans(conn, sql, params=()):
+    """Return the plan lines that walk a whole table (or a whole index) instead of searching it."""
+    return [line for line in query_plan(conn, sql, params) if _FULL_SCAN.match(line)]
+
+
+def check_page_queries(conn):
+    """Returns [(page, sql, offending plan lines)] for every page query that does not use an index."""
+    failures = []
+    for page, sql, params in PAGE_QUERIES:
+        scans = full_scans(conn, sql, params)
+        if scans:
+            failures.append((page, " ".join(sql.split()), scans))
+    return failures
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    conn = sqlite3.connect(argv[0] if argv else ":memory:")
+    migrate(conn)
+    failures = check_page_queries(conn)
+    for page, sql, scans in failures:
+        print(f"[{page}] {sql}\n    -> {'; '.join(scans)}")
+    print(f"{len(PAGE_QUERIES) - len(failures)}/{len(PAGE_QUERIES)} page queries use an index")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,265 @@
+"""
+Storage backend interface.
+
+Pages talk to a Repository instead of running SQL themselves. The methods
+mirror the db.db helpers (same names, arguments and return values), so the
+SQLite implementation is a thin delegation, and db.memory.MemoryRepository
+keeps the same data in Python dicts with the same semantics, for tests and
+for benchmarking the pages without disk I/O.
+
+get_repository() returns the process-wide backend: SQLite unless
+WISHESFLOW_STORAGE=memory; set_repository() swaps it (tools, benchmarks).
+"""
+import os
+import threading
+from abc import ABC, abstractmethod
+
+from db import db
+from db.paging import PAGE_SIZE
+
+
+class Repository(ABC):
+    # 收入来源
+    @abstractmethod
+    def list_income(self, user_id):
+        """models.Income rows, newest first."""
+
+    @abstractmethod
+    def add_income(self, title, daily_amount, user_id):
+        pass
+
+    @abstractmethod
+    def update_income(self, income_id, title, daily_amount, user_id):
+        pass
+
+    @abstractmethod
+    def delete_income(self, income_id, user_id):
+        pass
+
+    # 考勤打卡
+    @abstractmethod
+    def add_attendance(self, income_id, date, earned_amount, user_id):
+        """True if inserted, False if that day was already checked in."""
+
+    @abstractmethod
+    def add_attendance_range(self, user_id, income_id, start, end, weekdays=None):
+        """dict(inserted=..., skipped=...), see db.db.add_attendance_range."""
+
+    @abstractmethod
+    def delete_attendance(self, income_id, date, user_id):
+        pass
+
+    # 习惯与习惯打卡
+    @abstractmethod
+    def list_habit_tasks(self, user_id):
+        """models.HabitTask rows, newest first."""
+
+    @abstractmethod
+    def add_habit_task(self, title, reward_amount, user_id):
+        pass
+
+    @abstractmethod
+    def update_habit_task(self, task_id, title, reward_amount, user_id):
+        pass
+
+    @abstractmethod
+    def delete_habit_task(self, task_id, user_id):
+        """Deletes the habit only; its check-ins stay in the balance."""
+
+    @abstractmethod
+    def list_habit_checkins(self, user_id, date):
+        """models.HabitCheckin rows of the check-ins on date for habits that still exist."""
+
+    @abstractmethod
+    def add_habit_checkin(self, task_id, date, reward_amount, user_id):
+        """True if inserted, False if that day was already checked in."""
+
+    @abstractmethod
+    def add_habit_checkins(self, user_id, task_ids, dates):
+        """dict(inserted=..., skipped=...), see db.db.add_habit_checkins."""
+
+    @abstractmethod
+    def delete_habit_checkin(self, checkin_id, user_id):
+        pass
+
+    @abstractmethod
+    def list_checkins_page(self, user_id, kind, before=None, limit=PAGE_SIZE):
+        """paging.Page of models.Attendance/HabitCheckin, newest first; see db.db.list_checkins_page."""
+
+    @abstractmethod
+    def habit_stats(self, user_id, today=None):
+        """{task_id: streaks.HabitStats} of every habit with check-ins, as of today; see db.streaks.habit_stats."""
+
+    # 心愿
+    @abstractmethod
+    def list_wishes_by_status(self, user_id, statuses):
+        """models.Wish rows in unlock order (priority ASC, id DESC)."""
+
+    @abstractmethod
+    def list_wishes_page(self, user_id, statuses, after=None, limit=PAGE_SIZE):
+        """paging.Page of models.Wish by status, then priority ASC, id DESC; cursors are (status, priority, id)."""
+
+    @abstractmethod
+    def add_wish(self, title, target_amount, priority, user_id):
+        pass
+
+    @abstractmethod
+    def update_wish(self, wish_id, title, target_amount, priority, user_id):
+        pass
+
+    @abstractmethod
+    def unlock_wish(self, wish_id, user_id):
+        pass
+
+    @abstractmethod
+    def complete_wish(self, wish_id, user_id):
+        pass
+
+    @abstractmethod
+    def preview_unlock_plan(self, user_id, strategy="priority"):
+        """The planner.Plan greedy_unlock would apply now, or None on error."""
+
+    @abstractmethod
+    def greedy_unlock(self, user_id, strategy="priority"):
+        """Unlock the wishes planned by strategy; returns their ids."""
+
+    # 余额与统计
+    @abstractmethod
+    def get_balance_summary(self, user_id):
+        """dict(attendance_total, habit_total, reserved, balance)."""
+
+    @abstractmethod
+    def load_dashboard(self, user_id):
+        """A db.dashboard.DashboardSnapshot of one consistent state."""
+
+    @abstractmethod
+    def forecast_unlocks(self, user_id, today=None, window=None, n_sims=0, seed=0):
+        """(frame, rates), see db.forecast.forecast_unlocks; window defaults to forecast.WINDOW_DAYS."""
+
+    @abstractmethod
+    def calendar_heatmap(self, user_id, kind=None, item_id=None, years=None):
+        """analytics.Heatmap of the inflows per year and day; see db.analytics.calendar_heatmap."""
+
+
+class SqliteRepository(Repository):
+    """The SQLite database behind db.pool, through the db.db helpers."""
+
+    def list_income(self, user_id):
+        return db.list_income(user_id)
+
+    def add_income(self, title, daily_amount, user_id):
+        return db.add_income(title, daily_amount, user_id)
+
+    def update_income(self, income_id, title, daily_amount, user_id):
+        return db.update_income(income_id, title, daily_amount, user_id)
+
+    def delete_income(self, income_id, user_id):
+        return db.delete_income(income_id, user_id)
+
+    def add_attendance(self, income_id, date, earned_amount, user_id):
+        return db.add_attendance(income_id, date, earned_amount, user_id)
+
+    def add_attendance_range(self, user_id, income_id, start, end, weekdays=None):
+        return db.add_attendance_range(user_id, income_id, start, end, weekdays)
+
+    def delete_attendance(self, income_id, date, user_id):
+        return db.delete_attendance(income_id, date, user_id)
+
+    def list_habit_tasks(self, user_id):
+        return db.list_habit_tasks(user_id)
+
+    def add_habit_task(self, title, reward_amount, user_id):
+        return db.add_habit_task(title, reward_amount, user_id)
+
+    def update_habit_task(self, task_id, title, reward_amount, user_id):
+        return db.update_habit_task(task_id, title, reward_amount, user_id)
+
+    def delete_habit_task(self, task_id, user_id):
+        return db.delete_habit_task(task_id, user_id)
+
+    def list_habit_checkins(self, user_id, date):
+        return db.list_habit_checkins(user_id, date)
+
+    def add_habit_checkin(self, task_id, date, reward_amount, user_id):
+        return db.add_habit_checkin(task_id, date, reward_amount, user_id)
+
+    def add_habit_checkins(self, user_id, task_ids, dates):
+        return db.add_habit_checkins(user_id, task_ids, dates)
+
+    def delete_habit_checkin(self, checkin_id, user_id):
+        return db.delete_habit_checkin(checkin_id, user_id)
+
+    def list_checkins_page(self, user_id, kind, before=None, limit=PAGE_SIZE):
+        return db.list_checkins_page(user_id, kind, before, limit)
+
+    def habit_stats(self, user_id, today=None):
+        from db.streaks import habit_stats
+
+        return habit_stats(user_id, today)
+
+    def list_wishes_by_status(self, user_id, statuses):
+        return db.list_wishes_by_status(user_id, statuses)
+
+    def list_wishes_page(self, user_id, statuses, after=None, limit=PAGE_SIZE):
+        return db.list_wishes_page(user_id, statuses, after, limit)
+
+    def add_wish(self, title, target_amount, priority, user_id):
+        return db.add_wish(title, target_amount, priority, user_id)
+
+    def update_wish(self, wish_id, title, target_amount, priority, user_id):
+        return db.update_wish(wish_id, title, target_amount, priority, user_id)
+
+    def unlock_wish(self, wish_id, user_id):
+        return db.unlock_wish(wish_id, user_id)
+
+    def complete_wish(self, wish_id, user_id):
+        return db.complete_wish(wish_id, user_id)
+
+    def preview_unlock_plan(self, user_id, strategy="priority"):
+        return db.preview_unlock_plan(user_id, strategy)
+
+    def greedy_unlock(self, user_id, strategy="priority"):
+        return db.greedy_unlock(user_id, strategy)
+
+    def get_balance_summary(self, user_id):
+        return db.get_balance_summary(user_id)
+
+    def load_dashboard(self, user_id):
+        from db.dashboard import load_dashboard
+
+        return load_dashboard(user_id)
+
+    def forecast_unlocks(self, user_id, today=None, window=None, n_sims=0, seed=0):
+        from db.forecast import WINDOW_DAYS, forecast_unlocks
+
+        return forecast_unlocks(user_id, today, window or WINDOW_DAYS, n_sims, seed)
+
+    def calendar_heatmap(self, user_id, kind=None, item_id=None, years=None):
+        from db.analytics import calendar_heatmap
+
+        return calendar_heatmap(user_id, kind, item_id, years)
+
+
+_repository = None
+_repository_lock = threading.Lock()
+
+
+def get_repository():
+    """The process-wide Repository (WISHESFLOW_STORAGE=memory selects MemoryRepository)."""
+    global _repository
+    if _repository is None:
+        with _repository_lock:
+            if _repository is None:
+                if os.environ.get("WISHESFLOW_STORAGE", "sqlite") == "memory":
+                    from db.memory import MemoryRepository
+
+                    _repository = MemoryRepository()
+                else:
+                    _repository = SqliteRepository()
+    return _repository
+
+
+def set_repository(repository):
+    """Use repository for every later get_repository() call; None restores the default."""
+    global _repository
+    _repository = repository
@@ -0,0 +1,153 @@
+"""
+Daily and monthly inflow rollups for the dashboard charts.
+
+inflow_daily and inflow_monthly hold, per user and per day/month, the
+attendance and habit amounts and check-in counts. Like user_balance they are
+kept exact by triggers on attendance and habit_checkin, so chart queries read
+one row per day/month shown instead of aggregating every check-in.
+"""
+
+# db/schema.sql 中有同样的汇总表与触发器定义，修改时一并更新
+# (周期表, 周期列, 由 date 计算周期的表达式)
+PERIODS = (
+    ("inflow_daily", "day", "{row}.date"),
+    ("inflow_monthly", "month", "substr({row}.date, 1, 7)"),
+)
+# (来源表, 金额列, 汇总表中的列前缀)
+SOURCES = (
+    ("attendance", "earned_amount", "attendance"),
+    ("habit_checkin", "reward_amount", "habit"),
+)
+
+# 资金池收入的统一视图：每笔打卡一行。这是唯一的定义，迁移与 db/schema.sql 都引用这里
+POOL_INFLOWS_DDL = "CREATE VIEW v_pool_inflows AS" + "\nUNION ALL".join(f"""
+    SELECT user_id, date AS occurs_on, '{prefix}' AS source_kind, {amount} AS amount
+    FROM {source}""" for source, amount, prefix in SOURCES)
+
+
+def _table_ddl(table, period):
+    return f"""
+    CREATE TABLE IF NOT EXISTS {table} (
+        user_id TEXT NOT NULL,
+        {period} TEXT NOT NULL,
+        attendance_amount REAL NOT NULL DEFAULT 0,
+        habit_amount REAL NOT NULL DEFAULT 0,
+        attendance_count INTEGER NOT NULL DEFAULT 0,
+        habit_count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, {period})
+    ) WITHOUT ROWID"""
+
+
+def _add(table, period, key, prefix, amount, sign):
+    """把一条打卡（OLD/NEW）加到或减出对应的周期行；减到 0 条时删除该行"""
+    sql = ""
+    if sign == "+":
+        sql += f"""
+        INSERT OR IGNORE INTO {table} (user_id, {period}) VALUES (NEW.user_id, {key});"""
+    row = "NEW" if sign == "+" else "OLD"
+    sql += f"""
+        UPDATE {table}
+           SET {prefix}_amount = {prefix}_amount {sign} {row}.{amount},
+               {prefix}_count = {prefix}_count {sign} 1
+         WHERE user_id = {row}.user_id AND {period} = {key};"""
+    if sign == "-":
+        sql += f"""
+        DELETE FROM {table}
+         WHERE user_id = OLD.user_id AND {period} = {key}
+           AND attendance_count = 0 AND habit_count = 0;"""
+    return sql
+
+
+def _trigger_ddl():
+    statements = []
+    for table, period, key_expr in PERIODS:
+        for source, amount, prefix in SOURCES:
+            new_key = key_expr.format(row="NEW")
+            old_key = key_expr.format(row="OLD")
+            add = _add(table, period, new_key, prefix, amount, "+")
+            remove = _add(table, period, old_key, prefix, amount, "-")
+            statements.append(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_{source}_{table}_insert AFTER INSERT ON {source}
+    BEGIN{add}
+    END""")
+            statements.append(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_{source}_{table}_delete AFTER DELETE ON {source}
+    BEGIN{remove}
+    END""")
+            statements.append(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_{source}_{table}_update
+    AFTER UPDATE OF {amount}, date, user_id ON {source}
+    BEGIN{remove}{add}
+    END""")
+    return statements
+
+
+ROLLUP_DDL = tuple(_table_ddl(table, period) for table, period, _ in PERIODS) + tuple(_trigger_ddl())
+
+
+def create_pool_inflows_view(conn):
+    """(Re)create v_pool_inflows from POOL_INFLOWS_DDL, replacing any older definition."""
+    conn.execute("DROP VIEW IF EXISTS v_pool_inflows")
+    conn.execute(POOL_INFLOWS_DDL)
+
+
+def create_rollups(conn):
+    for statement in ROLLUP_DDL:
+        conn.execute(statement)
+
+
+def rebuild_rollups(conn, user_id=None):
+    """Recompute both rollup tables from the raw check-ins (one user, or everyone)."""
+    where = "" if user_id is None else "WHERE user_id = ?"
+    for table, period, key_expr in PERIODS:
+        key = key_expr.format(row="src")
+        params = () if user_id is None else (user_id,)
+        conn.execute(f"DELETE FROM {table} {where}", params)
+        conn.execute(f"""
+            INSERT INTO {table} (user_id, {period}, attendance_amount, habit_amount,
+                                 attendance_count, habit_count)
+            SELECT user_id, {period}, SUM(a_amt), SUM(h_amt), SUM(a_cnt), SUM(h_cnt)
+            FROM (
+                SELECT src.user_id, {key} AS {period},
+                       SUM(src.earned_amount) AS a_amt, 0 AS h_amt, COUNT(*) AS a_cnt, 0 AS h_cnt
+                FROM attendance src {where} GROUP BY 1, 2
+                UNION ALL
+                SELECT src.user_id, {key}, 0, SUM(src.reward_amount), 0, COUNT(*)
+                FROM habit_checkin src {where} GROUP BY 1, 2
+            )
+            GROUP BY user_id, {period}""", params * 2)
+
+
+def rollup_query(table, period, user_id, start=None, end=None):
+    """(sql, params) of read_rollup."""
+    sql = f"SELECT {period}, attendance_amount, habit_amount FROM {table} WHERE user_id = ?"
+    params = [user_id]
+    if start is not None:
+        sql += f" AND {period} >= ?"
+        params.append(start)
+    if end is not None:
+        sql += f" AND {period} <= ?"
+        params.append(end)
+    return sql + f" ORDER BY {period}", params
+
+
+def read_rollup(conn, table, period, user_id, start=None, end=None):
+    """
+    Returns [(period, attendance_amount, habit_amount)] ordered by period,
+    optionally limited to start <= period <= end.
+    """
+    return conn.execute(*rollup_query(table, period, user_id, start, end)).fetchall()
+
+
+def inflow_frame(rows, index_name):
+    """Chart-ready DataFrame from read_rollup rows: attendance_amount, habit_amount and total per period."""
+    import pandas as pd
+
+    df = pd.DataFrame(
+        [tuple(r)[1:] for r in rows],
+        index=pd.Index([r[0] for r in rows], name=index_name),
+        columns=["attendance_amount", "habit_amount"],
+        dtype=float,
+    )
+    df["total"] = df["attendance_amount"] + df["habit_amount"]
+    return df
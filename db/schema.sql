@@ -21,8 +21,11 @@ CREATE TABLE attendance (
     date TEXT NOT NULL,           -- 打卡日期 YYYY-MM-DD
     earned_amount REAL NOT NULL,  -- 实际获得金额
     note TEXT,
+    UNIQUE (user_id, income_id, date),  -- 同一来源每天只能打卡一次
     FOREIGN KEY (income_id) REFERENCES income(id) ON DELETE CASCADE
 );
+CREATE INDEX ix_attendance_user_date ON attendance(user_id, date);
+CREATE INDEX ix_income_user ON income(user_id);
 
 -- 习惯任务表（用户定义的习惯，如健身、背单词）
 DROP TABLE IF EXISTS habit_task;
@@ -43,8 +46,11 @@ CREATE TABLE habit_checkin (
     date TEXT NOT NULL,           -- 打卡日期 YYYY-MM-DD
     reward_amount REAL NOT NULL,  -- 实际奖励金额
     note TEXT,
+    UNIQUE (user_id, task_id, date),    -- 同一习惯每天只能打卡一次
     FOREIGN KEY (task_id) REFERENCES habit_task(id) ON DELETE CASCADE
 );
+CREATE INDEX ix_habit_checkin_user_date ON habit_checkin(user_id, date);
+CREATE INDEX ix_habit_task_user ON habit_task(user_id);
 
 DROP TABLE IF EXISTS wishlist;
 CREATE TABLE wishlist (
@@ -57,20 +63,289 @@ CREATE TABLE wishlist (
     unlocked_at TEXT,             -- 解锁时间
     created_at TEXT DEFAULT (DATETIME('now')) -- 创建时间
 );
+CREATE INDEX ix_wishlist_user_status_priority ON wishlist(user_id, status, priority);
+
+-- 迁移 v4 去重时删除的重复打卡（审计用，新库中为空）
+DROP TABLE IF EXISTS attendance_dupes;
+CREATE TABLE attendance_dupes (
+    id INTEGER PRIMARY KEY,        -- 原打卡 id
+    kept_id INTEGER NOT NULL,      -- 保留下来的同日打卡 id
+    user_id TEXT NOT NULL,
+    income_id INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    earned_amount REAL NOT NULL,
+    note TEXT,
+    removed_at TEXT DEFAULT (DATETIME('now'))
+);
+DROP TABLE IF EXISTS habit_checkin_dupes;
+CREATE TABLE habit_checkin_dupes (
+    id INTEGER PRIMARY KEY,        -- 原打卡 id
+    kept_id INTEGER NOT NULL,      -- 保留下来的同日打卡 id
+    user_id TEXT NOT NULL,
+    task_id INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    reward_amount REAL NOT NULL,
+    note TEXT,
+    removed_at TEXT DEFAULT (DATETIME('now'))
+);
+
+-- 余额汇总表（每个用户一行，读余额只需一次主键查询）
+-- 由下面的触发器在每次写入考勤、习惯打卡、心愿时维护，与 db/ledger.py 的 LEDGER_DDL 一致
+DROP TABLE IF EXISTS user_balance;
+CREATE TABLE user_balance (
+    user_id TEXT PRIMARY KEY,
+    attendance_total REAL NOT NULL DEFAULT 0,
+    habit_total REAL NOT NULL DEFAULT 0,
+    reserved REAL NOT NULL DEFAULT 0,       -- 已解锁(status=1)心愿占用的金额
+    balance REAL NOT NULL DEFAULT 0         -- attendance_total + habit_total - reserved
+) WITHOUT ROWID;
+CREATE TRIGGER trg_attendance_ledger_insert AFTER INSERT ON attendance
+BEGIN
+    INSERT OR IGNORE INTO user_balance (user_id) VALUES (NEW.user_id);
+    UPDATE user_balance
+       SET attendance_total = attendance_total + NEW.earned_amount,
+           balance = balance + NEW.earned_amount
+     WHERE user_id = NEW.user_id;
+END;
+CREATE TRIGGER trg_attendance_ledger_delete AFTER DELETE ON attendance
+BEGIN
+    UPDATE user_balance
+       SET attendance_total = attendance_total - OLD.earned_amount,
+           balance = balance - OLD.earned_amount
+     WHERE user_id = OLD.user_id;
+END;
+CREATE TRIGGER trg_attendance_ledger_update
+AFTER UPDATE OF earned_amount, user_id ON attendance
+BEGIN
+    UPDATE user_balance
+       SET attendance_total = attendance_total - OLD.earned_amount,
+           balance = balance - OLD.earned_amount
+     WHERE user_id = OLD.user_id;
+    INSERT OR IGNORE INTO user_balance (user_id) VALUES (NEW.user_id);
+    UPDATE user_balance
+       SET attendance_total = attendance_total + NEW.earned_amount,
+           balance = balance + NEW.earned_amount
+     WHERE user_id = NEW.user_id;
+END;
+CREATE TRIGGER trg_habit_checkin_ledger_insert AFTER INSERT ON habit_checkin
+BEGIN
+    INSERT OR IGNORE INTO user_balance (user_id) VALUES (NEW.user_id);
+    UPDATE user_balance
+       SET habit_total = habit_total + NEW.reward_amount,
+           balance = balance + NEW.reward_amount
+     WHERE user_id = NEW.user_id;
+END;
+CREATE TRIGGER trg_habit_checkin_ledger_delete AFTER DELETE ON habit_checkin
+BEGIN
+    UPDATE user_balance
+       SET habit_total = habit_total - OLD.reward_amount,
+           balance = balance - OLD.reward_amount
+     WHERE user_id = OLD.user_id;
+END;
+CREATE TRIGGER trg_habit_checkin_ledger_update
+AFTER UPDATE OF reward_amount, user_id ON habit_checkin
+BEGIN
+    UPDATE user_balance
+       SET habit_total = habit_total - OLD.reward_amount,
+           balance = balance - OLD.reward_amount
+     WHERE user_id = OLD.user_id;
+    INSERT OR IGNORE INTO user_balance (user_id) VALUES (NEW.user_id);
+    UPDATE user_balance
+       SET habit_total = habit_total + NEW.reward_amount,
+           balance = balance + NEW.reward_amount
+     WHERE user_id = NEW.user_id;
+END;
+CREATE TRIGGER trg_wishlist_ledger_insert AFTER INSERT ON wishlist
+WHEN NEW.status = 1
+BEGIN
+    INSERT OR IGNORE INTO user_balance (user_id) VALUES (NEW.user_id);
+    UPDATE user_balance
+       SET reserved = reserved + NEW.target_amount,
+           balance = balance - NEW.target_amount
+     WHERE user_id = NEW.user_id;
+END;
+CREATE TRIGGER trg_wishlist_ledger_delete AFTER DELETE ON wishlist
+WHEN OLD.status = 1
+BEGIN
+    UPDATE user_balance
+       SET reserved = reserved - OLD.target_amount,
+           balance = balance + OLD.target_amount
+     WHERE user_id = OLD.user_id;
+END;
+CREATE TRIGGER trg_wishlist_ledger_update
+AFTER UPDATE OF status, target_amount, user_id ON wishlist
+WHEN OLD.status = 1 OR NEW.status = 1
+BEGIN
+    UPDATE user_balance
+       SET reserved = reserved - OLD.target_amount,
+           balance = balance + OLD.target_amount
+     WHERE user_id = OLD.user_id AND OLD.status = 1;
+    INSERT OR IGNORE INTO user_balance (user_id) VALUES (NEW.user_id);
+    UPDATE user_balance
+       SET reserved = reserved + NEW.target_amount,
+           balance = balance - NEW.target_amount
+     WHERE user_id = NEW.user_id AND NEW.status = 1;
+END;
+
+-- 按日/按月的收入汇总表（仪表盘图表每天/每月只读一行）
+-- 由下面的触发器在每次写入考勤、习惯打卡时维护，与 db/rollups.py 的 ROLLUP_DDL 一致
+DROP TABLE IF EXISTS inflow_daily;
+DROP TABLE IF EXISTS inflow_monthly;
+CREATE TABLE inflow_daily (
+    user_id TEXT NOT NULL,
+    day TEXT NOT NULL,
+    attendance_amount REAL NOT NULL DEFAULT 0,
+    habit_amount REAL NOT NULL DEFAULT 0,
+    attendance_count INTEGER NOT NULL DEFAULT 0,
+    habit_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, day)
+) WITHOUT ROWID;
+CREATE TABLE inflow_monthly (
+    user_id TEXT NOT NULL,
+    month TEXT NOT NULL,
+    attendance_amount REAL NOT NULL DEFAULT 0,
+    habit_amount REAL NOT NULL DEFAULT 0,
+    attendance_count INTEGER NOT NULL DEFAULT 0,
+    habit_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, month)
+) WITHOUT ROWID;
+CREATE TRIGGER trg_attendance_inflow_daily_insert AFTER INSERT ON attendance
+BEGIN
+    INSERT OR IGNORE INTO inflow_daily (user_id, day) VALUES (NEW.user_id, NEW.date);
+    UPDATE inflow_daily
+       SET attendance_amount = attendance_amount + NEW.earned_amount,
+           attendance_count = attendance_count + 1
+     WHERE user_id = NEW.user_id AND day = NEW.date;
+END;
+CREATE TRIGGER trg_attendance_inflow_daily_delete AFTER DELETE ON attendance
+BEGIN
+    UPDATE inflow_daily
+       SET attendance_amount = attendance_amount - OLD.earned_amount,
+           attendance_count = attendance_count - 1
+     WHERE user_id = OLD.user_id AND day = OLD.date;
+    DELETE FROM inflow_daily
+     WHERE user_id = OLD.user_id AND day = OLD.date
+       AND attendance_count = 0 AND habit_count = 0;
+END;
+CREATE TRIGGER trg_attendance_inflow_daily_update
+AFTER UPDATE OF earned_amount, date, user_id ON attendance
+BEGIN
+    UPDATE inflow_daily
+       SET attendance_amount = attendance_amount - OLD.earned_amount,
+           attendance_count = attendance_count - 1
+     WHERE user_id = OLD.user_id AND day = OLD.date;
+    DELETE FROM inflow_daily
+     WHERE user_id = OLD.user_id AND day = OLD.date
+       AND attendance_count = 0 AND habit_count = 0;
+    INSERT OR IGNORE INTO inflow_daily (user_id, day) VALUES (NEW.user_id, NEW.date);
+    UPDATE inflow_daily
+       SET attendance_amount = attendance_amount + NEW.earned_amount,
+           attendance_count = attendance_count + 1
+     WHERE user_id = NEW.user_id AND day = NEW.date;
+END;
+CREATE TRIGGER trg_habit_checkin_inflow_daily_insert AFTER INSERT ON habit_checkin
+BEGIN
+    INSERT OR IGNORE INTO inflow_daily (user_id, day) VALUES (NEW.user_id, NEW.date);
+    UPDATE inflow_daily
+       SET habit_amount = habit_amount + NEW.reward_amount,
+           habit_count = habit_count + 1
+     WHERE user_id = NEW.user_id AND day = NEW.date;
+END;
+CREATE TRIGGER trg_habit_checkin_inflow_daily_delete AFTER DELETE ON habit_checkin
+BEGIN
+    UPDATE inflow_daily
+       SET habit_amount = habit_amount - OLD.reward_amount,
+           habit_count = habit_count - 1
+     WHERE user_id = OLD.user_id AND day = OLD.date;
+    DELETE FROM inflow_daily
+     WHERE user_id = OLD.user_id AND day = OLD.date
+       AND attendance_count = 0 AND habit_count = 0;
+END;
+CREATE TRIGGER trg_habit_checkin_inflow_daily_update
+AFTER UPDATE OF reward_amount, date, user_id ON habit_checkin
+BEGIN
+    UPDATE inflow_daily
+       SET habit_amount = habit_amount - OLD.reward_amount,
+           habit_count = habit_count - 1
+     WHERE user_id = OLD.user_id AND day = OLD.date;
+    DELETE FROM inflow_daily
+     WHERE user_id = OLD.user_id AND day = OLD.date
+       AND attendance_count = 0 AND habit_count = 0;
+    INSERT OR IGNORE INTO inflow_daily (user_id, day) VALUES (NEW.user_id, NEW.date);
+    UPDATE inflow_daily
+       SET habit_amount = habit_amount + NEW.reward_amount,
+           habit_count = habit_count + 1
+     WHERE user_id = NEW.user_id AND day = NEW.date;
+END;
+CREATE TRIGGER trg_attendance_inflow_monthly_insert AFTER INSERT ON attendance
+BEGIN
+    INSERT OR IGNORE INTO inflow_monthly (user_id, month) VALUES (NEW.user_id, substr(NEW.date, 1, 7));
+    UPDATE inflow_monthly
+       SET attendance_amount = attendance_amount + NEW.earned_amount,
+           attendance_count = attendance_count + 1
+     WHERE user_id = NEW.user_id AND month = substr(NEW.date, 1, 7);
+END;
+CREATE TRIGGER trg_attendance_inflow_monthly_delete AFTER DELETE ON attendance
+BEGIN
+    UPDATE inflow_monthly
+       SET attendance_amount = attendance_amount - OLD.earned_amount,
+           attendance_count = attendance_count - 1
+     WHERE user_id = OLD.user_id AND month = substr(OLD.date, 1, 7);
+    DELETE FROM inflow_monthly
+     WHERE user_id = OLD.user_id AND month = substr(OLD.date, 1, 7)
+       AND attendance_count = 0 AND habit_count = 0;
+END;
+CREATE TRIGGER trg_attendance_inflow_monthly_update
+AFTER UPDATE OF earned_amount, date, user_id ON attendance
+BEGIN
+    UPDATE inflow_monthly
+       SET attendance_amount = attendance_amount - OLD.earned_amount,
+           attendance_count = attendance_count - 1
+     WHERE user_id = OLD.user_id AND month = substr(OLD.date, 1, 7);
+    DELETE FROM inflow_monthly
+     WHERE user_id = OLD.user_id AND month = substr(OLD.date, 1, 7)
+       AND attendance_count = 0 AND habit_count = 0;
+    INSERT OR IGNORE INTO inflow_monthly (user_id, month) VALUES (NEW.user_id, substr(NEW.date, 1, 7));
+    UPDATE inflow_monthly
+       SET attendance_amount = attendance_amount + NEW.earned_amount,
+           attendance_count = attendance_count + 1
+     WHERE user_id = NEW.user_id AND month = substr(NEW.date, 1, 7);
+END;
+CREATE TRIGGER trg_habit_checkin_inflow_monthly_insert AFTER INSERT ON habit_checkin
+BEGIN
+    INSERT OR IGNORE INTO inflow_monthly (user_id, month) VALUES (NEW.user_id, substr(NEW.date, 1, 7));
+    UPDATE inflow_monthly
+       SET habit_amount = habit_amount + NEW.reward_amount,
+           habit_count = habit_count + 1
+     WHERE user_id = NEW.user_id AND month = substr(NEW.date, 1, 7);
+END;
+CREATE TRIGGER trg_habit_checkin_inflow_monthly_delete AFTER DELETE ON habit_checkin
+BEGIN
+    UPDATE inflow_monthly
+       SET habit_amount = habit_amount - OLD.reward_amount,
+           habit_count = habit_count - 1
+     WHERE user_id = OLD.user_id AND month = substr(OLD.date, 1, 7);
+    DELETE FROM inflow_monthly
+     WHERE user_id = OLD.user_id AND month = substr(OLD.date, 1, 7)
+       AND attendance_count = 0 AND habit_count = 0;
+END;
+CREATE TRIGGER trg_habit_checkin_inflow_monthly_update
+AFTER UPDATE OF reward_amount, date, user_id ON habit_checkin
+BEGIN
+    UPDATE inflow_monthly
+       SET habit_amount = habit_amount - OLD.reward_amount,
+           habit_count = habit_count - 1
+     WHERE user_id = OLD.user_id AND month = substr(OLD.date, 1, 7);
+    DELETE FROM inflow_monthly
+     WHERE user_id = OLD.user_id AND month = substr(OLD.date, 1, 7)
+       AND attendance_count = 0 AND habit_count = 0;
+    INSERT OR IGNORE INTO inflow_monthly (user_id, month) VALUES (NEW.user_id, substr(NEW.date, 1, 7));
+    UPDATE inflow_monthly
+       SET habit_amount = habit_amount + NEW.reward_amount,
+           habit_count = habit_count + 1
+     WHERE user_id = NEW.user_id AND month = substr(NEW.date, 1, 7);
+END;
 
 -- -------------------------------
-DROP VIEW IF EXISTS v_pool_inflows;
-CREATE VIEW v_pool_inflows AS
-SELECT
-    user_id,
-    date AS occurs_on,
-    'attendance' AS source_kind,
-    earned_amount AS amount
-FROM attendance
-UNION ALL
-SELECT
-    user_id,
-    date AS occurs_on,
-    'habit' AS source_kind,
-    reward_amount AS amount
-FROM habit_checkin;
\ No newline at end of file
+-- 资金池收入视图 v_pool_inflows (user_id, occurs_on, source_kind, amount)：
+-- 唯一的定义是 db/rollups.py 的 POOL_INFLOWS_DDL，由迁移 v7 创建，此处不再重复
@@ -0,0 +1,259 @@
+"""
+Optional per-user database sharding.
+
+By default every user lives in the single db/db.sqlite3 file. With
+WISHESFLOW_SHARDS=N (N > 0) users are spread over N SQLite files under
+WISHESFLOW_DATA_DIR (default db/shards), picked by a stable hash of user_id.
+Check-ins of users on different shards no longer wait on the same write lock
+(each file gets its own writer thread, see db.writer), and every per-user
+query only reads its own shard.
+
+db.pool.get_pool(user_id) routes to the right file, so the db helpers only
+pass the user_id they already have. Row ids are unique per shard only;
+every query filters by user_id, so that is all the pages need.
+
+The file names carry the shard count (shard_003_of_008.sqlite3): changing N
+moves users between files, so the data has to be merged back into one file
+and split again, and ensure_schema refuses to start on a directory that was
+split with another count.
+
+    python -m db.shards split SRC.sqlite3 --shards 8 [--dir DIR]
+    python -m db.shards merge DEST.sqlite3 [--dir DIR]
+    python -m db.shards stats [--dir DIR] [--shards N]
+"""
+import argparse
+import glob
+import os
+import re
+import sqlite3
+import sys
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+SHARD_COUNT = int(os.environ.get("WISHESFLOW_SHARDS") or 0)
+DATA_DIR = os.environ.get("WISHESFLOW_DATA_DIR") or os.path.join(os.path.dirname(__file__), "shards")
+
+# 按外键依赖排序的用户数据表；余额汇总与日/月汇总表由触发器随之生成
+TABLES = ("income", "attendance", "habit_task", "habit_checkin", "wishlist")
+# 子表的外键列 -> 父表
+REFERENCES = {"attendance": ("income_id", "income"), "habit_checkin": ("task_id", "habit_task")}
+MAX_WORKERS = 16   # 跨分片统计的最大并行数
+
+_NAME = re.compile(r"shard_(\d+)_of_(\d+)\.sqlite3$")
+
+
+def configure(directory=None, count=None):
+    """Change the shard directory and/or count (tools and benchmarks); count=0 turns sharding off."""
+    global DATA_DIR, SHARD_COUNT
+    if directory is not None:
+        DATA_DIR = directory
+    if count is not None:
+        SHARD_COUNT = count
+
+
+def enabled():
+    return SHARD_COUNT > 0
+
+
+def shard_of(user_id, count=None):
+    """The shard index of user_id: crc32 is stable across processes, unlike hash()."""
+    return zlib.crc32(str(user_id).encode("utf-8")) % (count or SHARD_COUNT)
+
+
+def shard_path(index, count=None, directory=None):
+    count = count or SHARD_COUNT
+    return os.path.join(directory or DATA_DIR, f"shard_{index:03d}_of_{count:03d}.sqlite3")
+
+
+def path_for(user_id):
+    return shard_path(shard_of(user_id))
+
+
+def database_paths():
+    """Every database file in use: the shards, or the single file when sharding is off."""
+    if not enabled():
+        from db.pool import DB_PATH
+
+        return [DB_PATH]
+    return [shard_path(i) for i in range(SHARD_COUNT)]
+
+
+def existing_shards(directory=None):
+    """{count: [paths]} of the shard files found in directory."""
+    found = {}
+    for path in sorted(glob.glob(os.path.join(directory or DATA_DIR, "shard_*_of_*.sqlite3"))):
+        match = _NAME.search(path)
+        if match:
+            found.setdefault(int(match.group(2)), []).append(path)
+    return found
+
+
+def check_layout():
+    """Create the shard directory; raise if it holds shards split with a different count."""
+    os.makedirs(DATA_DIR, exist_ok=True)
+    other = sorted(set(existing_shards()) - {SHARD_COUNT})
+    if other:
+        raise RuntimeError(
+            f"{DATA_DIR} holds data split into {other[0]} shards but WISHESFLOW_SHARDS={SHARD_COUNT}; "
+            "merge the shards (python -m db.shards merge) and split them again first")
+
+
+def _columns(conn, schema, table):
+    return [row[1] for row in conn.execute(f"PRAGMA {schema}.table_info({table})")]
+
+
+def _open(path):
+    from db.migrations import migrate
+
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode = WAL")
+    migrate(conn)
+    return conn
+
+
+def split(source, count, directory=None):
+    """
+    Copy every user of the single-file database source into count new shard
+    files. Rows keep their ids; the source file is only read (after being
+    migrated). Returns the number of copied rows per shard.
+    """
+    directory = directory or DATA_DIR
+    if existing_shards(directory):
+        raise FileExistsError(f"{directory} already holds shard files")
+    os.makedirs(directory, exist_ok=True)
+    _open(source).close()
+    copied = []
+    for index in range(count):
+        conn = _open(shard_path(index, count, directory))
+        conn.create_function("shard_of", 1, lambda user_id: shard_of(user_id, count), deterministic=True)
+        conn.execute("ATTACH DATABASE ? AS src", (source,))
+        rows = 0
+        with conn:
+            for table in TABLES:
+                columns = ", ".join(_columns(conn, "main", table))
+                rows += conn.execute(
+                    f"INSERT INTO main.{table} ({columns}) SELECT {columns} FROM src.{table} "
+                    "WHERE shard_of(user_id) = ?", (index,)).rowcount
+            # 沿用源库的自增序列，拆分后新写入的 id 不会与拆分前的任何 id 重复
+            conn.execute("DELETE FROM main.sqlite_sequence")
+            conn.execute("INSERT INTO main.sqlite_sequence (name, seq) SELECT name, seq FROM src.sqlite_sequence")
+        conn.execute("DETACH DATABASE src")
+        conn.close()
+        copied.append(rows)
+    return copied
+
+
+def merge(dest, directory=None):
+    """
+    Copy every shard file in directory into dest (created or migrated as
+    needed). Ids are kept unless they collide with rows already in dest, in
+    which case that shard's rows of the table are shifted past dest's largest
+    id (and the check-ins follow their income/habit). Returns rows per shard.
+    """
+    layouts = existing_shards(directory)
+    if len(layouts) != 1:
+        raise FileNotFoundError(f"expected one set of shard files in {directory or DATA_DIR}, found {len(layouts)}")
+    conn = _open(dest)
+    copied = []
+    for path in next(iter(layouts.values())):
+        _open(path).close()
+        conn.execute("ATTACH DATABASE ? AS src", (path,))
+        rows = 0
+        offsets = {}
+        with conn:
+            for table in TABLES:
+                clash = conn.execute(
+                    f"SELECT EXISTS (SELECT 1 FROM src.{table} s JOIN main.{table} m ON m.id = s.id)").fetchone()[0]
+                offsets[table] = conn.execute(
+                    f"SELECT COALESCE(MAX(id), 0) FROM main.{table}").fetchone()[0] if clash else 0
+                columns = _columns(conn, "main", table)
+                shifted = {"id": offsets[table]}
+                if table in REFERENCES:
+                    column, parent = REFERENCES[table]
+                    shifted[column] = offsets[parent]
+                select = ", ".join(f"{c} + {shifted[c]}" if shifted.get(c) else c for c in columns)
+                rows += conn.execute(
+                    f"INSERT INTO main.{table} ({', '.join(columns)}) SELECT {select} FROM src.{table}").rowcount
+        conn.execute("DETACH DATABASE src")
+        copied.append(rows)
+    conn.close()
+    return copied
+
+
+def _shard_totals(path):
+    from db.pool import pool_at
+
+    with pool_at(path).connection() as conn:
+        conn.execute("BEGIN")   # 同一快照内读完这个分片
+        users, attendance, habit, reserved, balance = conn.execute("""
+            SELECT COUNT(*), COALESCE(SUM(attendance_total), 0), COALESCE(SUM(habit_total), 0),
+                   COALESCE(SUM(reserved), 0), COALESCE(SUM(balance), 0)
+            FROM user_balance""").fetchone()
+        wishes = conn.execute("SELECT status, COUNT(*) FROM wishlist GROUP BY status").fetchall()
+        monthly = conn.execute("""
+            SELECT month, SUM(attendance_amount), SUM(habit_amount), SUM(attendance_count + habit_count)
+            FROM inflow_monthly GROUP BY month""").fetchall()
+    return users, attendance, habit, reserved, balance, wishes, monthly
+
+
+def admin_totals(paths=None):
+    """
+    Totals over every user: users, ledger sums, wishes per status, check-ins
+    and inflow per month. Each database file is read on its own thread
+    (sqlite3 releases the GIL while a query runs) and the parts are added up.
+    """
+    paths = paths or database_paths()
+    with ThreadPoolExecutor(max_workers=min(len(paths), MAX_WORKERS)) as pool:
+        parts = list(pool.map(_shard_totals, paths))
+    totals = {"databases": len(paths), "users": 0, "attendance_total": 0, "habit_total": 0,
+              "reserved": 0, "balance": 0, "checkins": 0, "wishes": {}, "monthly": {}}
+    for users, attendance, habit, reserved, balance, wishes, monthly in parts:
+        totals["users"] += users
+        totals["attendance_total"] += attendance
+        totals["habit_total"] += habit
+        totals["reserved"] += reserved
+        totals["balance"] += balance
+        for status, n in wishes:
+            totals["wishes"][status] = totals["wishes"].get(status, 0) + n
+        for month, attendance_amount, habit_amount, n in monthly:
+            a, h = totals["monthly"].get(month, (0, 0))
+            totals["monthly"][month] = (a + attendance_amount, h + habit_amount)
+            totals["checkins"] += n
+    totals["monthly"] = dict(sorted(totals["monthly"].items()))
+    return totals
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m db.shards", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--dir", help="shard directory (defaults to WISHESFLOW_DATA_DIR or db/shards)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sp = sub.add_parser("split", help="split a single-file database into shards")
+    sp.add_argument("source")
+    sp.add_argument("--shards", type=int, required=True)
+    mp = sub.add_parser("merge", help="merge the shards back into one database file")
+    mp.add_argument("dest")
+    st = sub.add_parser("stats", help="totals over every user, computed on all shards in parallel")
+    st.add_argument("--shards", type=int, help="shard count (defaults to the one found in the directory)")
+    args = parser.parse_args(argv)
+    if args.dir:
+        configure(directory=args.dir)
+
+    if args.command == "split":
+        for index, rows in enumerate(split(args.source, args.shards)):
+            print(f"{shard_path(index, args.shards)}: {rows} rows")
+    elif args.command == "merge":
+        rows = merge(args.dest)
+        print(f"{args.dest}: {sum(rows)} rows from {len(rows)} shards")
+    else:
+        count = args.shards or max(existing_shards(), default=0)
+        if not count:
+            print(f"no shard files in {DATA_DIR}")
+            return 1
+        configure(count=count)
+        for key, value in admin_totals().items():
+            print(f"{key:<18} {value}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,254 @@
+"""
+Habit streaks and completion rates.
+
+habit_stats(user_id) gives, for every habit the user has checked in, the
+current and longest streak (consecutive check-in days) and the share of the
+last 7, 30 and 365 days that were checked in.
+
+The first call for a user reads (task_id, date) of all their check-ins in one
+scan of the (user_id, task_id, date) unique index and finds the runs of
+consecutive days of every habit in a single pass: dates become day numbers
+and a run starts wherever the habit changes or the gap to the previous
+check-in is not one day. This is plain Python on purpose: the habit page
+calls it on every load and must not import NumPy (see
+benchmarks/bench_import_time.py).
+Each habit keeps its runs as sorted, disjoint [start, end] day intervals,
+from which the stats of any day are a binary search plus a walk over the
+runs of the last year.
+
+The write helpers report the check-ins they add or remove (note_checkins);
+once the transaction commits, the runs of those habits are patched (a run is
+extended, two runs merge, a run is split) instead of re-reading the history.
+Any other write to the user bumps the db.cache data version without a patch,
+and the next call reads the history again.
+"""
+import functools
+import threading
+from bisect import bisect_right
+from collections import OrderedDict, namedtuple
+from datetime import date as date_cls
+
+from db.cache import get_cache
+from db.pool import connection, get_pool, on_commit
+
+WINDOWS = (7, 30, 365)   # 完成率统计的天数窗口
+MAX_USERS = 256          # 缓存的用户数上限，超出按最近最少使用淘汰
+
+HabitStats = namedtuple("HabitStats", "current_streak longest_streak rate_7 rate_30 rate_365")
+NO_STATS = HabitStats(0, 0, 0.0, 0.0, 0.0)
+
+_EPOCH = date_cls(1970, 1, 1)
+
+
+def day_number(day):
+    """Days since 1970-01-01 of a date or YYYY-MM-DD string."""
+    if isinstance(day, str):
+        day = date_cls.fromisoformat(day)
+    return (day - _EPOCH).days
+
+
+class HabitRuns:
+    """The check-in days of one habit as sorted, disjoint, non-adjacent [start, end] runs."""
+
+    __slots__ = ("starts", "ends", "lengths")
+
+    def __init__(self, starts=(), ends=()):
+        self.starts = list(starts)
+        self.ends = list(ends)
+        self.lengths = {}   # 连续天数 -> 段数，最长连续即其中最大的键
+        for start, end in zip(self.starts, self.ends):
+            self._count(end - start + 1, 1)
+
+    def _count(self, length, n):
+        left = self.lengths.get(length, 0) + n
+        if left:
+            self.lengths[length] = left
+        else:
+            del self.lengths[length]
+
+    def add(self, day):
+        i = bisect_right(self.starts, day) - 1
+        if i >= 0 and day <= self.ends[i]:
+            return
+        joins_left = i >= 0 and self.ends[i] == day - 1
+        joins_right = i + 1 < len(self.starts) and self.starts[i + 1] == day + 1
+        if joins_left:
+            self._count(self.ends[i] - self.starts[i] + 1, -1)
+        if joins_right:
+            self._count(self.ends[i + 1] - self.starts[i + 1] + 1, -1)
+        if joins_left and joins_right:
+            self.ends[i] = self.ends.pop(i + 1)
+            del self.starts[i + 1]
+        elif joins_left:
+            self.ends[i] = day
+        elif joins_right:
+            i += 1
+            self.starts[i] = day
+        else:
+            i += 1
+            self.starts.insert(i, day)
+            self.ends.insert(i, day)
+        self._count(self.ends[i] - self.starts[i] + 1, 1)
+
+    def remove(self, day):
+        i = bisect_right(self.starts, day) - 1
+        if i < 0 or day > self.ends[i]:
+            return
+        start, end = self.starts[i], self.ends[i]
+        self._count(end - start + 1, -1)
+        if start == end:
+            del self.starts[i], self.ends[i]
+            return
+        if day == start:
+            self.starts[i] = day + 1
+        elif day == end:
+            self.ends[i] = day - 1
+        else:
+            self.ends[i] = day - 1
+            self.starts.insert(i + 1, day + 1)
+            self.ends.insert(i + 1, end)
+            self._count(end - day, 1)
+        self._count(self.ends[i] - self.starts[i] + 1, 1)
+
+    def stats(self, today):
+        """HabitStats as of day number today; check-ins after today only count towards the longest streak."""
+        i = bisect_right(self.starts, today) - 1
+        # 今天还没打卡时，截至昨天的连续天数仍算当前连续
+        current = min(self.ends[i], today) - self.starts[i] + 1 if i >= 0 and self.ends[i] >= today - 1 else 0
+        done = [0] * len(WINDOWS)
+        oldest = today - max(WINDOWS) + 1
+        while i >= 0 and self.ends[i] >= oldest:
+            end = min(self.ends[i], today)
+            for k, window in enumerate(WINDOWS):
+                done[k] += max(0, end - max(self.starts[i], today - window + 1) + 1)
+            i -= 1
+        return HabitStats(current, max(self.lengths, default=0),
+                          *(n / window for n, window in zip(done, WINDOWS)))
+
+
+def build_runs(checkins):
+    """
+    {task_id: HabitRuns} of check-ins given as (task_id, date) pairs (dates as
+    YYYY-MM-DD strings or dates), sorted by (task_id, date) without duplicates
+    (the order of the unique index).
+    """
+    runs = {}
+    numbers = {}   # 日期 -> 天数编号；各习惯的日期大量重复，只换算一次
+    task = previous = starts = ends = None
+    for task_id, day in checkins:
+        n = numbers.get(day)
+        if n is None:
+            n = numbers[day] = day_number(day)
+        if task_id != task:
+            task, starts, ends = task_id, [n], [n]
+            runs[task_id] = (starts, ends)
+        elif n == previous + 1:
+            ends[-1] = n
+        else:
+            starts.append(n)
+            ends.append(n)
+        previous = n
+    return {task_id: HabitRuns(starts, ends) for task_id, (starts, ends) in runs.items()}
+
+
+def compute_stats(checkins, today=None):
+    """{task_id: HabitStats} of the (task_id, date) check-ins, as for build_runs."""
+    today = day_number(today or date_cls.today())
+    return {task_id: runs.stats(today) for task_id, runs in build_runs(checkins).items()}
+
+
+CHECKIN_DAYS_SQL = "SELECT task_id, date FROM habit_checkin WHERE user_id = ? ORDER BY task_id, date"
+
+
+class StreakCache:
+    """Per-user {task_id: HabitRuns}, tagged with the db.cache data version they reflect."""
+
+    def __init__(self, max_users=MAX_USERS):
+        self.max_users = max_users
+        self.loads = 0
+        self.patches = 0
+        self._entries = OrderedDict()   # (数据库文件, user_id) -> [数据版本, {task_id: HabitRuns}]
+        self._lock = threading.Lock()
+
+    def stats(self, user_id, today):
+        key = (get_pool(user_id).path, user_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == get_cache().version(user_id):
+                self._entries.move_to_end(key)
+                return {task_id: runs.stats(today) for task_id, runs in entry[1].items()}
+        # 先读版本再读数据：与提交并发的加载会以旧版本保存，之后不会被命中
+        version = get_cache().version(user_id)
+        with connection(user_id) as conn:
+            runs = build_runs(conn.execute(CHECKIN_DAYS_SQL, (user_id,)))
+        with self._lock:
+            self.loads += 1
+            self._entries[key] = [version, runs]
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+            return {task_id: r.stats(today) for task_id, r in runs.items()}
+
+    def patch(self, key, user_id, changes):
+        """Apply changes [(task_id, date, added)] committed together with one bump of user_id's data version."""
+        epoch, version = get_cache().version(user_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            if entry[0] != (epoch, version - 1):
+                # 期间有未打补丁的写入：丢弃，下次读取时重新加载
+                del self._entries[key]
+                return
+            for task_id, day, added in changes:
+                runs = entry[1].get(task_id)
+                if added:
+                    if runs is None:
+                        runs = entry[1][task_id] = HabitRuns()
+                    runs.add(day_number(day))
+                elif runs is not None:
+                    runs.remove(day_number(day))
+                    if not runs.starts:
+                        del entry[1][task_id]
+            entry[0] = (epoch, version)
+            self.patches += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.loads = self.patches = 0
+
+    def cache_stats(self):
+        with self._lock:
+            return {"users": len(self._entries), "loads": self.loads, "patches": self.patches}
+
+
+_streaks = StreakCache()
+
+
+def get_streak_cache():
+    return _streaks
+
+
+def habit_stats(user_id, today=None):
+    """
+    {task_id: HabitStats} of every habit user_id has check-ins for (deleted
+    habits included; habits never checked in are missing, see NO_STATS) as
+    of today (a date, default date.today()).
+    """
+    return _streaks.stats(user_id, day_number(today or date_cls.today()))
+
+
+def note_checkins(user_id, changes):
+    """
+    Patch user_id's cached runs with changes [(task_id, date, added)] once the
+    current transaction commits. Call it after invalidate_user(user_id) in the
+    same transaction, and only for that one bump: added days that were already
+    checked in and removed days that were not are ignored.
+    """
+    on_commit(functools.partial(_streaks.patch, (get_pool(user_id).path, user_id), user_id, list(changes)),
+              user_id)
+
+
+def streak_cache_stats():
+    return _streaks.cache_stats()
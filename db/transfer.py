@@ -0,0 +1,266 @@
+"""
+Streaming import/export of one user's full history.
+
+An export is a zip archive with one file per table (income, habit_task,
+attendance, habit_checkin, wishlist) in CSV or Parquet. Rows are read and
+written in CHUNK_SIZE batches, so memory stays bounded however long the
+history is. Importing remaps income_id/task_id onto the newly inserted rows
+and runs in a single write transaction.
+
+    python -m db.transfer export --user alice --out alice.zip [--format parquet]
+    python -m db.transfer import --user bob --in alice.zip [--db path/to/db.sqlite3]
+
+Parquet support needs pyarrow.
+"""
+import argparse
+import csv
+import io
+import sys
+import zipfile
+
+from db.cache import invalidate_user
+from db.pool import connection, transaction
+from db.writer import serialized
+
+CHUNK_SIZE = 5000
+FORMATS = ("csv", "parquet")
+
+
+def _optional_text(value):
+    return None if value in (None, "") else str(value)
+
+
+# 表 -> [(列, 导入时的类型转换)]，按导入顺序排列（父表在前）
+TABLES = {
+    "income": [("id", int), ("title", str), ("daily_amount", float), ("note", _optional_text)],
+    "habit_task": [("id", int), ("title", str), ("reward_amount", float), ("note", _optional_text)],
+    "attendance": [("id", int), ("income_id", int), ("date", str), ("earned_amount", float),
+                   ("note", _optional_text)],
+    "habit_checkin": [("id", int), ("task_id", int), ("date", str), ("reward_amount", float),
+                      ("note", _optional_text)],
+    "wishlist": [("id", int), ("title", str), ("target_amount", float), ("priority", int), ("status", int),
+                 ("unlocked_at", _optional_text), ("created_at", _optional_text)],
+}
+# 子表外键 -> 父表
+FOREIGN_KEYS = {"attendance": ("income_id", "income"), "habit_checkin": ("task_id", "habit_task")}
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError("Parquet import/export requires pyarrow (pip install pyarrow)")
+    return pyarrow, pyarrow.parquet
+
+
+def _iter_table(conn, table, user_id, chunk_size):
+    cols = ", ".join(name for name, _ in TABLES[table])
+    cur = conn.execute(f"SELECT {cols} FROM {table} WHERE user_id = ? ORDER BY id", (user_id,))
+    while True:
+        rows = cur.fetchmany(chunk_size)
+        if not rows:
+            return
+        yield [tuple(r) for r in rows]
+
+
+# -------------------------------
+# 导出
+# -------------------------------
+
+
+def _write_csv(out, columns, chunks):
+    text = io.TextIOWrapper(out, encoding="utf-8", newline="")
+    writer = csv.writer(text)
+    writer.writerow(columns)
+    count = 0
+    for rows in chunks:
+        writer.writerows(rows)
+        count += len(rows)
+    text.flush()
+    text.detach()
+    return count
+
+
+def _write_parquet(out, columns, chunks):
+    pa, pq = _require_pyarrow()
+    schema = pa.schema([
+        (name, pa.int64() if conv is int else pa.float64() if conv is float else pa.string())
+        for name, conv in columns
+    ])
+    count = 0
+    with pq.ParquetWriter(out, schema) as writer:
+        for rows in chunks:
+            writer.write_batch(pa.RecordBatch.from_arrays(
+                [pa.array(col, type=field.type) for col, field in zip(zip(*rows), schema)], schema=schema))
+            count += len(rows)
+    return count
+
+
+def export_user(user_id, out, fmt="csv", chunk_size=CHUNK_SIZE):
+    """
+    Write user_id's history as a zip archive to out (a path or binary file object).
+    All tables are read inside one read transaction, so the export is a
+    consistent snapshot. Returns {table: row count}.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown format {fmt!r}, expected one of {FORMATS}")
+    if fmt == "parquet":
+        _require_pyarrow()
+    counts = {}
+    with connection(user_id) as conn, zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as zf:
+        began = not conn.in_transaction
+        if began:
+            conn.execute("BEGIN")
+        for table, columns in TABLES.items():
+            chunks = _iter_table(conn, table, user_id, chunk_size)
+            with zf.open(f"{table}.{fmt}", "w", force_zip64=True) as entry:
+                if fmt == "csv":
+                    counts[table] = _write_csv(entry, [name for name, _ in columns], chunks)
+                else:
+                    counts[table] = _write_parquet(entry, columns, chunks)
+        if began:
+            conn.rollback()
+    return counts
+
+
+# -------------------------------
+# 导入
+# -------------------------------
+
+
+def _read_csv(entry, columns, chunk_size):
+    reader = csv.reader(io.TextIOWrapper(entry, encoding="utf-8", newline=""))
+    header = next(reader, None)
+    if header is None:
+        return
+    index = [header.index(name) if name in header else None for name, _ in columns]
+    batch = []
+    for record in reader:
+        batch.append(tuple(
+            conv(record[i]) if i is not None else None for i, (_, conv) in zip(index, columns)))
+        if len(batch) >= chunk_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _read_parquet(entry, columns, chunk_size):
+    _, pq = _require_pyarrow()
+    parquet = pq.ParquetFile(entry)
+    names = [name for name, _ in columns if name in parquet.schema_arrow.names]
+    for batch in parquet.iter_batches(batch_size=chunk_size, columns=names):
+        data = batch.to_pydict()
+        n = batch.num_rows
+        yield list(zip(*[
+            [conv(v) if v is not None else None for v in data[name]] if name in data else [None] * n
+            for name, conv in columns]))
+
+
+def _insert_parents(conn, table, user_id, batches):
+    """逐行插入父表以取得新 id，返回 {旧 id: 新 id}（父表行数通常很少）"""
+    cols = [name for name, _ in TABLES[table]][1:]
+    sql = f"INSERT INTO {table} ({', '.join(cols)}, user_id) VALUES ({', '.join('?' * len(cols))}, ?)"
+    mapping = {}
+    for rows in batches:
+        for old_id, *values in rows:
+            mapping[old_id] = conn.execute(sql, (*values, user_id)).lastrowid
+    return mapping
+
+
+def _insert_children(conn, table, user_id, batches, mapping):
+    """
+    批量插入子表并改写外键。来源中已删除的父记录（如删除习惯后保留的历史打卡）
+    没有新 id，用负的旧 id 占位，既保留金额也不会与新 id 冲突。
+    重复打卡由唯一索引跳过。返回插入行数。
+    """
+    cols = [name for name, _ in TABLES[table]][1:]
+    fk_index = cols.index(FOREIGN_KEYS[table][0])
+    sql = (f"INSERT OR IGNORE INTO {table} ({', '.join(cols)}, user_id) "
+           f"VALUES ({', '.join('?' * len(cols))}, ?)")
+    inserted = 0
+    for rows in batches:
+        params = []
+        for _, *values in rows:
+            values[fk_index] = mapping.get(values[fk_index], -abs(values[fk_index]))
+            params.append((*values, user_id))
+        inserted += conn.executemany(sql, params).rowcount
+    return inserted
+
+
+def _insert_rows(conn, table, user_id, batches):
+    cols = [name for name, _ in TABLES[table]][1:]
+    sql = f"INSERT INTO {table} ({', '.join(cols)}, user_id) VALUES ({', '.join('?' * len(cols))}, ?)"
+    inserted = 0
+    for rows in batches:
+        inserted += conn.executemany(sql, [(*values, user_id) for _, *values in rows]).rowcount
+    return inserted
+
+
+@serialized
+def import_user(user_id, src, chunk_size=CHUNK_SIZE):
+    """
+    Load an archive produced by export_user (path or binary file object) into
+    user_id's data, remapping income_id/task_id to the new rows. Everything runs
+    in one write transaction: either the whole archive is imported or nothing.
+    Returns {table: inserted row count}.
+    """
+    counts = {}
+    with zipfile.ZipFile(src) as zf, transaction(user_id) as conn:
+        names = set(zf.namelist())
+        mappings = {}
+        for table, columns in TABLES.items():
+            for fmt in FORMATS:
+                if f"{table}.{fmt}" in names:
+                    break
+            else:
+                counts[table] = 0
+                continue
+            with zf.open(f"{table}.{fmt}") as entry:
+                reader = _read_csv if fmt == "csv" else _read_parquet
+                batches = reader(entry, columns, chunk_size)
+                if table in FOREIGN_KEYS:
+                    counts[table] = _insert_children(
+                        conn, table, user_id, batches, mappings.get(FOREIGN_KEYS[table][1], {}))
+                elif table == "wishlist":
+                    counts[table] = _insert_rows(conn, table, user_id, batches)
+                else:
+                    mappings[table] = _insert_parents(conn, table, user_id, batches)
+                    counts[table] = len(mappings[table])
+        invalidate_user(user_id)
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m db.transfer", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--db", help="database file (defaults to db/db.sqlite3)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    exp = sub.add_parser("export", help="export a user's history to a zip archive")
+    exp.add_argument("--user", required=True)
+    exp.add_argument("--out", required=True)
+    exp.add_argument("--format", choices=FORMATS, default="csv")
+    imp = sub.add_parser("import", help="import an exported archive into a user")
+    imp.add_argument("--user", required=True)
+    imp.add_argument("--in", dest="src", required=True)
+    for p in (exp, imp):
+        p.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    from db import pool
+    from db.migrations import ensure_schema
+    if args.db:
+        pool.configure(args.db)
+    ensure_schema()
+
+    if args.command == "export":
+        counts = export_user(args.user, args.out, args.format, args.chunk_size)
+    else:
+        counts = import_user(args.user, args.src, args.chunk_size)
+    for table, n in counts.items():
+        print(f"{table}: {n}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,184 @@
+"""
+Single writer thread.
+
+SQLite allows one writer at a time; when every Streamlit session writes from
+its own thread, bursts of check-ins queue up on the database lock and can
+fail with "database is locked" once busy_timeout runs out. Instead, the db
+write helpers are @serialized: each call is queued and executed by one
+writer thread, and the calling thread waits on a Future for its result.
+
+The writer drains whatever has queued up (at most MAX_BATCH calls) and runs
+it as one BEGIN IMMEDIATE transaction, so a burst costs a single commit.
+Every call runs in its own savepoint (a nested pool.connection() block): a
+call that fails only undoes its own writes and its exception is re-raised in
+the caller. If the group commit itself fails, the calls are retried one
+transaction each. Results are handed back only after the commit, once the
+cache invalidations of the batch have run.
+
+With sharding (db.shards) there is one writer per database file, picked by
+the user_id argument of the serialized helper, so shards commit in parallel.
+
+Reads are unaffected and keep using the calling thread's pooled connection.
+Calls made while the thread already holds a pooled connection (nested calls,
+tools that wrap several helpers in one transaction) and calls made with
+WISHESFLOW_WRITER=0 run directly on the calling thread, as before.
+"""
+import atexit
+import contextvars
+import functools
+import inspect
+import os
+import queue
+import threading
+from concurrent.futures import Future
+
+from db.pool import get_pool
+
+MAX_BATCH = 64   # 一次组提交最多合并的写调用数
+ENABLED = os.environ.get("WISHESFLOW_WRITER", "1") != "0"
+
+
+class Writer:
+    def __init__(self, pool, max_batch=MAX_BATCH):
+        self.pool = pool
+        self.max_batch = max_batch
+        self.batches = 0
+        self.calls = 0
+        self._queue = queue.SimpleQueue()
+        name = "wishesflow-writer-" + os.path.splitext(os.path.basename(pool.path))[0]
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def on_writer_thread(self):
+        return threading.current_thread() is self._thread
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        self._queue.put((fn, args, kwargs, future, contextvars.copy_context()))
+        return future
+
+    def stop(self):
+        """Finish everything queued so far, then stop the thread."""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            job = self._queue.get()
+            batch = []
+            while job is not None:
+                # 已被调用方取消的调用直接丢弃
+                if job[3].set_running_or_notify_cancel():
+                    batch.append(job)
+                if len(batch) >= self.max_batch:
+                    break
+                try:
+                    job = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            stopping = job is None
+            if batch:
+                self._commit(batch)
+
+    def _commit(self, batch):
+        outcomes = []
+        try:
+            with self.pool.transaction():
+                for fn, args, kwargs, _, context in batch:
+                    try:
+                        with self.pool.connection():
+                            # 在调用方的 contextvars 中执行，查询统计（db.instrument）记在调用方名下
+                            outcomes.append((context.run(fn, *args, **kwargs), None))
+                    except Exception as e:
+                        outcomes.append((None, e))
+        except Exception as e:
+            if len(batch) > 1:
+                # 整批提交失败：逐个单独重试，互不连累
+                for job in batch:
+                    self._commit([job])
+                return
+            outcomes = [(None, e)]
+        self.batches += 1
+        self.calls += len(batch)
+        for (_, _, _, future, _), (result, error) in zip(batch, outcomes):
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+
+_writers = {}   # 数据库文件路径 -> Writer
+_writer_lock = threading.Lock()
+
+
+def get_writer(user_id=None):
+    """The writer of user_id's database file (see db.pool.get_pool)."""
+    pool = get_pool(user_id)
+    writer = _writers.get(pool.path)
+    if writer is None:
+        with _writer_lock:
+            writer = _writers.get(pool.path)
+            if writer is None:
+                writer = _writers[pool.path] = Writer(pool)
+    return writer
+
+
+def _on_writer_thread():
+    return any(writer.on_writer_thread() for writer in list(_writers.values()))
+
+
+def submit(fn, *args, **kwargs):
+    """
+    Queue fn(*args, **kwargs) for the writer thread and return a Future.
+    fn does its writes through db.pool.connection()/transaction() as usual;
+    on the writer thread those blocks join the current group transaction.
+    """
+    return submit_for(None, fn, *args, **kwargs)
+
+
+def submit_for(user_id, fn, *args, **kwargs):
+    """submit() on the writer of user_id's database file (they differ only when sharded)."""
+    if not ENABLED or get_pool(user_id).holds_connection() or _on_writer_thread():
+        future = Future()
+        future.set_running_or_notify_cancel()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+    return get_writer(user_id).submit(fn, *args, **kwargs)
+
+
+def serialized(fn):
+    """
+    Make fn run through the writer thread; the caller blocks until it has been
+    committed. fn's user_id argument, if it has one, picks the writer.
+    """
+    signature = inspect.signature(fn)
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        user_id = signature.bind_partial(*args, **kwargs).arguments.get("user_id")
+        return submit_for(user_id, fn, *args, **kwargs).result()
+
+    return wrapper
+
+
+def writer_stats():
+    writers = list(_writers.values())
+    return {"batches": sum(w.batches for w in writers), "calls": sum(w.calls for w in writers),
+            "writers": len(writers)}
+
+
+def shutdown():
+    """Flush pending writes and stop the writer threads (they are restarted on the next write)."""
+    with _writer_lock:
+        writers = list(_writers.values())
+        _writers.clear()
+    for writer in writers:
+        writer.stop()
+
+
+atexit.register(shutdown)
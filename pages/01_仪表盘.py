@@ -1,20 +1,14 @@
 import math
 import streamlit as st
-import sqlite3
-import pandas as pd
-import matplotlib.pyplot as plt
-import matplotlib.ticker as ticker
-from db.db import get_conn, init_db
+from db.repository import get_repository
+from ui.charts import heatmap_chart, palette, pie_chart
+from ui.paging import keyset_pager
+from ui.perf_panel import perf_panel
 
-import matplotlib.pyplot as plt
-from matplotlib import rcParams
-
-# 设置中文字体，避免乱码
-rcParams['font.sans-serif'] = ['Arial Unicode MS']  # Mac 系统，保证字体存在
-# rcParams['font.sans-serif'] = ['SimHei']     # Windows 系统
-rcParams['axes.unicode_minus'] = False  # 解决负号显示问题
+WISH_PAGE_SIZE = 20   # 心愿表格与列表每页行数
 
 st.set_page_config(page_title="心愿Flow - 仪表盘", layout="wide")
+perf_panel("仪表盘")
 st.title("🌊 心愿Flow 仪表盘")
 
 # 登录/会话校验，避免未设置 user_id 时报错
@@ -23,80 +17,15 @@ if "user_id" not in st.session_state or not st.session_state["user_id"]:
     st.stop()
 
 # -------------------------------
-# 获取资金池数据
+# 获取仪表盘数据：一次读事务取全部数据，各组件展示同一时刻的快照
 # -------------------------------
-
-
-def get_pool_data():
-    """返回 (total_pool, attendance_sum, habit_sum)。\n    兼容旧库：如果列不存在会自动重建一次后重试。"""
-    user_id = st.session_state["user_id"]
-
-    def safe_sum(conn, sql, params=()):
-        try:
-            row = conn.execute(sql, params).fetchone()
-            return (row[0] or 0) if row is not None else 0
-        except sqlite3.OperationalError:
-            # 可能是旧库结构；强制重建一次再重试
-            init_db(force_rebuild=True)
-            with get_conn() as c2:
-                r2 = c2.execute(sql, params).fetchone()
-                return (r2[0] or 0) if r2 is not None else 0
-
-    conn = get_conn()
-    attendance_sum = safe_sum(
-        conn,
-        "SELECT COALESCE(SUM(earned_amount), 0) FROM attendance WHERE user_id = ?",
-        (user_id,),
-    )
-    habit_sum = safe_sum(
-        conn,
-        "SELECT COALESCE(SUM(reward_amount), 0) FROM habit_checkin WHERE user_id = ?",
-        (user_id,),
-    )
-    used = safe_sum(
-        conn,
-        "SELECT COALESCE(SUM(target_amount), 0) FROM wishlist WHERE status = 1 AND user_id = ?",
-        (user_id,),
-    )
-    conn.close()
-
-    total = attendance_sum + habit_sum - used
-    return total, attendance_sum, habit_sum
-
-
-def get_wishlist():
-    conn = get_conn()
-    df = pd.read_sql(
-        "SELECT * FROM wishlist WHERE user_id = ? ORDER BY status ASC, priority ASC, id DESC", conn, params=(st.session_state["user_id"],))
-    conn.close()
-    # 兼容旧库：若没有 status 列，则从旧的 unlocked 列推断；再不行则默认未解锁(0)
-    if 'status' not in df.columns:
-        if 'unlocked' in df.columns:
-            # 将 unlocked 布尔/0-1 映射为 0/1 的 status（0=未解锁，1=已解锁）
-            df['status'] = df['unlocked'].apply(lambda v: 1 if bool(v) else 0)
-        else:
-            df['status'] = 0
-    return df
-
-
-def get_monthly_data():
-    conn = get_conn()
-    attendance_df = pd.read_sql(
-        "SELECT strftime('%Y-%m', date) as month, COALESCE(SUM(earned_amount), 0) as attendance_amount FROM attendance WHERE user_id = ? GROUP BY month ORDER BY month", conn, params=(st.session_state["user_id"],))
-    habit_df = pd.read_sql(
-        "SELECT strftime('%Y-%m', date) as month, COALESCE(SUM(reward_amount), 0) as habit_amount FROM habit_checkin WHERE user_id = ? GROUP BY month ORDER BY month", conn, params=(st.session_state["user_id"],))
-    conn.close()
-    # Merge on month
-    df = pd.merge(attendance_df, habit_df, on='month', how='outer').fillna(0)
-    df['total'] = df['attendance_amount'] + df['habit_amount']
-    df = df.sort_values('month')
-    return df
-
+repo = get_repository()
+snapshot = repo.load_dashboard(st.session_state["user_id"])
 
 # -------------------------------
 # 资金池展示
 # -------------------------------
-total, attendance_sum, habit_sum = get_pool_data()
+total, attendance_sum, habit_sum = snapshot.balance, snapshot.attendance_total, snapshot.habit_total
 
 col1, col2, col3 = st.columns(3)
 col1.metric("资金池余额（模拟累计）", f"¥ {total:,.0f}")
@@ -114,97 +43,34 @@ values = [attendance_sum, habit_sum]
 if sum(values) == 0 or any(math.isnan(v) for v in values):
     st.info("暂无数据，打卡后这里会显示资金来源占比。")
 else:
-    fig, ax = plt.subplots(figsize=(6, 6))
-    colors = ["#A7C7E7", "#F4A7B9"]  # 低饱和度蓝、粉
-
-    def make_autopct(values):
-        def _fmt(pct):
-            total = sum(values)
-            val = int(round(pct * total / 100.0))
-            return f"{pct:.1f}%\n(¥{val:,.0f})" if val > 0 else ""
-        return _fmt
-
-    wedges, _texts, autotexts = ax.pie(
-        values,
-        labels=None,                 # 不在扇区上放标签，减少重叠
-        autopct=make_autopct(values),
-        startangle=90,
-        colors=colors,
-        pctdistance=0.68,
-        wedgeprops=dict(edgecolor='w', linewidth=1)
-    )
-    ax.axis("equal")
-    ax.set_title("资金来源占比", fontsize=18)
-
-    # 将来源与金额放到图例，避免文本重叠
-    legend_labels = [f"{s} (¥{v:,.0f})" for s, v in zip(sources, values)]
-    ax.legend(wedges, legend_labels, title="来源",
-              loc="center left", bbox_to_anchor=(1, 0.5))
-
-    plt.tight_layout()
-    st.pyplot(fig)
+    # 图片按金额缓存，金额不变时重跑页面不再重新绘图
+    st.image(pie_chart(tuple(round(v, 2) for v in values), tuple(sources),
+                       ("#A7C7E7", "#F4A7B9"),  # 低饱和度蓝、粉
+                       "资金来源占比", legend_title="来源"))
 
 # -------------------------------
 # 高级可视化选项
 # -------------------------------
 with st.expander("查看习惯打卡资金详情"):
-    conn = get_conn()
-    query = """
-        SELECT ht.title, COALESCE(SUM(hc.reward_amount), 0) as total_reward
-        FROM habit_checkin hc
-        JOIN habit_task ht ON hc.task_id = ht.id
-        WHERE hc.user_id = ?
-        GROUP BY ht.title
-        HAVING total_reward > 0
-        ORDER BY total_reward DESC
-    """
-    df_habit = pd.read_sql(query, conn, params=(st.session_state["user_id"],))
-    conn.close()
+    df_habit = snapshot.habit_breakdown
     if not df_habit.empty:
         st.subheader("具体的习惯每日打卡心愿资金来源")
-        fig2, ax2 = plt.subplots(figsize=(6, 6))
-        labels = df_habit["title"].tolist()
-        rewards = df_habit["total_reward"].tolist()
-        pastel_colors = plt.cm.Pastel1.colors if len(
-            labels) <= 9 else plt.cm.tab20.colors
-
-        def make_autopct2(values):
-            def my_autopct2(pct):
-                total = sum(values)
-                val = int(round(pct * total / 100.0))
-                return "{:.1f}%\n(¥{:,.0f})".format(pct, val)
-            return my_autopct2
-        wedges2, texts2, autotexts2 = ax2.pie(
-            rewards,
-            labels=labels,
-            autopct=make_autopct2(rewards),
-            startangle=90,
-            colors=pastel_colors,
-            labeldistance=1.08,
-            pctdistance=0.75,
-            wedgeprops=dict(edgecolor='w', linewidth=1)
-        )
-        ax2.axis("equal")
-        ax2.set_title("习惯打卡奖励分布", fontsize=14)
-        plt.setp(texts2, size=13, weight="bold")
-        plt.setp(autotexts2, size=12, color="dimgrey", weight="bold")
-        plt.tight_layout()
-        st.pyplot(fig2)
+        labels = tuple(df_habit["title"].tolist())
+        rewards = tuple(round(v, 2) for v in df_habit["total_reward"].tolist())
+        colors = palette("Pastel1" if len(labels) <= 9 else "tab20", len(labels))
+        st.image(pie_chart(rewards, labels, colors, "习惯打卡奖励分布"))
 
 # -------------------------------
 # 月度资金来源统计
 # -------------------------------
 st.subheader("月度资金来源统计")
-monthly_df = get_monthly_data()
+monthly_df = snapshot.monthly
 with st.expander("查看月度资金来源统计"):
     if monthly_df.empty:
         st.info("暂无月度数据。")
     else:
-        monthly_df = monthly_df.drop_duplicates(subset=['month'])
-        monthly_chart_df = monthly_df.set_index(
-            'month')[['attendance_amount', 'habit_amount', 'total']]
+        monthly_chart_df = monthly_df[['attendance_amount', 'habit_amount', 'total']]
         monthly_chart_df.columns = ['考勤', '习惯打卡', '总计']
-        monthly_chart_df = monthly_chart_df.sort_index(ascending=True)
 
         st.line_chart(monthly_chart_df)
 
@@ -213,70 +79,106 @@ with st.expander("查看月度资金来源统计"):
 # -------------------------------
 st.subheader("每日累计趋势")
 with st.expander("查看每日累计趋势"):
-    conn = get_conn()
-    attendance_daily_df = pd.read_sql(
-        "SELECT strftime('%Y-%m-%d', date) as day, COALESCE(SUM(earned_amount), 0) as attendance_amount FROM attendance WHERE user_id = ? GROUP BY day ORDER BY day", conn, params=(st.session_state["user_id"],))
-    habit_daily_df = pd.read_sql(
-        "SELECT strftime('%Y-%m-%d', date) as day, COALESCE(SUM(reward_amount), 0) as habit_amount FROM habit_checkin WHERE user_id = ? GROUP BY day ORDER BY day", conn, params=(st.session_state["user_id"],))
-    conn.close()
-    daily_df = pd.merge(attendance_daily_df, habit_daily_df,
-                        on='day', how='outer').fillna(0)
-    daily_df = daily_df.sort_values('day')
-    daily_df['total'] = daily_df['attendance_amount'] + \
-        daily_df['habit_amount']
-    daily_df = daily_df.set_index('day')
-    daily_df.index.name = '日期'
-    daily_df = daily_df.sort_index(ascending=True)
+    # 缓存结果只读，改名时返回新对象
+    daily_df = snapshot.daily.rename_axis('日期')
 
     st.line_chart(daily_df[['attendance_amount', 'habit_amount', 'total']])
 
+# -------------------------------
+# 打卡日历热力图
+# -------------------------------
+st.subheader("打卡日历")
+with st.expander("查看打卡日历热力图"):
+    # 每年一行、每天一列；按来源或单个收入来源/习惯筛选
+    heatmap_sources = {"all": ("全部", None, None), "attendance": ("考勤", "attendance", None),
+                       "habit": ("习惯打卡", "habit", None)}
+    heatmap_sources.update({f"attendance_{i.id}": (f"考勤 · {i.title}", "attendance", i.id)
+                            for i in repo.list_income(snapshot.user_id)})
+    heatmap_sources.update({f"habit_{t.id}": (f"习惯 · {t.title}", "habit", t.id)
+                            for t in repo.list_habit_tasks(snapshot.user_id)})
+    col1, col2 = st.columns([3, 1])
+    source_label, kind, item_id = heatmap_sources[col1.selectbox(
+        "来源", list(heatmap_sources), format_func=lambda key: heatmap_sources[key][0], key="heatmap_source")]
+    measure = col2.radio("数值", ["金额", "次数"], horizontal=True, key="heatmap_measure")
+    heatmap = repo.calendar_heatmap(snapshot.user_id, kind, item_id)
+    if not len(heatmap.years):
+        st.info("暂无打卡数据。")
+    else:
+        matrix = heatmap.amounts if measure == "金额" else heatmap.counts
+        st.image(heatmap_chart(tuple(map(tuple, matrix.tolist())), tuple(heatmap.years.tolist()),
+                               f"{source_label} 打卡日历", "金额（¥）" if measure == "金额" else "打卡次数"))
+
 # -------------------------------
 # 心愿单进度
 # -------------------------------
 st.subheader("心愿单进度")
-wishlist = get_wishlist()
+wish_counts = snapshot.wish_counts
 
-if wishlist.empty:
+if not wish_counts:
     st.info("还没有心愿，快去添加一个吧！")
 else:
-    unfinished = wishlist[wishlist['status'] == 0]
-    unlocked = wishlist[wishlist['status'] == 1]
-    finished = wishlist[wishlist['status'] == 2]
-
     st.markdown("### 未完成心愿")
-    if unfinished.empty:
+    if not wish_counts.get(0):
         st.info("暂无未完成的心愿。")
     else:
-        remaining_balance = total
-        for _, row in unfinished.iterrows():
-            title = row["title"]
-            target = row["target_amount"]
-            progress = min(remaining_balance / target,
-                           1.0) if target > 0 else 0
-            st.write(f"**{title}** （目标：¥{target:,.0f}）")
-            st.progress(progress)
-            if remaining_balance >= target:
-                st.info("即将解锁！")
-                remaining_balance -= target
-            else:
-                st.caption(f"还差 ¥ {target - remaining_balance:,.0f}")
+        # 按优先级一次性向量化分配余额，只渲染当前页，心愿再多渲染开销也不变
+        progress_df = snapshot.progress
+        page_count = max(1, math.ceil(len(progress_df) / WISH_PAGE_SIZE))
+        page = st.number_input(f"页码（共 {page_count} 页）", min_value=1, max_value=page_count, value=1,
+                               step=1, key="wish_progress_page") if page_count > 1 else 1
+        shown = progress_df.iloc[(page - 1) * WISH_PAGE_SIZE:page * WISH_PAGE_SIZE]
+        st.dataframe(
+            shown[["title", "target_amount", "progress", "shortfall"]]
+            .assign(status=shown["unlockable"].map({True: "即将解锁！", False: ""}))
+            .rename(columns={"title": "心愿", "target_amount": "目标金额", "progress": "进度",
+                             "shortfall": "还差", "status": "状态"}),
+            hide_index=True,
+            column_config={
+                "目标金额": st.column_config.NumberColumn(format="¥ %.0f"),
+                "进度": st.column_config.ProgressColumn(min_value=0.0, max_value=1.0, format="percent"),
+                "还差": st.column_config.NumberColumn(format="¥ %.0f"),
+            },
+        )
 
+        with st.expander("📅 预计解锁时间"):
+            from db.forecast import WINDOW_DAYS
+
+            simulate = st.checkbox("蒙特卡洛模拟（10000 次，给出 P50/P90 日期）", key="forecast_simulate")
+            forecast, rates = repo.forecast_unlocks(st.session_state["user_id"], n_sims=10_000 if simulate else 0)
+            st.caption(f"按最近 {WINDOW_DAYS} 天（越近权重越高）估算：考勤约 ¥{rates['attendance']:,.1f}/天，"
+                       f"习惯打卡约 ¥{rates['habit']:,.1f}/天；按优先级依次解锁。")
+            columns = {"title": "心愿", "target_amount": "目标金额", "expected_date": "预计解锁"}
+            if simulate:
+                columns.update(p50_date="P50", p90_date="P90")
+            st.dataframe(
+                forecast[list(columns)].rename(columns=columns),
+                hide_index=True,
+                column_config={name: st.column_config.DateColumn(name, format="YYYY-MM-DD")
+                               for key, name in columns.items() if key.endswith("_date")},
+            )
+            st.caption("空白表示按目前的打卡速度无法预计解锁时间。")
+
+    # 已解锁、已完成的心愿不在快照里，按游标分页读取，每页一次索引查询
     st.markdown("### 已解锁心愿（待完成）")
-    if unlocked.empty:
+    if not wish_counts.get(1):
         st.info("暂无已解锁但未完成的心愿。")
     else:
-        for _, row in unlocked.iterrows():
-            title = row["title"]
-            target = row["target_amount"]
+        unlocked = keyset_pager("dashboard_unlocked_cursors", lambda cursor: repo.list_wishes_page(
+            snapshot.user_id, (1,), cursor, WISH_PAGE_SIZE))
+        for row in unlocked.rows:
+            title = row.title
+            target = row.target_amount
             st.write(f"**{title}** （目标：¥{target:,.0f}）")
             st.progress(1.0)
             st.info("已解锁，等待完成！")
 
     st.markdown("### 已完成心愿")
-    if finished.empty:
+    if not wish_counts.get(2):
         st.info("暂无已完成的心愿。")
     else:
-        for _, row in finished.iterrows():
-            title = row["title"]
-            target = row["target_amount"]
+        finished = keyset_pager("dashboard_finished_cursors", lambda cursor: repo.list_wishes_page(
+            snapshot.user_id, (2,), cursor, WISH_PAGE_SIZE))
+        for row in finished.rows:
+            title = row.title
+            target = row.target_amount
             st.success(f"✅ {title} 已完成！（目标：¥{target:,.0f}）")
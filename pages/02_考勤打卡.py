@@ -1,7 +1,12 @@
 import streamlit as st
-from db.db import get_conn
+from db.repository import get_repository
+from ui.paging import keyset_pager
+from ui.perf_panel import perf_panel
+from ui.tables import markdown_table
 import datetime
 
+perf_panel("考勤打卡")
+
 # 登录/会话校验，避免未登录时 KeyError
 if "user_id" not in st.session_state or not st.session_state["user_id"]:
     st.info("请先在首页登录后再使用考勤打卡。")
@@ -11,23 +16,22 @@ st.caption(f"当前用户: {st.session_state['user_id']}")
 st.title("🗓️ 考勤打卡")
 
 user_id = st.session_state["user_id"]
+repo = get_repository()
 
 # ------------------------
 # 收入来源管理（内嵌表单）
 # ------------------------
 st.subheader("收入来源配置")
 
-conn = get_conn()
-rows = conn.execute(
-    "SELECT id, title, daily_amount FROM income WHERE user_id = ? ORDER BY id DESC",
-    (user_id,)
-).fetchall()
-conn.close()
+rows = repo.list_income(user_id)   # models.Income(id, title, daily_amount)
+
+
+def income_label(income):
+    return f"{income.title} (¥{income.daily_amount:.0f}/天)"
 
-options = [(r[0], r[1], r[2]) for r in rows]  # (id, title, daily_amount)
 
 if rows:
-    st.table(rows)
+    markdown_table(["ID", "收入名称", "日薪"], rows, {"日薪": "¥{:,.2f}"})
 
     with st.expander("添加新的收入来源"):
         with st.form("income_form_add"):
@@ -35,57 +39,38 @@ if rows:
             daily_amount = st.number_input("每日金额", min_value=0.0, step=10.0)
             submitted = st.form_submit_button("添加收入来源")
             if submitted and title.strip():
-                conn = get_conn()
-                conn.execute(
-                    "INSERT INTO income (title, daily_amount, user_id) VALUES (?, ?, ?)",
-                    (title, daily_amount, user_id)
-                )
-                conn.commit()
-                conn.close()
+                repo.add_income(title, daily_amount, user_id)
                 st.success(f"收入来源【{title}】已添加")
                 st.rerun()
 
     with st.expander("编辑现有收入来源"):
         sel = st.selectbox(
             "选择要编辑的收入来源",
-            options,
-            format_func=lambda t: f"{t[1]} (¥{t[2]:.0f}/天)",
+            rows,
+            format_func=income_label,
             key="income_edit_select",
         )
         if sel:
-            id_, old_title, old_amount = sel
             with st.form("income_form_edit"):
-                new_title = st.text_input("收入名称", value=old_title)
+                new_title = st.text_input("收入名称", value=sel.title)
                 new_amount = st.number_input(
-                    "每日金额", min_value=0.0, step=10.0, value=float(old_amount))
+                    "每日金额", min_value=0.0, step=10.0, value=float(sel.daily_amount))
                 submitted_edit = st.form_submit_button("保存修改")
                 if submitted_edit and new_title.strip():
-                    conn = get_conn()
-                    conn.execute(
-                        "UPDATE income SET title = ?, daily_amount = ? WHERE id = ? AND user_id = ?",
-                        (new_title, new_amount, id_, user_id)
-                    )
-                    conn.commit()
-                    conn.close()
+                    repo.update_income(sel.id, new_title, new_amount, user_id)
                     st.success(f"收入来源【{new_title}】已更新")
                     st.rerun()
 
     with st.expander("删除收入来源"):
         delete_id = st.selectbox(
             "选择要删除的收入来源",
-            options,
-            format_func=lambda t: f"{t[1]} (¥{t[2]:.0f}/天)",
+            rows,
+            format_func=income_label,
             key="delete_income_select",
         )
         if st.button("删除收入来源"):
-            conn = get_conn()
-            conn.execute(
-                "DELETE FROM income WHERE id = ? AND user_id = ?",
-                (delete_id[0], user_id)
-            )
-            conn.commit()
-            conn.close()
-            st.success(f"收入来源【{delete_id[1]}】已删除")
+            repo.delete_income(delete_id.id, user_id)
+            st.success(f"收入来源【{delete_id.title}】已删除")
             st.rerun()
 else:
     with st.form("income_form"):
@@ -94,13 +79,7 @@ else:
         submitted = st.form_submit_button("添加收入来源")
 
         if submitted and title.strip():
-            conn = get_conn()
-            conn.execute(
-                "INSERT INTO income (title, daily_amount, user_id) VALUES (?, ?, ?)",
-                (title, daily_amount, user_id)
-            )
-            conn.commit()
-            conn.close()
+            repo.add_income(title, daily_amount, user_id)
             st.success(f"收入来源【{title}】已添加")
             st.rerun()
 
@@ -111,51 +90,68 @@ st.subheader("今日打卡")
 if rows:
     selected = st.selectbox(
         "选择收入来源",
-        options,
-        format_func=lambda t: f"{t[1]} (¥{t[2]:.0f}/天)",
+        rows,
+        format_func=income_label,
         key="checkin_income_select",
     )
     today = datetime.date.today()
     selected_date = st.date_input("选择打卡日期", value=today)
     if st.button("立即打卡"):
-        income_id, title, daily_amount = selected
-        conn = get_conn()
-        existing = conn.execute(
-            "SELECT 1 FROM attendance WHERE income_id = ? AND date = ? AND user_id = ?",
-            (income_id, selected_date.isoformat(), user_id)
-        ).fetchone()
-        if existing:
-            if selected_date == today:
-                st.info("今日已完成打卡")
-            else:
-                st.info("该日期已打卡")
+        # 唯一索引 (user_id, income_id, date) 负责去重，无需先查询
+        if repo.add_attendance(selected.id, selected_date.isoformat(), selected.daily_amount, user_id):
+            st.success(f"打卡成功！已获得 ¥{selected.daily_amount:.0f} 来自【{selected.title}】")
+        elif selected_date == today:
+            st.info("今日已完成打卡")
         else:
-            conn.execute(
-                "INSERT INTO attendance (income_id, date, earned_amount, user_id) VALUES (?,?,?,?)",
-                (income_id, selected_date.isoformat(), daily_amount, user_id)
-            )
-            conn.commit()
-            st.success(f"打卡成功！已获得 ¥{daily_amount:.0f} 来自【{title}】")
-        conn.close()
+            st.info("该日期已打卡")
+
+    with st.expander("批量补打卡"):
+        fill_income = st.selectbox(
+            "选择收入来源",
+            rows,
+            format_func=income_label,
+            key="backfill_income_select",
+        )
+        fill_range = st.date_input(
+            "选择日期范围", value=(today - datetime.timedelta(days=6), today), key="backfill_range")
+        weekday_names = ["周一", "周二", "周三", "周四", "周五", "周六", "周日"]
+        fill_weekdays = st.multiselect(
+            "仅在以下星期打卡", list(range(7)), default=list(range(5)),
+            format_func=lambda d: weekday_names[d], key="backfill_weekdays")
+        if st.button("批量打卡"):
+            if len(fill_range) != 2:
+                st.warning("请选择起止日期")
+            else:
+                result = repo.add_attendance_range(
+                    user_id, fill_income.id, fill_range[0], fill_range[1], weekdays=fill_weekdays)
+                st.success(
+                    f"已补打卡 {result['inserted']} 天，跳过 {result['skipped']} 天（已打卡）")
 
     with st.expander("删除打卡记录"):
         del_income = st.selectbox(
             "选择收入来源",
-            options,
-            format_func=lambda t: f"{t[1]} (¥{t[2]:.0f}/天)",
+            rows,
+            format_func=income_label,
             key="del_attendance_income_select",
         )
         del_date = st.date_input(
             "选择打卡日期", value=today, key="del_attendance_date")
         if st.button("删除打卡记录"):
-            conn = get_conn()
-            conn.execute(
-                "DELETE FROM attendance WHERE income_id = ? AND date = ? AND user_id = ?",
-                (del_income[0], del_date.isoformat(), user_id)
-            )
-            conn.commit()
-            conn.close()
-            st.success(f"已删除 {del_date} 来自【{del_income[1]}】的打卡记录")
+            repo.delete_attendance(del_income.id, del_date.isoformat(), user_id)
+            st.success(f"已删除 {del_date} 来自【{del_income.title}】的打卡记录")
             st.rerun()
 else:
     st.warning("请先配置至少一个收入来源。")
+
+# ------------------------
+# 打卡记录：按日期倒序分页浏览，每页一次索引查询
+# ------------------------
+with st.expander("📜 打卡记录"):
+    history = keyset_pager("attendance_history",
+                           lambda cursor: repo.list_checkins_page(user_id, "attendance", cursor))
+    if history.rows:
+        markdown_table(["日期", "收入来源", "金额"],
+                       [(c.date, c.title or "（已删除）", c.earned_amount) for c in history.rows],
+                       {"金额": "¥{:,.2f}"})
+    else:
+        st.caption("暂无打卡记录。")
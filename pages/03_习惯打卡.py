@@ -1,7 +1,12 @@
 import streamlit as st
-from db.db import get_conn
+from db.repository import get_repository
 from datetime import date
+from db.streaks import NO_STATS
+from ui.paging import keyset_pager
+from ui.perf_panel import perf_panel
+from ui.tables import markdown_table
 
+perf_panel("习惯打卡")
 st.title("💪 习惯打卡")
 st.caption(f"当前用户: {st.session_state['user_id']}")
 
@@ -9,15 +14,12 @@ st.caption(f"当前用户: {st.session_state['user_id']}")
 # 获取当前用户ID
 # ------------------------
 user_id = st.session_state["user_id"]
+repo = get_repository()
 
 # ------------------------
 # 读取习惯任务
 # ------------------------
-conn = get_conn()
-rows = conn.execute(
-    "SELECT id, title, reward_amount FROM habit_task WHERE user_id = ?", (
-        user_id,)
-).fetchall()
+rows = repo.list_habit_tasks(user_id)   # models.HabitTask(id, title, reward_amount)
 
 # ------------------------
 # 习惯任务展示与管理
@@ -29,20 +31,19 @@ if not rows:
         reward_amount = st.number_input("奖励金额", min_value=1.0, step=1.0)
         submitted = st.form_submit_button("添加习惯")
         if submitted and habit_title.strip():
-            conn.execute(
-                "INSERT INTO habit_task (title, reward_amount, user_id) VALUES (?, ?, ?)",
-                (habit_title, reward_amount, user_id)
-            )
-            conn.commit()
-            conn.close()
+            repo.add_habit_task(habit_title, reward_amount, user_id)
             st.success(f"习惯任务【{habit_title}】已添加")
             st.rerun()
 else:
     # 展示习惯任务表格
     st.subheader("习惯任务列表")
-    import pandas as pd
-    df = pd.DataFrame(rows, columns=["ID", "习惯名称", "奖励金额"])
-    st.table(df[["习惯名称", "奖励金额"]])
+    # 连续天数与完成率：首次按索引顺序读一次全部打卡，之后打卡/删除只增量修补对应习惯
+    habit_stats = repo.habit_stats(user_id, date.today())
+    markdown_table(
+        ["习惯名称", "奖励金额", "当前连续", "最长连续", "近7天", "近30天", "近365天"],
+        [(title, reward, *habit_stats.get(task_id, NO_STATS)) for task_id, title, reward in rows],
+        {"奖励金额": "¥{:,.2f}", "当前连续": "{} 天", "最长连续": "{} 天",
+         "近7天": "{:.0%}", "近30天": "{:.0%}", "近365天": "{:.0%}"})
 
     # 添加新习惯任务
     with st.expander("➕ 添加新的习惯任务"):
@@ -53,11 +54,7 @@ else:
                 "奖励金额", min_value=1.0, step=1.0, key="add_reward_amount")
             submitted = st.form_submit_button("添加习惯")
             if submitted and habit_title.strip():
-                conn.execute(
-                    "INSERT INTO habit_task (title, reward_amount, user_id) VALUES (?, ?, ?)",
-                    (habit_title, reward_amount, user_id)
-                )
-                conn.commit()
+                repo.add_habit_task(habit_title, reward_amount, user_id)
                 st.success(f"习惯任务【{habit_title}】已添加")
                 st.rerun()
 
@@ -75,21 +72,13 @@ else:
         with col1:
             if st.button("保存修改"):
                 if new_title.strip():
-                    conn.execute(
-                        "UPDATE habit_task SET title=?, reward_amount=? WHERE id=? AND user_id=?",
-                        (new_title, new_reward, selected_id, user_id)
-                    )
-                    conn.commit()
+                    repo.update_habit_task(selected_id, new_title, new_reward, user_id)
                     st.success("修改已保存")
                     st.rerun()
         with col2:
             if st.button("删除习惯", type="secondary"):
                 # 仅删除习惯任务，不删除 habit_checkin 表中的历史记录
-                conn.execute(
-                    "DELETE FROM habit_task WHERE id=? AND user_id=?",
-                    (selected_id, user_id)
-                )
-                conn.commit()
+                repo.delete_habit_task(selected_id, user_id)
                 st.warning(f"已删除习惯【{selected_title}】")
                 st.rerun()
 
@@ -97,42 +86,65 @@ else:
     # 习惯打卡
     # ------------------------
     st.subheader("完成习惯打卡")
+    if "checkin_message" in st.session_state:
+        st.success(st.session_state.pop("checkin_message"))
     selected_date = st.date_input("选择打卡日期", value=date.today())
+    day = selected_date.isoformat()
+    # 一次查询取当日打卡：既决定各习惯的完成状态，也用于下方的当日记录
+    day_checkins = repo.list_habit_checkins(user_id, day)
+    done = {checkin.task_id for checkin in day_checkins}
+    pending = {task_id: (title, reward_amount) for task_id, title, reward_amount in rows if task_id not in done}
+    st.caption(f"已完成 {len(rows) - len(pending)}/{len(rows)} 个习惯")
     for task_id, title, reward_amount in rows:
-        st.write(f"{title} (奖励 ¥{reward_amount:.0f})")
-        if st.button(f"完成打卡 - {title}", key=f"checkin_{task_id}"):
-            # Check if already checked in for the selected date
-            existing = conn.execute(
-                "SELECT 1 FROM habit_checkin WHERE task_id = ? AND date = ? AND user_id = ?",
-                (task_id, selected_date.isoformat(), user_id)
-            ).fetchone()
-            if existing:
-                st.info("该日期已完成打卡")
-            else:
-                conn.execute(
-                    "INSERT INTO habit_checkin (task_id, date, reward_amount, user_id) VALUES (?, ?, ?, ?)",
-                    (task_id, selected_date.isoformat(), reward_amount, user_id)
-                )
-                conn.commit()
-                st.success(f"打卡成功！完成【{title}】，奖励 ¥{reward_amount:.0f}")
+        col1, col2 = st.columns([3, 1])
+        if task_id in done:
+            col1.write(f"✅ {title} (奖励 ¥{reward_amount:.0f})")
+            col2.caption("已完成")
+        else:
+            col1.write(f"⬜ {title} (奖励 ¥{reward_amount:.0f})")
+            if col2.button(f"完成打卡 - {title}", key=f"checkin_{task_id}"):
+                # 唯一索引 (user_id, task_id, date) 负责去重，无需先查询
+                if not repo.add_habit_checkin(task_id, day, reward_amount, user_id):
+                    st.info("该日期已完成打卡")
+                else:
+                    # 重新运行页面，让完成状态、连续天数与完成率包含这次打卡
+                    st.session_state["checkin_message"] = f"打卡成功！完成【{title}】，奖励 ¥{reward_amount:.0f}"
+                    st.rerun()
+
+    if pending:
+        # 批量打卡：所选习惯在同一个写事务中一次写入，只需一次重跑
+        with st.form("batch_checkin"):
+            chosen = st.multiselect("选择要一起打卡的习惯", list(pending), default=list(pending),
+                                    format_func=lambda task_id: pending[task_id][0])
+            if st.form_submit_button("一键打卡 ✅") and chosen:
+                result = repo.add_habit_checkins(user_id, chosen, [day])
+                message = f"打卡成功！完成 {result['inserted']} 个习惯"
+                if result["skipped"]:
+                    # 其它会话刚打过卡或删除了习惯
+                    message += f"，{result['skipped']} 个已跳过"
+                st.session_state["checkin_message"] = message
+                st.rerun()
+    else:
+        st.success("该日期的习惯已全部完成 🎉")
 
     # ------------------------
     # 当日打卡记录
     # ------------------------
     st.subheader("当日打卡记录")
-    checkins = conn.execute(
-        "SELECT hc.id, ht.title, hc.reward_amount FROM habit_checkin hc "
-        "JOIN habit_task ht ON hc.task_id = ht.id "
-        "WHERE hc.date = ? AND hc.user_id = ?",
-        (selected_date.isoformat(), user_id)
-    ).fetchall()
-    for checkin_id, title, reward_amount in checkins:
-        st.write(f"{title} (奖励 ¥{reward_amount:.0f})")
-        if st.button(f"删除打卡记录 - {title}", key=f"delete_checkin_{checkin_id}"):
-            conn.execute(
-                "DELETE FROM habit_checkin WHERE id = ? AND user_id = ?",
-                (checkin_id, user_id)
-            )
-            conn.commit()
+    for checkin in day_checkins:
+        st.write(f"{checkin.title} (奖励 ¥{checkin.reward_amount:.0f})")
+        if st.button(f"删除打卡记录 - {checkin.title}", key=f"delete_checkin_{checkin.id}"):
+            repo.delete_habit_checkin(checkin.id, user_id)
             st.rerun()
-conn.close()
+
+# ------------------------
+# 打卡记录：按日期倒序分页浏览，每页一次索引查询
+# ------------------------
+with st.expander("📜 打卡记录"):
+    history = keyset_pager("habit_history", lambda cursor: repo.list_checkins_page(user_id, "habit", cursor))
+    if history.rows:
+        markdown_table(["日期", "习惯", "奖励"],
+                       [(c.date, c.title or "（已删除）", c.reward_amount) for c in history.rows],
+                       {"奖励": "¥{:,.2f}"})
+    else:
+        st.caption("暂无打卡记录。")
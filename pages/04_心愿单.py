@@ -1,13 +1,19 @@
 import streamlit as st
-from db.db import get_conn
-from datetime import datetime
+from db.repository import get_repository
+from ui.paging import keyset_pager
+from ui.perf_panel import perf_panel
+from ui.tables import markdown_table
 
+WISH_PAGE_SIZE = 20   # 心愿列表每页条数
+
+perf_panel("心愿单")
 st.title("🌟 心愿单")
 # 登录/会话校验，避免未登录时报 KeyError
 if "user_id" not in st.session_state or not st.session_state["user_id"]:
     st.info("请先在首页登录后再使用心愿单。")
     st.stop()
 user_id = st.session_state["user_id"]
+repo = get_repository()
 st.caption(f"当前用户: {user_id}")
 
 # ------------------------
@@ -20,45 +26,56 @@ with st.form("wish_form"):
     submitted = st.form_submit_button("添加心愿")
 
     if submitted and title.strip():
-        conn = get_conn()
-        conn.execute(
-            "INSERT INTO wishlist (title, target_amount, priority, status, user_id) VALUES (?,?,?,?,?)",
-            (title, target_amount, priority, 0, user_id)
-        )
-        conn.commit()
-        conn.close()
+        repo.add_wish(title, target_amount, priority, user_id)
         st.success(f"心愿已添加：{title}")
 
 # ------------------------
 # 计算可用资金
 # ------------------------
-conn = get_conn()
-attendance_sum = conn.execute(
-    "SELECT COALESCE(SUM(earned_amount), 0) FROM attendance WHERE user_id = ?",
-    (user_id,)
-).fetchone()[0]
-
-habit_sum = conn.execute(
-    "SELECT COALESCE(SUM(reward_amount), 0) FROM habit_checkin WHERE user_id = ?",
-    (user_id,)
-).fetchone()[0]
-
-reserved = conn.execute(
-    "SELECT COALESCE(SUM(target_amount), 0) FROM wishlist WHERE status = 1 AND user_id = ?",
-    (user_id,)
-).fetchone()[0]
-
-available_funds = (attendance_sum or 0) + (habit_sum or 0) - (reserved or 0)
+# user_balance 汇总表由触发器维护，一次主键查询即可得到可用资金
+available_funds = repo.get_balance_summary(user_id)["balance"]
 
 # ------------------------
 # 展示心愿
 # ------------------------
 st.subheader("我的心愿列表")
-rows = conn.execute(
-    "SELECT id, title, target_amount, priority, status FROM wishlist WHERE status IN (0,1) AND user_id = ? ORDER BY priority ASC, id ASC",
-    (user_id,)
-).fetchall()
-conn.close()
+
+if "unlock_message" in st.session_state:
+    st.success(st.session_state.pop("unlock_message"))
+
+UNLOCK_STRATEGIES = {
+    "priority": "严格按优先级（遇到买不起的心愿即停止）",
+    "skip": "按优先级，跳过买不起的继续解锁",
+    "knapsack": "最优组合（优先级加权价值最大）",
+}
+
+# "skip" 策略的计划非空，说明至少有一个买得起的待解锁心愿
+affordable = repo.preview_unlock_plan(user_id, "skip")
+if affordable and affordable.wish_ids:
+    with st.expander("🔓 批量解锁", expanded=True):
+        strategy = st.selectbox(
+            "解锁策略", list(UNLOCK_STRATEGIES), format_func=UNLOCK_STRATEGIES.get, key="unlock_strategy")
+        # 先预览计划，确认后再在同一写事务内重新计算并应用，并发会话不会重复占用同一笔余额
+        plan = affordable if strategy == "skip" else repo.preview_unlock_plan(user_id, strategy)
+        if plan and plan.wish_ids:
+            titles = {w.id: (w.title, w.target_amount, w.priority) for w in repo.list_wishes_by_status(user_id, (0,))}
+            markdown_table(["心愿", "目标金额", "优先级"],
+                           [titles[wid] for wid in plan.wish_ids if wid in titles], {"目标金额": "¥{:,.0f}"})
+            st.caption(f"将解锁 {len(plan.wish_ids)} 个心愿，共 ¥{plan.total_cost:.2f}，"
+                       f"剩余 ¥{available_funds - plan.total_cost:.2f}"
+                       + ("" if plan.exact else "（心愿过多，已返回搜索上限内的最优方案）"))
+            if st.button("按计划解锁 🔓", key="unlock_all"):
+                unlocked_ids = repo.greedy_unlock(user_id, strategy)
+                st.session_state["unlock_message"] = (
+                    f"已解锁 {len(unlocked_ids)} 个心愿" if unlocked_ids else "当前余额不足以解锁心愿")
+                st.rerun()
+        else:
+            st.caption("按该策略当前没有可解锁的心愿。")
+
+# 待解锁在前、已解锁在后，各自按优先级排序；按游标分页，每页只查询并渲染一页
+wish_page = keyset_pager(
+    "wish_cursors", lambda cursor: repo.list_wishes_page(user_id, (0, 1), cursor, WISH_PAGE_SIZE))
+rows = wish_page.rows   # models.Wish(id, title, target_amount, priority, status)
 
 if rows:
     for wid, title, target, priority, status in rows:
@@ -70,13 +87,7 @@ if rows:
                     f"✅ {title} 已满足解锁条件！（目标 ¥{target:.0f}, 优先级 {priority}）")
             with col2:
                 if st.button("解锁心愿 🔓", key=f"unlock_{wid}"):
-                    conn = get_conn()
-                    conn.execute(
-                        "UPDATE wishlist SET status=1, unlocked_at=? WHERE id=? AND user_id=?",
-                        (datetime.now().isoformat(), wid, user_id)
-                    )
-                    conn.commit()
-                    conn.close()
+                    repo.unlock_wish(wid, user_id)
                     st.rerun()
         elif status == 1:
             col1, col2, col3 = st.columns([4, 1, 1])
@@ -85,13 +96,7 @@ if rows:
             with col2:
                 # Complete wish button (use st.rerun)
                 if st.button("完成心愿 ✅", key=f"complete_{wid}"):
-                    conn = get_conn()
-                    conn.execute(
-                        "UPDATE wishlist SET status=2 WHERE id=? AND user_id=?",
-                        (wid, user_id)
-                    )
-                    conn.commit()
-                    conn.close()
+                    repo.complete_wish(wid, user_id)
                     st.rerun()
             with col3:
                 if st.button("编辑", key=f"edit_btn_{wid}"):
@@ -108,14 +113,7 @@ if rows:
                     save = st.button("保存修改", key=f"save_{wid}")
                     cancel = st.button("取消", key=f"cancel_{wid}")
                     if save and edit_title.strip():
-                        conn = get_conn()
-                        conn.execute(
-                            "UPDATE wishlist SET title=?, target_amount=?, priority=? WHERE id=? AND user_id=?",
-                            (edit_title, edit_target, edit_priority,
-                             wid, user_id)
-                        )
-                        conn.commit()
-                        conn.close()
+                        repo.update_wish(wid, edit_title, edit_target, edit_priority, user_id)
                         st.session_state.pop(f"edit_mode_{wid}", None)
                         st.rerun()
                     if cancel:
@@ -139,14 +137,7 @@ if rows:
                     save = st.button("保存修改", key=f"save_{wid}")
                     cancel = st.button("取消", key=f"cancel_{wid}")
                     if save and edit_title.strip():
-                        conn = get_conn()
-                        conn.execute(
-                            "UPDATE wishlist SET title=?, target_amount=?, priority=? WHERE id=? AND user_id=?",
-                            (edit_title, edit_target, edit_priority,
-                             wid, user_id)
-                        )
-                        conn.commit()
-                        conn.close()
+                        repo.update_wish(wid, edit_title, edit_target, edit_priority, user_id)
                         st.session_state.pop(f"edit_mode_{wid}", None)
                         st.rerun()
                     if cancel:
@@ -159,15 +150,12 @@ else:
 # 已完成心愿
 # ------------------------
 st.subheader("已完成心愿")
-conn = get_conn()
-completed_rows = conn.execute(
-    "SELECT id, title, target_amount, priority FROM wishlist WHERE status=2 AND user_id = ? ORDER BY priority ASC, id ASC",
-    (user_id,)
-).fetchall()
-conn.close()
+completed_page = keyset_pager(
+    "completed_wish_cursors", lambda cursor: repo.list_wishes_page(user_id, (2,), cursor, WISH_PAGE_SIZE))
 
-if completed_rows:
-    for wid, title, target, priority in completed_rows:
+if completed_page.rows:
+    for wish in completed_page.rows:
+        title, target, priority = wish.title, wish.target_amount, wish.priority
         st.success(f"✅ {title} 已完成！（目标 ¥{target:.0f}, 优先级 {priority}）")
 else:
     st.caption("暂无已完成的心愿。")
@@ -0,0 +1,26 @@
+import random
+
+import pytest
+
+from db.planner import plan_unlock
+
+
+@pytest.mark.parametrize("targets, balance", [
+    ((0.1, 0.2), 0.3),
+    ((0.1, 0.2, 0.3), 0.6),
+])
+def test_skip_fits_float_sums(targets, balance):
+    wishes = [(i, target, 0) for i, target in enumerate(targets, 1)]
+    assert plan_unlock(wishes, balance, "priority").wish_ids == [w[0] for w in wishes]
+    assert plan_unlock(wishes, balance, "skip").wish_ids == [w[0] for w in wishes]
+
+
+def test_skip_extends_priority():
+    rng = random.Random(0)
+    for _ in range(500):
+        wishes = [(i, round(rng.uniform(0.01, 50), 2), rng.randint(0, 3)) for i in range(1, rng.randint(2, 30))]
+        wishes.sort(key=lambda w: (w[2], -w[0]))
+        # 余额恰好等于某个前缀的金额之和，最容易暴露浮点累加误差
+        balance = sum(w[1] for w in wishes[:rng.randint(0, len(wishes))])
+        strict = set(plan_unlock(wishes, balance, "priority").wish_ids)
+        assert strict <= set(plan_unlock(wishes, balance, "skip").wish_ids)
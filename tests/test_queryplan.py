@@ -0,0 +1,11 @@
+import sqlite3
+
+from db.migrations import migrate
+from db.queryplan import PAGE_QUERIES, check_page_queries
+
+
+def test_page_queries_use_an_index():
+    conn = sqlite3.connect(":memory:")
+    migrate(conn)
+    assert PAGE_QUERIES
+    assert check_page_queries(conn) == []
@@ -0,0 +1 @@
+"""Shared Streamlit rendering helpers for the pages."""
@@ -0,0 +1,144 @@
+"""
+Cached chart rendering.
+
+Charts are drawn on a bare matplotlib Figure (never registered with pyplot,
+so nothing outlives the call) and returned as PNG or SVG bytes. Results are
+memoised in an LRU keyed on the plotted values, so a rerun with unchanged
+data costs a dictionary lookup instead of a redraw. The CJK font is resolved
+once per process from the fonts actually installed.
+
+matplotlib is imported on first draw only.
+"""
+import functools
+import io
+
+CHART_CACHE_SIZE = 64
+# 按偏好排列的中文字体：macOS、Windows、Linux 常见字体
+CJK_FONTS = (
+    "PingFang SC", "Hiragino Sans GB", "Heiti SC", "Arial Unicode MS",
+    "Microsoft YaHei", "SimHei",
+    "Noto Sans CJK SC", "Noto Sans SC", "Source Han Sans SC", "WenQuanYi Zen Hei", "WenQuanYi Micro Hei",
+)
+
+
+@functools.lru_cache(maxsize=None)
+def resolve_cjk_font():
+    """First installed font from CJK_FONTS, or None. Looked up once per process."""
+    from matplotlib import font_manager
+
+    installed = {f.name for f in font_manager.fontManager.ttflist}
+    return next((name for name in CJK_FONTS if name in installed), None)
+
+
+def _new_figure(figsize):
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    return fig
+
+
+def _render(fig, fmt):
+    buf = io.BytesIO()
+    try:
+        fig.savefig(buf, format=fmt, bbox_inches="tight")
+    finally:
+        fig.clear()   # 立即释放 artists，不等垃圾回收
+    return buf.getvalue()
+
+
+def _rc():
+    """每次绘图使用的 rcParams：字体只解析一次，找不到中文字体时沿用默认字体"""
+    font = resolve_cjk_font()
+    rc = {"axes.unicode_minus": False}
+    if font:
+        rc["font.sans-serif"] = [font, "DejaVu Sans"]
+    return rc
+
+
+@functools.lru_cache(maxsize=CHART_CACHE_SIZE)
+def pie_chart(values, labels, colors, title, legend_title=None, fmt="png"):
+    """
+    Pie chart of values (tuples, so the call is hashable and cacheable) as
+    image bytes. With legend_title the labels go into a legend next to the
+    pie, otherwise they are drawn on the slices. Zero slices are unlabelled.
+    """
+    import matplotlib
+
+    total = sum(values)
+
+    def autopct(pct):
+        amount = int(round(pct * total / 100.0))
+        return f"{pct:.1f}%\n(¥{amount:,.0f})" if amount > 0 else ""
+
+    with matplotlib.rc_context(_rc()):
+        fig = _new_figure((6, 6))
+        ax = fig.add_subplot()
+        wedges, texts, autotexts = ax.pie(
+            values,
+            labels=None if legend_title else labels,
+            autopct=autopct,
+            startangle=90,
+            colors=colors,
+            labeldistance=1.08,
+            pctdistance=0.68 if legend_title else 0.75,
+            wedgeprops=dict(edgecolor="w", linewidth=1),
+        )
+        ax.axis("equal")
+        if legend_title:
+            # 将来源与金额放到图例，避免文本重叠
+            ax.set_title(title, fontsize=18)
+            ax.legend(wedges, [f"{label} (¥{value:,.0f})" for label, value in zip(labels, values)],
+                      title=legend_title, loc="center left", bbox_to_anchor=(1, 0.5))
+        else:
+            ax.set_title(title, fontsize=14)
+            for text in texts:
+                text.set(size=13, weight="bold")
+            for text in autotexts:
+                text.set(size=12, color="dimgrey", weight="bold")
+        return _render(fig, fmt)
+
+
+# 闰年日历中每月 1 日所在的列（与 db.analytics.heatmap_matrix 一致）
+MONTH_COLUMNS = (0, 31, 60, 91, 121, 152, 182, 213, 244, 274, 305, 335)
+
+
+@functools.lru_cache(maxsize=CHART_CACHE_SIZE)
+def heatmap_chart(rows, years, title, label, fmt="png"):
+    """
+    Calendar heatmap as image bytes: rows is one tuple of 366 day values per
+    year in years (db.analytics.heatmap_matrix columns); days without
+    activity are left blank.
+    """
+    import matplotlib
+    import numpy as np
+
+    matrix = np.asarray(rows, dtype=float)
+    values = np.ma.masked_equal(matrix, 0)
+    with matplotlib.rc_context(_rc()):
+        fig = _new_figure((12, 0.9 + 0.32 * len(years)))
+        ax = fig.add_subplot()
+        image = ax.imshow(values, aspect="auto", cmap="YlGn", interpolation="nearest",
+                          vmin=0, vmax=max(float(matrix.max(initial=0)), 1e-9))
+        ax.set_facecolor("#F2F2F2")
+        ax.set_xticks(MONTH_COLUMNS, [f"{month}月" for month in range(1, 13)])
+        ax.set_yticks(range(len(years)), [str(year) for year in years])
+        ax.tick_params(length=0)
+        for spine in ax.spines.values():
+            spine.set_visible(False)
+        ax.set_title(title, fontsize=14)
+        fig.colorbar(image, ax=ax, label=label, fraction=0.02, pad=0.01)
+        return _render(fig, fmt)
+
+
+def palette(name, count):
+    """Colours of a matplotlib qualitative colormap (e.g. Pastel1) for count slices, as a hashable tuple."""
+    import matplotlib
+
+    colors = matplotlib.colormaps[name].colors
+    return tuple(colors[i % len(colors)] for i in range(count))
+
+
+def chart_cache_info():
+    return pie_chart.cache_info()
@@ -0,0 +1,32 @@
+"""
+Keyset page navigation.
+
+keyset_pager(key, load) shows 上一页/下一页 buttons for a list read a page at
+a time with db.paging cursors. The cursors of the pages before the current
+one are kept in st.session_state[key], so moving either way is a single
+one-page query however far into the list the user is.
+"""
+import streamlit as st
+
+
+def keyset_pager(key, load):
+    """
+    Return the current db.paging.Page of the list stored under key, after
+    rendering its navigation; load(cursor) reads one page (None = the first).
+    """
+    cursors = st.session_state.setdefault(key, [None])
+    page = load(cursors[-1])
+    while not page.rows and len(cursors) > 1:
+        # 当前页的行已被删除或移走：退回上一页
+        cursors.pop()
+        page = load(cursors[-1])
+    if len(cursors) > 1 or page.next is not None:
+        prev_col, label_col, next_col = st.columns([1, 2, 1])
+        if prev_col.button("上一页", key=f"{key}_prev", disabled=len(cursors) == 1):
+            cursors.pop()
+            st.rerun()
+        label_col.caption(f"第 {len(cursors)} 页")
+        if next_col.button("下一页", key=f"{key}_next", disabled=page.next is None):
+            cursors.append(page.next)
+            st.rerun()
+    return page
@@ -0,0 +1,64 @@
+"""
+Sidebar performance panel.
+
+Each page calls perf_panel(name) near its top. When debugging is enabled
+(?debug=1 in the URL, remembered for the session, or WISHESFLOW_DEBUG=1 in
+the environment) it closes the session's previous rerun record, starts
+recording this one (db.instrument) and shows, per page, what the latest
+completed rerun cost: time until its last query, time in SQL, statements,
+pool checkouts, new connections and the slowest statements.
+
+A rerun is only known to be complete when the next one starts, so the panel
+always describes the previous rerun of each page.
+"""
+import os
+
+import streamlit as st
+from db import instrument
+
+HISTORY_PER_SESSION = 20
+
+
+def enabled():
+    if os.environ.get("WISHESFLOW_DEBUG") == "1":
+        return True
+    try:
+        if st.query_params.get("debug") == "1":
+            st.session_state["perf_debug"] = True
+        elif st.query_params.get("debug") == "0":
+            st.session_state.pop("perf_debug", None)
+    except Exception:
+        pass
+    return st.session_state.get("perf_debug", False)
+
+
+def perf_panel(page):
+    if not enabled():
+        return
+    history = st.session_state.setdefault("perf_runs", [])
+    previous = st.session_state.pop("perf_run", None)
+    if previous is not None:
+        history.append(instrument.finish_run(previous, at_last_activity=True))
+        del history[:-HISTORY_PER_SESSION]
+    st.session_state["perf_run"] = instrument.start_run(page)
+
+    latest = {}
+    for run in history:
+        latest[run.label] = run
+    with st.sidebar.expander("🛠️ 性能调试", expanded=True):
+        if not latest:
+            st.caption("再次运行页面后显示上一次重跑的统计。")
+            return
+        from ui.tables import markdown_table
+
+        st.caption("各页面最近一次完整重跑")
+        markdown_table(
+            ["页面", "至末条查询", "SQL 耗时", "语句", "借出连接", "新建连接"],
+            [(r.label, r.wall_ms, r.query_ms, r.statement_count, r.checkouts, r.connections_opened)
+             for r in latest.values()],
+            {"至末条查询": "{:.1f} ms", "SQL 耗时": "{:.1f} ms"},
+        )
+        run = latest.get(page) or history[-1]
+        st.caption(f"{run.label}：最慢的语句")
+        markdown_table(["耗时", "行数", "SQL"],
+                       [(s.ms, s.rows, s.sql[:120]) for s in run.slowest()], {"耗时": "{:.2f} ms"})
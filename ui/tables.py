@@ -0,0 +1,25 @@
+"""
+Lightweight tables.
+
+st.table / st.dataframe convert their input through pandas and pyarrow,
+which costs several hundred milliseconds of imports on a cold process. The
+check-in pages only show a handful of rows, so they render plain Markdown
+tables instead and never load those libraries.
+"""
+import streamlit as st
+
+
+def _cell(value, fmt=None):
+    text = "" if value is None else (fmt.format(value) if fmt else str(value))
+    # 转义会破坏 Markdown 表格结构的字符
+    return text.replace("\\", "\\\\").replace("|", "\\|").replace("\n", " ")
+
+
+def markdown_table(headers, rows, formats=None):
+    """Render rows (sequences, same order as headers) as a Markdown table; formats maps header -> format string."""
+    formats = formats or {}
+    lines = ["| " + " | ".join(_cell(h) for h in headers) + " |",
+             "|" + "---|" * len(headers)]
+    for row in rows:
+        lines.append("| " + " | ".join(_cell(v, formats.get(h)) for h, v in zip(headers, row)) + " |")
+    st.markdown("\n".join(lines))